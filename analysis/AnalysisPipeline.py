@@ -0,0 +1,424 @@
+import functools
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple, Union
+
+import global_variables
+from analysis.BinaryWorkerPool import BinaryWorkerPool, analyze_safely
+from checker.BinaryChecker import BinaryChecker
+
+
+class _Scope:
+    """
+    A mounted image or extracted package. It is released once discovery left it, all its batches are finished and
+    all scopes opened within it are released.
+    """
+
+    def __init__(self, context_manager, parent):
+        self.context_manager = context_manager
+        self.parent: Union[_Scope, None] = parent
+        self.open_batches: int = 0
+        self.open_children: int = 0
+        self.closed: bool = False
+
+    def releasable(self) -> bool:
+        return self.closed and self.open_batches == 0 and self.open_children == 0
+
+
+class _Batch:
+    """
+    Binaries of one run_checker call. Timed out binaries are retried and the lib32 fix-up runs once all binaries
+    of the batch are stored.
+    """
+
+    def __init__(self, scope: Union[_Scope, None], image_id: str, special_file: str):
+        self.scope: Union[_Scope, None] = scope
+        self.image_id: str = image_id
+        self.special_file: str = special_file
+        self.pending: int = 0
+        self.closed: bool = False
+        self.retried: bool = False
+        self.lib_binaries: List[Tuple[Path, str]] = []
+        self.deferred: List[Tuple[BinaryChecker, dict]] = []
+
+
+class AnalysisPipeline:
+    """
+    Streaming pipeline from discovery to the database with bounded queues between the stages:
+    discovery (main thread) -> triage (checksum, compiler check, database lookup) -> angr analysis -> database writer.
+    Each stage has its own concurrency, so extracting the next package overlaps with analyzing the current one.
+    """
+
+    # Seconds the angr stage waits for a new job before checking for finished workers, and the triage stage before
+    # checking for released binaries
+    POLL_INTERVAL: float = 0.1
+
+    def __init__(self, analysis, triage_threads=4, queue_size=256):
+        """
+        :param analysis: ImageAnalysis creating the checkers and storing the results
+        :param triage_threads: number of threads triaging binaries
+        :param queue_size: maximum number of binaries waiting in front of the triage and the angr stage
+        """
+        self.__analysis = analysis
+        self.__triage_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__angr_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        # Unbounded, so the writer can always hand retries back to the angr stage without a deadlock
+        self.__writer_queue: queue.Queue = queue.Queue()
+        # Unbounded as well, the writer hands held back binaries to the triage stage while holding the database lock
+        self.__released_queue: queue.Queue = queue.Queue()
+        self.__triage_threads: List[threading.Thread] = [
+            threading.Thread(target=self.__triage, name=f'triage-{i}', daemon=True) for i in range(triage_threads)]
+        self.__angr_thread = threading.Thread(target=self.__analyze, name='angr', daemon=True)
+        self.__writer_thread = threading.Thread(target=self.__write, name='writer', daemon=True)
+        self.__scopes: List[_Scope] = []
+        self.__batches: dict = {}
+        self.__lock = threading.Lock()
+        self.__drained = threading.Condition(self.__lock)
+        self.__open: int = 0
+        # Checksums of the binaries between triage and the writer, and the binaries held back for each of them
+        self.__analyzing: Set[str] = set()
+        self.__held: Dict[str, List[Tuple[Path, _Batch]]] = {}
+        # Set when discovery failed or was interrupted, the binaries not analyzed yet are skipped
+        self.__aborted: bool = False
+        self.logging = logging.getLogger(__name__)
+
+    def __enter__(self):
+        for thread in self.__triage_threads:
+            thread.start()
+        self.__angr_thread.start()
+        self.__writer_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Wait until all binaries are stored and all scopes are released, then stop the stages.
+        If discovery raised, e.g. on a signal, the binaries not analyzed yet are skipped instead, the finished
+        results are still written and the scopes released before the exception propagates.
+        """
+        if exc_type is None:
+            with self.__drained:
+                while self.__open > 0:
+                    self.__drained.wait()
+        else:
+            self.logging.error(f'Stopping the pipeline because of {exc_type.__name__}, skipping the remaining binaries')
+            self.__aborted = True
+        for _ in self.__triage_threads:
+            self.__triage_queue.put(None)
+        for thread in self.__triage_threads:
+            thread.join()
+        self.__angr_queue.put(None)
+        self.__angr_thread.join()
+        self.__writer_queue.put(None)
+        self.__writer_thread.join()
+        if self.__aborted:
+            self.__drain_abandoned()
+
+    def __drain_abandoned(self):
+        """
+        Finish what the stopped stages left behind after an abort, e.g. retries queued by the writer after the angr
+        stage stopped, so all batches are finalized and all scopes released. Only the calling thread is left.
+        """
+        while True:
+            try:
+                item = self.__released_queue.get_nowait()
+                self.__done(item[1])
+                continue
+            except queue.Empty:
+                pass
+            try:
+                item = self.__triage_queue.get_nowait()
+                if item is not None:
+                    self.__done(item[1])
+                continue
+            except queue.Empty:
+                pass
+            try:
+                item = self.__angr_queue.get_nowait()
+                if item is not None:
+                    self.__skip(item[0], item[2])
+                continue
+            except queue.Empty:
+                pass
+            try:
+                task = self.__writer_queue.get_nowait()
+            except queue.Empty:
+                return
+            if task is not None:
+                self.__run(task)
+
+    def open_scope(self, context_manager) -> Path:
+        """
+        Enter a mount or extraction context, it is exited by the writer once all its binaries are stored.
+
+        :param context_manager: mounter or extractor
+        :return: Path returned by the context manager
+        """
+        path = context_manager.__enter__()
+        parent = self.__scopes[-1] if self.__scopes else None
+        with self.__lock:
+            self.__open += 1
+            if parent is not None:
+                parent.open_children += 1
+        self.__scopes.append(_Scope(context_manager, parent))
+        return path
+
+    def close_scope(self):
+        """
+        Discovery left the innermost scope.
+        """
+        scope = self.__scopes.pop()
+        with self.__lock:
+            scope.closed = True
+            release = scope.releasable()
+        if release:
+            self.__writer_queue.put(functools.partial(self.__release_scope, scope))
+
+    def write(self, task: Callable):
+        """
+        Run a database write in the writer stage, in order with all other writes.
+
+        :param task: function writing to the database
+        """
+        self.__writer_queue.put(task)
+
+    def submit(self, all_elf_binaries: Iterable[Path], image_id: str, special_file: str):
+        """
+        Stream binaries of a subimage or special file into the triage stage, blocks while the stage is full.
+
+        :param all_elf_binaries: binaries to analyze
+        :param image_id: Id of the subimage
+        :param special_file: Id of the special file or ' '
+        """
+        scope = self.__scopes[-1] if self.__scopes else None
+        batch = _Batch(scope, image_id, special_file)
+        with self.__lock:
+            self.__open += 1
+            if scope is not None:
+                scope.open_batches += 1
+        try:
+            for binary in all_elf_binaries:
+                self.__triage_queue.put((binary, batch))
+                # Counted once queued, the count may drop below 0 meanwhile as the batch is not closed yet
+                with self.__lock:
+                    batch.pending += 1
+        finally:
+            # Also if discovery or the put raised, so the batch is finalized and __exit__ does not wait for it
+            with self.__lock:
+                batch.closed = True
+            self.__done(batch, finished=0)
+
+    def __triage(self):
+        """
+        Triage stage: checksum, compiler check and database lookup of each binary.
+        """
+        while True:
+            try:
+                item = self.__released_queue.get_nowait()
+            except queue.Empty:
+                try:
+                    item = self.__triage_queue.get(timeout=AnalysisPipeline.POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            if item is None:
+                return
+            binary, batch = item
+            if self.__aborted:
+                self.__done(batch)
+                continue
+            try:
+                checker = self.__analysis.create_checker(binary, batch.image_id, batch.special_file)
+            except Exception as e:
+                self.logging.error(f'Could not triage {binary}: {e}')
+                self.__done(batch)
+                continue
+            if checker.analyze and self.__hold_back(binary, batch, checker.binary_obj.checksum):
+                continue
+            if '/lib/' in str(binary):
+                with self.__lock:
+                    batch.lib_binaries.append((binary, checker.binary_obj.id))
+            if checker.analyze and checker.reused:
+                # Results copied from the verdict cache go straight to the writer
+                self.__writer_queue.put(functools.partial(self.__store, checker, checker.binary_obj, batch))
+            elif checker.analyze:
+                self.__angr_queue.put((checker, self.__analysis.check_options(checker), batch))
+            else:
+                self.__done(batch)
+
+    def __hold_back(self, binary: Path, batch: _Batch, checksum: str) -> bool:
+        """
+        Hold back a binary with the checksum of a binary still being analyzed or written, e.g. a hard link or a copy.
+        It is triaged again once that result is stored, and then found in the database or the verdict cache like in
+        the serial analysis.
+
+        :return: Whether the binary is held back, otherwise its checksum is marked as being analyzed
+        """
+        with self.__lock:
+            if checksum in self.__analyzing:
+                self.__held.setdefault(checksum, []).append((binary, batch))
+                return True
+            self.__analyzing.add(checksum)
+            return False
+
+    def __release_checksum(self, checker: BinaryChecker, batch: _Batch):
+        """
+        Triage the binaries held back for the checksum of a stored or skipped binary again.
+        """
+        if batch.retried:
+            # Retried binaries were released after their first analysis
+            return
+        checksum = checker.binary_obj.checksum
+        with self.__lock:
+            self.__analyzing.discard(checksum)
+            held = self.__held.pop(checksum, [])
+        for binary, held_batch in held:
+            if self.__aborted:
+                self.__done(held_batch)
+            else:
+                self.__released_queue.put((binary, held_batch))
+
+    def __skip(self, checker: BinaryChecker, batch: _Batch):
+        """
+        Skip a binary waiting for the angr stage after an abort.
+        """
+        self.__release_checksum(checker, batch)
+        self.__done(batch)
+
+    def __jobs(self) -> Iterator[Union[Tuple[BinaryChecker, dict], None]]:
+        """
+        Jobs of the angr stage, yields None while no job is waiting so finished workers are collected meanwhile.
+        """
+        while True:
+            try:
+                item = self.__angr_queue.get(timeout=AnalysisPipeline.POLL_INTERVAL)
+            except queue.Empty:
+                yield None
+                continue
+            if item is None:
+                return
+            checker, options, batch = item
+            if self.__aborted:
+                self.__skip(checker, batch)
+                continue
+            self.__batches[id(checker)] = batch
+            yield checker, options
+
+    def __analyze(self):
+        """
+        Angr stage: load, CFG and checks, in worker processes if configured.
+        """
+        if self.__analysis.workers > 0:
+            with BinaryWorkerPool(self.__analysis.workers) as pool:
+                results = pool.map(self.__jobs())
+                for checker, binary_obj in results:
+                    self.__stored(checker, binary_obj)
+        else:
+            for job in self.__jobs():
+                if job is not None:
+                    checker, options = job
+                    self.__stored(checker, analyze_safely(checker, options))
+
+    def __stored(self, checker: BinaryChecker, binary_obj):
+        """
+        Hand an analyzed binary over to the writer stage.
+        """
+        batch = self.__batches.pop(id(checker))
+        self.__writer_queue.put(functools.partial(self.__store, checker, binary_obj, batch))
+
+    def __write(self):
+        """
+        Writer stage: the only thread writing to the database.
+        """
+        while True:
+            task = self.__writer_queue.get()
+            if task is None:
+                return
+            self.__run(task)
+
+    def __run(self, task: Callable):
+        """
+        Run a task of the writer stage, a failing task is logged so the other results are still written.
+        """
+        try:
+            with global_variables.database_lock:
+                task()
+        except Exception as e:
+            self.logging.exception(f'Could not write results: {e}')
+
+    def __store(self, checker: BinaryChecker, binary_obj, batch: _Batch):
+        """
+        Store the result of an analyzed binary and defer it if it ran out of time.
+        """
+        try:
+            if batch.retried:
+                self.__analysis.store_retry_results(checker, binary_obj)
+            else:
+                self.__analysis.store_results(checker, binary_obj)
+                if binary_obj.timed_out_stage:
+                    checker.prepare_retry(self.__analysis.budget.scaled(self.__analysis.retry_factor))
+                    batch.deferred.append((checker, self.__analysis.check_options(checker)))
+        finally:
+            # Also if storing failed, so the batch is finished and the held back binaries are not left waiting
+            self.__release_checksum(checker, batch)
+            self.__done(batch)
+
+    def __done(self, batch: _Batch, finished=1):
+        """
+        Count finished binaries of a batch. When all are finished, the timed out ones are retried with a larger
+        budget and afterwards the batch is finalized.
+
+        :param batch: batch of the finished binary
+        :param finished: number of finished binaries
+        """
+        with self.__lock:
+            batch.pending -= finished
+            if not batch.closed or batch.pending > 0:
+                return
+            retry = batch.deferred and not batch.retried and not self.__aborted
+            if retry:
+                batch.retried = True
+                batch.pending = len(batch.deferred)
+        if retry:
+            self.logging.info(f'Retrying {len(batch.deferred)} binaries that ran out of time')
+            for checker, options in batch.deferred:
+                self.__angr_queue.put((checker, options, batch))
+        else:
+            self.__writer_queue.put(functools.partial(self.__finalize, batch))
+
+    def __finalize(self, batch: _Batch):
+        """
+        Run the lib32 fix-up of a finished batch and release its scope if possible.
+        """
+        self.__analysis.fix_lib32(batch.lib_binaries, batch.image_id)
+        scope = batch.scope
+        with self.__lock:
+            if scope is not None:
+                scope.open_batches -= 1
+            release = scope is not None and scope.releasable()
+        if release:
+            self.__release_scope(scope)
+        self.__finish_one()
+
+    def __release_scope(self, scope: _Scope):
+        """
+        Unmount or clean up a scope once all its binaries are stored, and then the enclosing scope if it waited
+        for this one.
+        """
+        try:
+            scope.context_manager.__exit__(None, None, None)
+        except Exception as e:
+            self.logging.error(f'Could not release {scope.context_manager}: {e}')
+        parent = scope.parent
+        with self.__lock:
+            if parent is not None:
+                parent.open_children -= 1
+            release = parent is not None and parent.releasable()
+        self.__finish_one()
+        if release:
+            self.__release_scope(parent)
+
+    def __finish_one(self):
+        with self.__drained:
+            self.__open -= 1
+            self.__drained.notify_all()
@@ -9,6 +9,7 @@ from mount.SparseImageMounter import SparseImageMounter
 from mount.ExtImageMounter import ExtImageMounter
 from mount.ApexPayloadMounter import ApexPayloadMounter
 from finder.ElfBinariesFinder import ElfBinariesFinder
+from finder.FileIndex import FileIndex
 from results.ImageObject import ImageObject
 from results.SpecialFileObject import SpecialFileObject
 from finder.FormatsFinder import FormatsFinder
@@ -20,45 +21,60 @@ class AndroidImageAnalysis(ImageAnalysis):
     """
 
     def __init__(self, distribution: str, factory_image_dir: Path,
-                 ignore_unsafe: bool, error_static_exit: bool, only_multi_module: bool, skip_db_check: bool):
+                 ignore_unsafe: bool, error_static_exit: bool, only_multi_module: bool, skip_db_check: bool,
+                 **options):
         self.image_top_dir: Path = factory_image_dir
         super().__init__(distribution, factory_image_dir,
-                         ignore_unsafe, error_static_exit, only_multi_module, skip_db_check)
+                         ignore_unsafe, error_static_exit, only_multi_module, skip_db_check, **options)
 
     def run(self):
         """
         Main function to run all analysis on the given image file.
-        Establish the connection the database containing all analysis results.
-        Find and mount all contained image files of different types.
-
-        :return:
+        Raw images left over by previous runs are deleted before and after the analysis.
         """
         self.__delete_raw_images()
-        self.os_obj.add_to_database()
+        super().run()
+        self.__delete_raw_images()
+
+    def discover(self):
+        """
+        Find and mount all contained image files of different types.
+        APEX files are analyzed once, those inside a subimage with the subimage and those next to the subimages
+        in the factory image directory with an image named after the directory.
+        """
+        top_index = FileIndex(self.image_top_dir)
         all_sparse_images: List[Path] = FormatsFinder.find_images(self.image_top_dir,
                                                                   MagicValues.ANDROID_SPARSE_IMG_MAGIC_VALUE,
-                                                                  FileExtensions.NO_EXTENSION)
+                                                                  FileExtensions.NO_EXTENSION,
+                                                                  top_index)
         all_ext_images: List[Path] = FormatsFinder.find_images(self.image_top_dir,
                                                                MagicValues.EXT_IMG_MAGIC_VALUE,
-                                                               FileExtensions.NO_EXTENSION)
+                                                               FileExtensions.NO_EXTENSION,
+                                                               top_index)
+        all_apex_images: List[Path] = FormatsFinder.find_images(self.image_top_dir,
+                                                                MagicValues.JAVA_ARCHIVE,
+                                                                FileExtensions.APEX_FILE_EXTENSION,
+                                                                top_index)
 
         for image_path in all_sparse_images:
             self.logging.info("Mounting %s", image_path.as_posix())
             self.image_obj = ImageObject(self.os_obj.version, image_path.name)
-            self.image_obj.add_to_database()
-            with SparseImageMounter(image_path) as mount_path:
+            self.add_to_database(self.image_obj)
+            with self.scope(SparseImageMounter(image_path)) as mount_path:
                 self.__run_checks(mount_path)
 
         for image_path in all_ext_images:
             self.logging.info("Mounting %s", image_path.as_posix())
             self.image_obj = ImageObject(self.os_obj.version, image_path.name)
-            self.image_obj.add_to_database()
-            with ExtImageMounter(image_path) as mount_path:
+            self.add_to_database(self.image_obj)
+            with self.scope(ExtImageMounter(image_path)) as mount_path:
                 self.__run_checks(mount_path)
 
-        self.__delete_raw_images()
-        self.logging.info(f'Finished analysis of {self.os_obj.version}')
-        self.os_obj.update_values()
+        if all_apex_images:
+            self.logging.info("Analyzing APEX files in %s", self.image_top_dir.as_posix())
+            self.image_obj = ImageObject(self.os_obj.version, self.image_top_dir.name)
+            self.add_to_database(self.image_obj)
+            self.__run_apex_checks(all_apex_images)
 
     def __run_checks(self, mount_path: Path):
         """
@@ -67,17 +83,27 @@ class AndroidImageAnalysis(ImageAnalysis):
 
         :param mount_path: Path to where the subimage is mounted
         """
-        all_apex_images: List[Path] = FormatsFinder.find_images(self.image_top_dir,
+        index = FileIndex(mount_path)
+        all_apex_images: List[Path] = FormatsFinder.find_images(mount_path,
                                                                 MagicValues.JAVA_ARCHIVE,
-                                                                FileExtensions.APEX_FILE_EXTENSION)
-        all_elf_binaries: List[Path] = ElfBinariesFinder.find_all(mount_path)
+                                                                FileExtensions.APEX_FILE_EXTENSION,
+                                                                index)
+        all_elf_binaries: List[Path] = ElfBinariesFinder.find_all(mount_path, index)
+        self.__run_apex_checks(all_apex_images)
+        self.run_checker(all_elf_binaries, self.image_obj.id)
+
+    def __run_apex_checks(self, all_apex_images: List[Path]):
+        """
+        Mount each APEX file and check its binaries as special file of the current image.
+
+        :param all_apex_images: Paths to the APEX files
+        """
         for apex_path in all_apex_images:
             self.special_file_obj = SpecialFileObject(self.image_obj.id, apex_path.name, 'apex', apex_path)
-            self.special_file_obj.add_to_database()
-            with ApexPayloadMounter(apex_path) as payload_path:
+            self.add_to_database(self.special_file_obj)
+            with self.scope(ApexPayloadMounter(apex_path)) as payload_path:
                 all_apex_binaries: List[Path] = ElfBinariesFinder.find_all(payload_path)
                 self.run_checker(all_apex_binaries, self.image_obj.id, self.special_file_obj.id)
-        self.run_checker(all_elf_binaries, self.image_obj.id)
 
     def __delete_raw_images(self):
         """
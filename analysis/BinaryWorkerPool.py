@@ -0,0 +1,235 @@
+import logging
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from checker.BinaryChecker import BinaryChecker
+from results.BinaryObject import BinaryObject
+
+
+def analyze_binary(checker: BinaryChecker, options: dict) -> BinaryObject:
+    """
+    Load the binary, generate the CFG and run all checks, exactly as done in the main process.
+
+    :param checker: checker created with load=False in the main process
+    :param options: keyword arguments passed to run_all_checks
+    :return: Updated BinaryObject
+    """
+    checker.load()
+    return checker.run_all_checks(**options)
+
+
+def analyze_safely(checker: BinaryChecker, options: dict) -> BinaryObject:
+    """
+    Analyze a binary and record an exception raised by the analysis in its BinaryObject.
+
+    :param checker: checker created with load=False
+    :param options: keyword arguments passed to run_all_checks
+    :return: Updated BinaryObject
+    """
+    try:
+        return analyze_binary(checker, options)
+    except Exception as e:
+        logging.exception(f'Analysis of {checker.binary} failed')
+        binary_obj = checker.binary_obj
+        binary_obj.error = binary_obj.error + f'ERROR: Analysis failed because of {e}'
+        return binary_obj
+
+
+def _work(conn: Connection):
+    """
+    Worker loop: receive a checker, analyze it and send back the BinaryObject until None is received.
+    The start of every stage is reported, so the main process can stop a worker stuck in a stage.
+
+    :param conn: worker side of the pipe to the main process
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The handler of the main process flushes the results, workers do not write any
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        checker, options = job
+        checker.budget.on_stage = lambda stage: conn.send(('stage', stage))
+        binary_obj = analyze_safely(checker, options)
+        conn.send(('result', binary_obj))
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, context):
+        self.__context = context
+        self.job: Union[Tuple[BinaryChecker, dict], None] = None
+        self.stage: str = ''
+        self.deadline: Union[float, None] = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = self.__context.Pipe()
+        self.process = self.__context.Process(target=_work, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def submit(self, job: Tuple[BinaryChecker, dict]):
+        self.job = job
+        self.stage = ''
+        self.deadline = None
+        try:
+            self.conn.send(job)
+        except (BrokenPipeError, OSError):
+            # Worker died after sending its last result
+            self.conn.close()
+            self.start()
+            self.conn.send(job)
+
+
+class BinaryWorkerPool:
+    """
+    Run the per-binary analysis (load, CFG, checks) in worker processes.
+    Results are sent back to the main process, which alone writes to the database.
+    A worker crashing inside angr, or stuck in a stage beyond its time budget, only fails the binary it was working
+    on and is replaced.
+    """
+
+    # Seconds to wait for finished workers while the job source has no job available
+    POLL_INTERVAL: float = 0.1
+    # Seconds a worker may exceed a stage budget before it is killed, the worker should stop itself before
+    GRACE_PERIOD: float = 10
+
+    def __init__(self, workers: int):
+        """
+        :param workers: number of worker processes
+        """
+        self.__workers_count: int = workers
+        self.__context = multiprocessing.get_context('fork')
+        self.__workers: List[_Worker] = []
+        self.logging = logging.getLogger(__name__)
+
+    def __enter__(self):
+        self.__workers = [_Worker(self.__context) for _ in range(self.__workers_count)]
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for worker in self.__workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.__workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.conn.close()
+        self.__workers = []
+
+    def map(self, jobs: Iterable[Tuple[BinaryChecker, dict]]) -> Iterator[Tuple[BinaryChecker, BinaryObject]]:
+        """
+        Analyze all jobs and yield the results in the order they finish.
+
+        :param jobs: pairs of checker (created with load=False) and keyword arguments for run_all_checks,
+                     None if the source has no job available right now (e.g. a streaming queue)
+        :return: Pairs of the submitted checker and the analyzed BinaryObject
+        """
+        end = object()
+        pending = iter(jobs)
+        exhausted = False
+        while True:
+            waiting = False
+            for worker in self.__workers:
+                if worker.job is None and not exhausted and not waiting:
+                    job = next(pending, end)
+                    if job is end:
+                        exhausted = True
+                    elif job is None:
+                        waiting = True
+                    else:
+                        worker.submit(job)
+            busy: Dict[object, _Worker] = {}
+            for worker in self.__workers:
+                if worker.job is not None:
+                    busy[worker.conn] = worker
+                    busy[worker.process.sentinel] = worker
+            if not busy:
+                if exhausted:
+                    return
+                continue
+
+            deadlines = [worker.deadline for worker in busy.values() if worker.deadline is not None]
+            if waiting:
+                deadlines.append(time.monotonic() + BinaryWorkerPool.POLL_INTERVAL)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            handled = set()
+            for ready in wait(list(busy.keys()), timeout):
+                worker = busy[ready]
+                if id(worker) in handled:
+                    continue
+                handled.add(id(worker))
+                checker = worker.job[0]
+                try:
+                    kind, message = worker.conn.recv()
+                except (EOFError, OSError):
+                    binary_obj = self.__replace_crashed(worker)
+                else:
+                    if kind == 'stage':
+                        self.__start_stage(worker, message)
+                        continue
+                    binary_obj = message
+                worker.job = None
+                yield checker, binary_obj
+
+            now = time.monotonic()
+            for worker in self.__workers:
+                if worker.job is not None and worker.deadline is not None and worker.deadline < now:
+                    checker = worker.job[0]
+                    binary_obj = self.__replace_expired(worker)
+                    worker.job = None
+                    yield checker, binary_obj
+
+    def __start_stage(self, worker: _Worker, stage: str):
+        """
+        Track the stage a worker is in and when it has to be finished at the latest.
+
+        :param worker: worker reporting the start of a stage
+        :param stage: stage the worker started
+        """
+        worker.stage = stage
+        seconds = worker.job[0].budget.budgets[stage]
+        worker.deadline = time.monotonic() + seconds + BinaryWorkerPool.GRACE_PERIOD if seconds else None
+
+    def __replace_expired(self, worker: _Worker) -> BinaryObject:
+        """
+        Kill a worker stuck in a stage beyond its budget, record the timeout and start a new worker.
+
+        :param worker: worker to kill
+        :return: BinaryObject of the binary the worker was analyzing, including the timed out stage
+        """
+        worker.process.kill()
+        worker.process.join()
+        checker = worker.job[0]
+        seconds = checker.budget.budgets[worker.stage]
+        self.logging.error(f'Killed worker stuck in {worker.stage} analyzing {checker.binary}')
+        binary_obj = checker.binary_obj
+        binary_obj.error = binary_obj.error + f'TIMEOUT: {worker.stage} took longer than {seconds}s'
+        binary_obj.timed_out_stage = worker.stage
+        worker.conn.close()
+        worker.start()
+        return binary_obj
+
+    def __replace_crashed(self, worker: _Worker) -> BinaryObject:
+        """
+        Record the crash of a worker in the BinaryObject it was analyzing and start a new worker.
+
+        :param worker: crashed worker
+        :return: BinaryObject of the binary the worker was analyzing, including the error
+        """
+        worker.process.join()
+        checker = worker.job[0]
+        self.logging.error(f'Worker crashed with exit code {worker.process.exitcode} analyzing {checker.binary}')
+        binary_obj = checker.binary_obj
+        binary_obj.error = binary_obj.error + f'ERROR: Worker crashed with exit code {worker.process.exitcode}'
+        worker.conn.close()
+        worker.start()
+        return binary_obj
@@ -1,8 +1,16 @@
 import logging
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Union
+from typing import Iterable, Iterator, List, Set, Tuple, Union
 
+import global_variables
+from analysis.AnalysisPipeline import AnalysisPipeline
+from analysis.BinaryWorkerPool import BinaryWorkerPool, analyze_safely
+from checker.AnalysisProfile import AnalysisProfile
 from checker.BinaryChecker import BinaryChecker
+from checker.Lib32Checker import Lib32Checker
+from checker.StageBudget import StageBudget
+from results.BinaryObject import BinaryObject
 from results.ImageObject import ImageObject
 from results.OperatingSystemObject import OperatingSystemObject
 from results.SpecialFileObject import SpecialFileObject
@@ -11,65 +19,253 @@ from results.SpecialFileObject import SpecialFileObject
 class ImageAnalysis:
 
     def __init__(self, os: str, factory_image_dir: Path,
-                 ignore_unsafe: bool, only_multi_cfi: bool, skip_db_check: bool, linux=False):
+                 ignore_unsafe: bool, error_static_exit: bool, only_multi_cfi: bool, skip_db_check: bool,
+                 workers=0, budget: Union[StageBudget, None] = None, retry_factor=4.0,
+                 pipeline=False, triage_threads=4, force_recompute=False, scs_engine=BinaryChecker.CFG_SCS_ENGINE,
+                 single_cfi_engine=BinaryChecker.CFG_SINGLE_CFI_ENGINE, analysis_profile=AnalysisProfile.DEFAULT,
+                 linux=False):
         self.linux: bool = linux
         self.image_top_dir: Path = factory_image_dir
         self.os_obj: OperatingSystemObject = OperatingSystemObject(os, self.image_top_dir.name)
         self.ignore_unsafe: bool = ignore_unsafe
+        self.error_static_exit: bool = error_static_exit
         self.only_multi_cfi: bool = only_multi_cfi
         self.skip_db_check: bool = skip_db_check
+        self.budget: StageBudget = budget if budget is not None else StageBudget()
+        # A stage stuck beyond its budget is only stopped reliably by killing the worker process running it
+        self.workers: int = workers if workers > 0 or not self.budget.enabled() else 1
+        self.retry_factor: float = retry_factor
+        self.use_pipeline: bool = pipeline
+        self.triage_threads: int = triage_threads
+        self.force_recompute: bool = force_recompute
+        self.scs_engine: str = scs_engine
+        self.single_cfi_engine: str = single_cfi_engine
+        self.analysis_profile: str = analysis_profile
+        self.pipeline: Union[AnalysisPipeline, None] = None
         self.special_file_obj: SpecialFileObject
         self.image_obj: Union[ImageObject, None] = None
         self.logging = logging.getLogger(__name__)
 
+    def run(self):
+        """
+        Main function to run all analysis on the given image file.
+        With the pipeline option, discovery streams the binaries into the pipeline while they are analyzed.
+        """
+        self.os_obj.add_to_database()
+        global_variables.setup_known_binaries(self.os_obj.version)
+        if self.use_pipeline:
+            with AnalysisPipeline(self, self.triage_threads) as pipeline:
+                self.pipeline = pipeline
+                self.discover()
+            self.pipeline = None
+        else:
+            self.discover()
+        self.logging.info(f'Finished analysis of {self.os_obj.version}')
+        global_variables.result_writer.flush()
+        self.os_obj.update_values()
+
+    def discover(self):
+        """
+        Find and mount all contained images and packages and run the checker on their binaries.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def scope(self, context_manager):
+        """
+        Enter a mounter or extractor. In the pipeline, leaving it is deferred until all its binaries are stored.
+
+        :param context_manager: mounter or extractor
+        :return: Path returned by the context manager
+        """
+        if self.pipeline is None:
+            with context_manager as path:
+                yield path
+        else:
+            path = self.pipeline.open_scope(context_manager)
+            try:
+                yield path
+            finally:
+                self.pipeline.close_scope()
+
+    def add_to_database(self, result_obj: Union[ImageObject, SpecialFileObject]):
+        """
+        Add an image or special file to the database, in the pipeline in order with the results of the writer.
+
+        :param result_obj: object to add
+        """
+        if self.pipeline is None:
+            result_obj.add_to_database()
+        else:
+            self.pipeline.write(result_obj.add_to_database)
+
     def run_checker(self, all_elf_binaries: List[Path], image_id: str, special_file=' '):
         """
         Iterate through list of binaries, if not exists in database run checks and add to database.
+        With workers set, the checks run in a pool of worker processes and only the results are written here.
+        Binaries that run out of time are retried after all others with the budgets multiplied by retry_factor.
 
         :param special_file:
         :param all_elf_binaries: List of all binaries to be analyzed
         :param image_id: Id (OS Version + image name) of the mounted subimage
         """
+        if self.pipeline is not None:
+            self.pipeline.submit(all_elf_binaries, image_id, special_file)
+            return
+
+        deferred: List[Tuple[BinaryChecker, dict]] = []
+        lib_binaries: List[Tuple[Path, str]] = []
+        analyzing: Set[str] = set()
+        retry_budget = self.budget.scaled(self.retry_factor)
+        jobs = self.__prepare_jobs(all_elf_binaries, image_id, special_file, lib_binaries, analyzing)
+        for checker, binary_obj in self.analyze(jobs):
+            self.store_results(checker, binary_obj)
+            analyzing.discard(binary_obj.checksum)
+            if binary_obj.timed_out_stage:
+                checker.prepare_retry(retry_budget)
+                deferred.append((checker, self.check_options(checker)))
+
+        if deferred:
+            # The slow tail runs after all other binaries with a larger budget
+            self.logging.info(f'Retrying {len(deferred)} binaries that ran out of time')
+            for checker, binary_obj in self.analyze(deferred):
+                self.store_retry_results(checker, binary_obj)
+
+        self.fix_lib32(lib_binaries, image_id)
+
+    def fix_lib32(self, lib_binaries: List[Tuple[Path, str]], image_id: str):
+        """
+        Check and if needed update 32-bit binaries due to Lib32 error, after all binaries were stored.
+        The results of the subimage or package are committed first.
+
+        :param lib_binaries: pairs of path and database id of the binaries in /lib/
+        :param image_id: Id of the subimage
+        """
+        global_variables.result_writer.flush()
+        Lib32Checker.run(lib_binaries, image_id)
+
+    def analyze(self, jobs: Iterable[Tuple[BinaryChecker, dict]]) -> Iterator[Tuple[BinaryChecker, BinaryObject]]:
+        """
+        Analyze the binaries in the main process or, with workers set, in a pool of worker processes.
+        Like in the workers, a binary failing the analysis only records the error in its BinaryObject.
+
+        :param jobs: pairs of checker and keyword arguments for run_all_checks
+        :return: Pairs of checker and analyzed BinaryObject
+        """
+        if self.workers > 0:
+            with BinaryWorkerPool(self.workers) as pool:
+                yield from pool.map(jobs)
+        else:
+            for job in jobs:
+                if job is not None:
+                    checker, options = job
+                    yield checker, analyze_safely(checker, options)
+
+    def __prepare_jobs(self, all_elf_binaries: List[Path], image_id: str, special_file: str,
+                       lib_binaries: List[Tuple[Path, str]], analyzing: Set[str]) \
+            -> Iterator[Union[Tuple[BinaryChecker, dict], None]]:
+        """
+        Decide in the main process which binaries have to be analyzed, loading is left to the analysis.
+        A binary with the checksum of a binary still being analyzed, e.g. a hard link, is held back until the result
+        of the first one is stored. Like in the serial analysis, it is then found in the database or verdict cache.
+
+        :param lib_binaries: filled with path and database id of the binaries in /lib/ for the Lib32 fix-up
+        :param analyzing: checksums of the binaries being analyzed, removed by the caller once stored
+        :return: Pairs of checker and keyword arguments for run_all_checks, None while only held back binaries are
+                 left and their checksums are still being analyzed
+        """
+        held: List[Tuple[Path, str]] = []
         for binary in all_elf_binaries:
-            if self.ignore_unsafe:
-                checker = BinaryChecker(binary, image_id, special_file, self.linux,
-                                        ignore_unsafe=True, skip_db_check=self.skip_db_check)
+            yield from self.__prepare_job(binary, image_id, special_file, lib_binaries, analyzing, held)
+        while held:
+            released = [(binary, checksum) for binary, checksum in held if checksum not in analyzing]
+            if not released:
+                yield None
+                continue
+            held = [(binary, checksum) for binary, checksum in held if checksum in analyzing]
+            for binary, _ in released:
+                yield from self.__prepare_job(binary, image_id, special_file, lib_binaries, analyzing, held)
+
+    def __prepare_job(self, binary: Path, image_id: str, special_file: str, lib_binaries: List[Tuple[Path, str]],
+                      analyzing: Set[str], held: List[Tuple[Path, str]]) -> Iterator[Tuple[BinaryChecker, dict]]:
+        """
+        Decide whether a binary has to be analyzed, see __prepare_jobs.
+
+        :param held: filled with path and checksum of the binary if it is held back
+        :return: Pair of checker and keyword arguments for run_all_checks if the binary has to be analyzed
+        """
+        checker = self.create_checker(binary, image_id, special_file)
+        checksum = checker.binary_obj.checksum
+        if checker.analyze and not checker.reused and checksum in analyzing:
+            held.append((binary, checksum))
+            return
+        if '/lib/' in str(binary):
+            lib_binaries.append((binary, checker.binary_obj.id))
+        if checker.analyze and checker.reused:
+            self.store_results(checker, checker.binary_obj)
+        elif checker.analyze:
+            analyzing.add(checksum)
+            yield checker, self.check_options(checker)
+
+    def create_checker(self, binary: Path, image_id: str, special_file: str, load=False) -> BinaryChecker:
+        """
+        Create the checker of a binary based on the analysis options.
+        """
+        if self.ignore_unsafe:
+            checker = BinaryChecker(binary, image_id, special_file, self.linux,
+                                    ignore_unsafe=True, skip_db_check=self.skip_db_check, load=load,
+                                    budget=self.budget, reuse_verdicts=not self.force_recompute,
+                                    scs_engine=self.scs_engine, single_cfi_engine=self.single_cfi_engine,
+                                    analysis_profile=self.analysis_profile)
+        else:
+            checker = BinaryChecker(binary, image_id, special_file, self.linux, skip_db_check=self.skip_db_check,
+                                    only_multi_cfi=self.only_multi_cfi, load=load, budget=self.budget,
+                                    reuse_verdicts=not self.force_recompute, scs_engine=self.scs_engine,
+                                    single_cfi_engine=self.single_cfi_engine, analysis_profile=self.analysis_profile)
+        logging.info(f'Next binary to analyze: {binary}')
+        logging.info(f'Does binary exist in database?: {checker.already_exits}')
+        logging.info(f'Binary info: {checker.binary_obj.to_string()}')
+        return checker
+
+    def check_options(self, checker: BinaryChecker) -> dict:
+        """
+        Keyword arguments for run_all_checks of a binary that needs to be analyzed.
+        """
+        if not self.ignore_unsafe and (not checker.already_exits or checker.skip_db_check) and self.only_multi_cfi:
+            return {'only_multi_module': True}
+        return {}
+
+    def store_results(self, checker: BinaryChecker, binary_obj: BinaryObject):
+        """
+        Add the results of an analyzed binary to the database or update the existing entry.
+        """
+        checker.cache_verdict(binary_obj)
+        if self.ignore_unsafe:
+            logging.info(f'Option: check unsafe binaries')
+            if checker.already_exits:
+                logging.info(f'Updating database')
+                binary_obj.update_database(ignore_unsafe=True)
             else:
-                checker = BinaryChecker(binary, image_id, special_file, self.linux, skip_db_check=self.skip_db_check,
-                                        only_multi_cfi=self.only_multi_cfi)
-            logging.info(f'Next binary to analyze: {binary}')
-            logging.info(f'Does binary exist in database?: {checker.already_exits}')
-            logging.info(f'Binary info: {checker.binary_obj.to_string()}')
-
-            if self.ignore_unsafe and checker.analyze:
-                logging.info(f'Option: check unsafe binaries')
-                binary_obj = checker.run_all_checks()
-                if checker.already_exits:
-                    logging.info(f'Updating database')
-                    binary_obj.update_database(ignore_unsafe=True)
-                else:
-                    logging.info(f'Add to database')
-                    binary_obj.add_to_database()
-
-            elif (not checker.already_exits or checker.skip_db_check) and checker.analyze:
                 logging.info(f'Add to database')
-                if self.only_multi_cfi:
-                    logging.info(f'Only checking for multi-module CFI')
-                    binary_obj = checker.run_all_checks(only_multi_module=True)
-                else:
-                    binary_obj = checker.run_all_checks()
-                if checker.already_exits:
-                    binary_obj.update_database()
-                else:
-                    binary_obj.add_to_database()
-
-            elif checker.analyze:
-                logging.info(f'Updating database -> fixing old implementation mistake')
-                binary_obj = checker.run_all_checks()
-                binary_obj.update_database(ignore_unsafe=True)
+                binary_obj.add_to_database()
 
-        for binary in all_elf_binaries:
-            if str(binary).__contains__('/lib/'):
-                checker = BinaryChecker(binary, image_id, special_file, self.linux, skip_db_check=self.skip_db_check, load=False)
-                logging.info(f'Check if binary {binary} need update.')
-                checker.fix_lib32()
+        elif not checker.already_exits or checker.skip_db_check:
+            logging.info(f'Add to database')
+            if self.only_multi_cfi:
+                logging.info(f'Only checking for multi-module CFI')
+            if checker.already_exits:
+                binary_obj.update_database()
+            else:
+                binary_obj.add_to_database()
+
+        else:
+            logging.info(f'Updating database -> fixing old implementation mistake')
+            binary_obj.update_database(ignore_unsafe=True)
+
+    def store_retry_results(self, checker: BinaryChecker, binary_obj: BinaryObject):
+        """
+        Update the entry of a binary analyzed again after running out of time.
+        """
+        logging.info(f'Updating database after retry of {checker.binary}')
+        checker.cache_verdict(binary_obj)
+        binary_obj.update_database(ignore_unsafe=True)
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+Measure the time and memory of loading binaries and generating their CFG with each analysis profile, and compare
+the verdicts of the CFG-based checks against the default profile.
+Each binary is analyzed in a fresh process per profile, so the peak memory of one analysis is not inflated by
+earlier ones.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from checker.AnalysisProfile import AnalysisProfile
+from checker.ElfSectionReader import ElfSectionReader
+
+
+def find_binaries(paths: List[str]) -> Iterator[Path]:
+    """
+    :param paths: ELF files or directories containing them
+    :return: Paths of all ELF files
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    file_path = Path(root, name)
+                    if not file_path.is_symlink() and is_elf(file_path):
+                        yield file_path
+        elif is_elf(Path(path)):
+            yield Path(path)
+
+
+def is_elf(path: Path) -> bool:
+    try:
+        with open(path, 'rb') as file:
+            return file.read(4) == ElfSectionReader.ELF_MAGIC
+    except OSError:
+        return False
+
+
+def measure(binary: Path, profile_name: str) -> Dict:
+    """
+    Load a binary, generate its CFG and run the CFG-based checks, runs in its own process.
+
+    :param binary: path to the binary
+    :param profile_name: name of the analysis profile
+    :return: Timings, peak memory and verdicts
+    """
+    from checker.ShadowCallStackChecker import ShadowCallStackChecker
+    from checker.SingleModuleCFIChecker import SingleModuleCFIChecker
+    from results.BinaryObject import BinaryObject
+
+    profile = AnalysisProfile.get(profile_name)
+    result = {'binary': str(binary), 'profile': profile_name, 'error': ''}
+    try:
+        start = time.perf_counter()
+        proj = profile.load(binary)
+        loaded = time.perf_counter()
+        cfg = profile.generate_cfg(proj)
+        generated = time.perf_counter()
+        binary_obj = BinaryObject(binary, '', '')
+        SingleModuleCFIChecker.run(cfg, binary_obj)
+        ShadowCallStackChecker.run(cfg, binary_obj)
+        result.update(load_seconds=loaded - start, cfg_seconds=generated - loaded,
+                      functions=len(cfg.functions), nodes=sum(1 for _ in cfg.model.nodes()),
+                      single_cfi=binary_obj.single_cfi, modified=binary_obj.modified, scs=binary_obj.scs)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    # Kilobytes on Linux
+    result['peak_rss_mib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def summarize(results: List[Dict], profiles: List[str]):
+    """
+    Print time, memory and verdict differences per profile.
+
+    :param results: results of measure
+    :param profiles: names of the measured profiles
+    """
+    reference = {result['binary']: result for result in results
+                 if result['profile'] == AnalysisProfile.DEFAULT and not result['error']}
+    print(f'{"profile":<10} {"binaries":>8} {"errors":>6} {"load s":>9} {"cfg s":>9} {"median s":>9} '
+          f'{"peak MiB":>9} {"mean MiB":>9} {"differ":>6}')
+    for profile in profiles:
+        measured = [result for result in results if result['profile'] == profile]
+        analyzed = [result for result in measured if not result['error']]
+        totals = [result['load_seconds'] + result['cfg_seconds'] for result in analyzed]
+        memory = [result['peak_rss_mib'] for result in measured]
+        differ = sum(1 for result in analyzed if result['binary'] in reference and
+                     any(result[key] != reference[result['binary']][key] for key in ('single_cfi', 'modified', 'scs')))
+        print(f'{profile:<10} {len(measured):>8} {len(measured) - len(analyzed):>6} '
+              f'{sum(r["load_seconds"] for r in analyzed):>9.1f} {sum(r["cfg_seconds"] for r in analyzed):>9.1f} '
+              f'{statistics.median(totals) if totals else 0:>9.2f} {max(memory, default=0):>9.0f} '
+              f'{statistics.mean(memory) if memory else 0:>9.0f} {differ:>6}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the analysis profiles on a corpus of binaries')
+    parser.add_argument('paths', nargs='+', help='ELF binaries or directories containing them')
+    parser.add_argument('--profiles', default=','.join(AnalysisProfile.PROFILES),
+                        help='Comma-separated profiles to measure')
+    parser.add_argument('--limit', type=int, default=0, help='Only measure the first binaries (0 measures all)')
+    parser.add_argument('--csv', help='Write the measurement of every binary and profile to a CSV file')
+    args: argparse.Namespace = parser.parse_args()
+
+    selected = [profile.strip() for profile in args.profiles.split(',') if profile.strip()]
+    for name in selected:
+        AnalysisProfile.get(name)
+    binaries = list(find_binaries(args.paths))
+    if args.limit:
+        binaries = binaries[:args.limit]
+
+    all_results = []
+    # A fresh process per analysis, so the peak memory is the one of that analysis
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for binary_path in binaries:
+            for name in selected:
+                measurement = pool.apply(measure, (binary_path, name))
+                all_results.append(measurement)
+                print(f'{name:<10} {binary_path} {measurement.get("load_seconds", 0):.2f}s load '
+                      f'{measurement.get("cfg_seconds", 0):.2f}s cfg {measurement["peak_rss_mib"]:.0f} MiB '
+                      f'{measurement["error"]}', file=sys.stderr)
+
+    if args.csv:
+        fields = ['binary', 'profile', 'load_seconds', 'cfg_seconds', 'peak_rss_mib', 'functions', 'nodes',
+                  'single_cfi', 'modified', 'scs', 'error']
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(all_results)
+    summarize(all_results, selected)
@@ -0,0 +1,87 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from angr import Project
+
+
+class AnalysisProfile:
+    """
+    Named settings of the angr loader and of CFGFast. The default profile keeps the settings the checkers were
+    developed with, the minimal profile skips the shared libraries and the data references the checkers do not use,
+    and the thorough profile resolves as much as possible. The name of the profile is stored with the results of each binary.
+    """
+
+    MINIMAL: str = 'minimal'
+    DEFAULT: str = 'default'
+    THOROUGH: str = 'thorough'
+    PROFILES = (MINIMAL, DEFAULT, THOROUGH)
+
+    # Base address the binaries are loaded at in all profiles
+    BASE_ADDRESS: int = 0x100000
+
+    def __init__(self, name: str, load_options: Dict, cfg_options: Dict, main_object_only=False):
+        """
+        :param name: name of the profile, one of PROFILES
+        :param load_options: keyword arguments of angr.Project
+        :param cfg_options: keyword arguments of CFGFast
+        :param main_object_only: restrict CFGFast to the executable regions of the main object
+        """
+        self.name: str = name
+        self.load_options: Dict = load_options
+        self.cfg_options: Dict = cfg_options
+        self.main_object_only: bool = main_object_only
+
+    @staticmethod
+    def get(name: str) -> 'AnalysisProfile':
+        """
+        :param name: name of the profile, one of PROFILES
+        :return: AnalysisProfile with that name
+        """
+        if name == AnalysisProfile.MINIMAL:
+            # Indirect jumps stay resolved, without them the protected indirect calls lose the successors the
+            # single-module CFI check relies on
+            return AnalysisProfile(name, {'auto_load_libs': False},
+                                   {'data_references': False, 'cross_references': False, 'normalize': False},
+                                   main_object_only=True)
+        if name == AnalysisProfile.DEFAULT:
+            return AnalysisProfile(name, {}, {})
+        if name == AnalysisProfile.THOROUGH:
+            return AnalysisProfile(name, {},
+                                   {'resolve_indirect_jumps': True, 'data_references': True,
+                                    'cross_references': True, 'normalize': True})
+        raise ValueError(f'Unknown analysis profile {name}')
+
+    def load(self, binary: Path) -> 'Project':
+        """
+        :param binary: path to binary file to load
+        :return: angr project of the binary
+        """
+        # Imported here, so runs only checking for multi-module CFI never import angr
+        import angr
+        return angr.Project(binary, main_opts={'base_addr': AnalysisProfile.BASE_ADDRESS}, **self.load_options)
+
+    def generate_cfg(self, proj: 'Project'):
+        """
+        :param proj: angr project of the binary
+        :return: CFGFast of the binary
+        """
+        options = dict(self.cfg_options)
+        if self.main_object_only:
+            regions = AnalysisProfile.__executable_regions(proj)
+            if regions:
+                options['regions'] = regions
+        return proj.analyses.CFGFast(**options)
+
+    @staticmethod
+    def __executable_regions(proj: 'Project') -> List[Tuple[int, int]]:
+        """
+        :param proj: angr project of the binary
+        :return: Start and end address of the executable segments of the main object (sections if it has none)
+        """
+        main_object = proj.loader.main_object
+        regions = main_object.segments if len(main_object.segments) else main_object.sections
+        return [(region.min_addr, region.max_addr + 1) for region in regions if region.is_executable]
+
+    def __repr__(self) -> str:
+        return f'AnalysisProfile({self.name})'
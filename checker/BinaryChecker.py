@@ -1,19 +1,24 @@
 from pathlib import Path
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-import angr
 import logging
-import signal
-import os
 
 import global_variables
-from checker import Helper
+import checker.Helper as helper
+from checker.AnalysisProfile import AnalysisProfile
+from checker.CfgSummary import CfgSummary
+from checker.DetectorCascade import Detector, DetectorCascade
+from checker.JumpTableScanner import JumpTableScanner
+from checker.StageBudget import StageBudget, StageTimeout
 from results.BinaryObject import BinaryObject
 from checker.SingleModuleCFIChecker import SingleModuleCFIChecker
 from checker.MultiModuleCFIChecker import MultiModuleCFIChecker
 from checker.ShadowCallStackChecker import ShadowCallStackChecker
+from checker.LinearShadowCallStackChecker import LinearShadowCallStackChecker
+from checker.TrapSiteCFIChecker import TrapSiteCFIChecker
 
-from angr import Project
+if TYPE_CHECKING:
+    from angr import Project
 
 
 class BinaryChecker:
@@ -21,8 +26,24 @@ class BinaryChecker:
     Generates BinaryObjects and performs analysis.
     """
 
+    # Increased whenever a checker changes its results, verdicts of older versions are not reused
+    ANALYZER_VERSION: str = '1'
+    # Checks run on a binary, verdicts are cached per set of checks
+    ALL_CHECKS: str = 'all'
+    MULTI_CFI_CHECK: str = 'multi_cfi'
+    # Engines of the ShadowCallStack check: on the CFG of angr or by a linear sweep of the function starts
+    CFG_SCS_ENGINE: str = 'cfg'
+    LINEAR_SCS_ENGINE: str = 'linear'
+    SCS_ENGINES = (CFG_SCS_ENGINE, LINEAR_SCS_ENGINE)
+    # Engines of the single-module CFI check: on the CFG of angr or from the CFI trap sites
+    CFG_SINGLE_CFI_ENGINE: str = 'cfg'
+    TRAP_SINGLE_CFI_ENGINE: str = 'trap'
+    SINGLE_CFI_ENGINES = (CFG_SINGLE_CFI_ENGINE, TRAP_SINGLE_CFI_ENGINE)
+
     def __init__(self, binary: Path, image: str, special_file: str, linux: bool, skipDB=False, ignore_unsafe=False,
-                 skip_db_check=False, load=True, only_multi_cfi=False):
+                 skip_db_check=False, load=True, only_multi_cfi=False,
+                 budget: Union[StageBudget, None] = None, reuse_verdicts=False, scs_engine=CFG_SCS_ENGINE,
+                 single_cfi_engine=CFG_SINGLE_CFI_ENGINE, analysis_profile=AnalysisProfile.DEFAULT):
         """
         Only load binary and generate CFG if it does not exist in database.
 
@@ -33,55 +54,157 @@ class BinaryChecker:
         :skipDB: only analyze a single binary and not a complete image
         :ignore_unsafe: analyze all binaries and not only memory-unsafe
         :skip_db_check: do not check if the binary already exists in the database
-        :load: only generate CFG if set
+        :load: only load binary and generate CFG if set, otherwise call load() later
         :only_multi_cfi: only check for multi-module CFI
+        :budget: time budgets of the analysis stages, default budgets if not set
+        :reuse_verdicts: copy the results of a binary with the same checksum analyzed before instead of analyzing it
+        :scs_engine: engine of the ShadowCallStack check, one of SCS_ENGINES
+        :single_cfi_engine: engine of the single-module CFI check, one of SINGLE_CFI_ENGINES
+        :analysis_profile: loader and CFGFast settings, one of AnalysisProfile.PROFILES
         """
         self.logging = logging.getLogger(__name__)
+        self.scs_engine: str = scs_engine
+        self.single_cfi_engine: str = single_cfi_engine
+        self.profile: AnalysisProfile = AnalysisProfile.get(analysis_profile)
+        self.budget: StageBudget = budget if budget is not None else StageBudget()
         self.analyze: bool = False
         self.binary: Path = binary
         self.binary_obj: BinaryObject = self.__create_binary_obj(image, special_file)
+        self.binary_obj.analysis_profile = analysis_profile
         self.skip_db_check: bool = skip_db_check
         if skipDB:
             self.already_exits = False
         else:
             self.already_exits: bool = self.__exists_in_database()
 
-        if load and only_multi_cfi and self.binary_obj.unsafe_language and (
-                not self.already_exits or self.skip_db_check):
-            self.logging.info(f'Analyzing {self.binary_obj.to_string()}')
-            self.proj: Project = self.__load_binary()
+        self.__needs_cfg: bool = False
+        self.__cfg_generated: bool = False
+        self.__summary_loaded: bool = False
+        self.proj = None
+        self.cfg = None
+        self.summary: Union[CfgSummary, None] = None
+        # Verdicts of other engines are cached apart, so the engines can be compared on the same binaries
+        self.checks: str = BinaryChecker.__all_checks(scs_engine, single_cfi_engine, analysis_profile)
+        self.reused: bool = False
+        self.cascade: DetectorCascade = self.__create_cascade()
+
+        if only_multi_cfi and self.binary_obj.unsafe_language and (not self.already_exits or self.skip_db_check):
+            self.checks = BinaryChecker.MULTI_CFI_CHECK
             self.analyze = True
 
-        elif load and self.binary_obj.unsafe_language and (not self.already_exits or self.skip_db_check):
-            self.logging.info(f'Analyzing {self.binary_obj.to_string()}')
-            self.proj: Project = self.__load_binary()
-            self.cfg = self.__generate_cfg()
-            signal.alarm(0)
+        elif self.binary_obj.unsafe_language and (not self.already_exits or self.skip_db_check):
+            self.__needs_cfg = True
             self.analyze = True
 
-        elif load and ((not self.already_exits and self.binary_obj.unsafe_language) or
-                       (linux and ignore_unsafe and (not self.binary_obj.unsafe_language or self.__has_single_cfi())) or
-                       (not linux and ignore_unsafe and not self.binary_obj.unsafe_language)):
-            self.logging.info(f'Analyzing {self.binary_obj.to_string()}')
-            self.proj: Project = self.__load_binary()
-            self.cfg = self.__generate_cfg()
-            signal.alarm(0)
+        elif (not self.already_exits and self.binary_obj.unsafe_language) or \
+                (linux and ignore_unsafe and (not self.binary_obj.unsafe_language or self.__has_single_cfi())) or \
+                (not linux and ignore_unsafe and not self.binary_obj.unsafe_language):
+            self.__needs_cfg = True
             self.analyze = True
 
+        elif self.already_exits:
+            self.logging.info(f'Binary already exists in database {binary.name}')
+
+        if self.analyze and reuse_verdicts:
+            self.reused = self.__reuse_verdict()
+            if self.reused:
+                self.binary_obj.verdict_tier = DetectorCascade.CACHE
+
+        if load and self.analyze and not self.reused:
+            self.load()
+
+    def load(self):
+        """
+        Prepare the analysis of a binary that needs to be analyzed.
+        Split from the constructor so the decision can be taken in the main process and the analysis in a worker.
+        The binary is only loaded into angr and its CFG generated once a check of the cascade needs them.
+        """
+        if self.reused:
+            return
+        self.logging.info(f'Analyzing {self.binary_obj.to_string()}')
+        helper.reset_instruction_cache()
+
+    def __create_cascade(self) -> DetectorCascade:
+        """
+        Detectors of the selected engines. With the CFG-based engines, pre-filters answer the questions that can
+        be ruled out without the CFG, the verdicts stay those of the CFG-based checks.
+        With the CFG cache, the CFG-based checks run on the cached summary of the CFG.
+
+        :return: Cascade of the detectors
+        """
+        multi = StageBudget.MULTI_CFI
+        single = StageBudget.SINGLE_CFI
+        scs = StageBudget.SCS
+        summaries = global_variables.cfg_cache is not None
+        detectors = [Detector(multi, DetectorCascade.SYMBOLS, MultiModuleCFIChecker.run)]
+        if self.single_cfi_engine == BinaryChecker.TRAP_SINGLE_CFI_ENGINE:
+            detectors.append(Detector(single, DetectorCascade.WINDOWS, TrapSiteCFIChecker.run))
+        else:
+            detectors.append(Detector(single, DetectorCascade.SECTIONS, TrapSiteCFIChecker.rule_out))
+            detectors.append(Detector(single, DetectorCascade.CFG, SingleModuleCFIChecker.run_summary
+                                      if summaries else SingleModuleCFIChecker.run))
+        if self.scs_engine == BinaryChecker.LINEAR_SCS_ENGINE:
+            detectors.append(Detector(scs, DetectorCascade.WINDOWS, LinearShadowCallStackChecker.run))
         else:
-            self.proj = None
-            self.cfg = None
-            if self.already_exits:
-                self.logging.info(f'Binary already exists in database {binary.name}')
+            detectors.append(Detector(scs, DetectorCascade.BYTES, LinearShadowCallStackChecker.rule_out))
+            detectors.append(Detector(scs, DetectorCascade.CFG, ShadowCallStackChecker.run_summary
+                                      if summaries else ShadowCallStackChecker.run))
+        return DetectorCascade(detectors)
+
+    def __ensure_cfg(self):
+        """
+        Load the binary and generate its CFG, unless that was already tried.
+        """
+        if not self.__cfg_generated:
+            self.__cfg_generated = True
+            self.proj = self.__load_binary()
+            self.cfg = self.__generate_cfg()
 
-    def __load_binary(self) -> Union[Project, None]:
+    def __ensure_summary(self):
+        """
+        Look up the CFG summary of the binary in the CFG cache, otherwise generate the CFG and cache its summary.
+        """
+        if self.__summary_loaded:
+            return
+        self.__summary_loaded = True
+        checksum = f'{global_variables.checksum_algorithm}:{self.binary_obj.checksum}'
+        self.summary = global_variables.cfg_cache.get(checksum, self.profile.name)
+        if self.summary is not None:
+            self.logging.info(f'Using cached CFG summary of {self.binary.name}')
+            return
+        self.__ensure_cfg()
+        if self.cfg is None:
+            return
+        self.summary = self.__run_stage(StageBudget.CFG, CfgSummary.from_cfg, self.cfg)
+        if self.summary is not None:
+            global_variables.cfg_cache.put(checksum, self.profile.name, self.summary)
+
+    def prepare_retry(self, budget: StageBudget):
+        """
+        Reset the results of a binary that ran out of time to analyze it again with a larger budget.
+
+        :param budget: time budgets for the retry
+        """
+        self.budget = budget
+        self.proj = None
+        self.cfg = None
+        self.__cfg_generated = False
+        self.summary = None
+        self.__summary_loaded = False
+        self.binary_obj.reset_results()
+
+    def __load_binary(self) -> Union['Project', None]:
         """
         Try to load binary if not possible store error message in binary object.
 
         :return: angr project or None if binary could not be loaded by angr
         """
         try:
-            return angr.Project(self.binary, main_opts={'base_addr': 0x100000})
+            with self.budget.stage(StageBudget.LOAD):
+                return self.profile.load(self.binary)
+        except StageTimeout as e:
+            self.__record_timeout(e)
+            return None
         except Exception as e:
             logging.exception('Invalid binary', e)
             self.binary_obj.error = self.binary_obj.error + f'ERROR: Could not load binary because of {e}'
@@ -103,10 +226,12 @@ class BinaryChecker:
 
         :return: angr CFG or None if CFG could not be generated
         """
-        signal.signal(signal.SIGALRM, Helper.timeout_handler)
-        signal.alarm(900)
         try:
-            return self.proj.analyses.CFGFast()
+            with self.budget.stage(StageBudget.CFG):
+                return self.profile.generate_cfg(self.proj)
+        except StageTimeout as e:
+            self.__record_timeout(e)
+            return None
         except Exception as e:
             logging.exception(f'CFG generation failed {e}')
             self.binary_obj.error = self.binary_obj.error + f'ERROR: Could not generate CFG because of {e}'
@@ -120,107 +245,185 @@ class BinaryChecker:
 
         :return: Updated BinaryObject
         """
+        multi = StageBudget.MULTI_CFI
+        single = StageBudget.SINGLE_CFI
+        scs = StageBudget.SCS
+        if self.reused:
+            return self.binary_obj
+        if self.__needs_cfg and not only_multi_module:
+            # Evidence next to the single-module CFI verdict, costs a single pass over the executable sections
+            self.__run_stage(single, JumpTableScanner.run, self.binary_obj)
+        if not dump_assembly:
+            self.binary_obj.verdict_tier = self.cascade.run(
+                lambda question, answers: self.__is_pending(question, answers, single_module, only_multi_module),
+                self.__run_detector)
+            return self.binary_obj
+        # Dumping the assembly relies on the blocks of the CFG
+        self.__ensure_cfg()
+        self.binary_obj.verdict_tier = DetectorCascade.CFG
         if self.proj is not None:
-            if only_multi_module:
-                MultiModuleCFIChecker.run(self.proj, self.binary_obj)
-            elif dump_assembly:
-                if single_module:
-                    MultiModuleCFIChecker.run(self.proj, self.binary_obj)
-                    if self.cfg is not None:
-                        SingleModuleCFIChecker.run_all(self.cfg, self.binary_obj, filename)
-                elif not MultiModuleCFIChecker.run(self.proj, self.binary_obj) and self.cfg is not None:
-                    SingleModuleCFIChecker.run_all(self.cfg, self.binary_obj, filename)
+            if single_module:
+                self.__run_stage(multi, MultiModuleCFIChecker.run, self.binary_obj)
                 if self.cfg is not None:
-                    ShadowCallStackChecker.run_all(self.cfg, self.binary_obj, filename)
-            elif single_module:
-                MultiModuleCFIChecker.run(self.proj, self.binary_obj)
-                if self.cfg is not None:
-                    SingleModuleCFIChecker.run(self.cfg, self.binary_obj)
-                    ShadowCallStackChecker.run(self.cfg, self.binary_obj)
-            else:
-                if not MultiModuleCFIChecker.run(self.proj, self.binary_obj) and self.cfg is not None:
-                    SingleModuleCFIChecker.run(self.cfg, self.binary_obj)
-                if self.cfg is not None:
-                    ShadowCallStackChecker.run(self.cfg, self.binary_obj)
+                    self.__run_stage(single, SingleModuleCFIChecker.run_all, self.cfg, self.binary_obj, filename)
+            elif not self.__run_stage(multi, MultiModuleCFIChecker.run, self.binary_obj) \
+                    and self.cfg is not None:
+                self.__run_stage(single, SingleModuleCFIChecker.run_all, self.cfg, self.binary_obj, filename)
+            if self.cfg is not None:
+                self.__run_stage(scs, ShadowCallStackChecker.run_all, self.cfg, self.binary_obj, filename)
         return self.binary_obj
 
-    def __exists_in_database(self, binary_path=None) -> bool:
+    def __is_pending(self, question: str, answers: dict, single_module: bool, only_multi_module: bool) -> bool:
         """
-        Check if binary object already exists in database.
-
-        :param binary_path: possible to check based on BinaryPath
-        :return: Whether binary exists in database
+        :param question: stage of the question, see StageBudget
+        :param answers: answers of the cascade so far
+        :return: Whether the cascade still has to answer the question
         """
-        if binary_path:
-            query = 'SELECT * FROM BinaryFile WHERE Subimage LIKE ? AND BinaryPath LIKE ?;'
-            global_variables.cursor.execute(query, (self.binary_obj.image, '%' + binary_path,))
-        else:
-            query = 'SELECT * FROM BinaryFile WHERE Id LIKE ?;'
-            global_variables.cursor.execute(query, (self.binary_obj.id,))
-        rows = global_variables.cursor.fetchall()
-        if len(rows) > 0:
+        if question == StageBudget.MULTI_CFI:
             return True
-        else:
+        if only_multi_module or not self.__needs_cfg:
             return False
+        # Single-module CFI is only checked if the binary has no multi-module CFI
+        return question != StageBudget.SINGLE_CFI or single_module or not answers.get(StageBudget.MULTI_CFI, False)
 
-    def __has_single_cfi(self) -> bool:
+    def __run_detector(self, detector: Detector) -> Union[bool, None]:
         """
-        Check in database if binary object is compiled using single-module CFI.
+        Run a detector of the cascade within the time budget of its question, the CFG (or its summary) is generated
+        on first use.
 
-        :return: Whether binary was compiled using single-module CFI
+        :param detector: detector to run
+        :return: Answer of the detector, None if it could not answer or ran out of time
         """
-        query = 'SELECT * FROM BinaryFile WHERE Id LIKE ? and Single_CFI = 1;'
-        global_variables.cursor.execute(query, (self.binary_obj.id,))
-        rows = global_variables.cursor.fetchall()
-        if len(rows) > 0:
-            return True
-        return False
+        if detector.tier != DetectorCascade.CFG:
+            return self.__run_stage(detector.question, detector.check, self.binary_obj)
+        if global_variables.cfg_cache is not None:
+            self.__ensure_summary()
+            cfg = self.summary
+        else:
+            self.__ensure_cfg()
+            cfg = self.cfg
+        if cfg is None:
+            return None
+        return self.__run_stage(detector.question, detector.check, cfg, self.binary_obj)
+
+    def __run_stage(self, stage: str, check, *args):
+        """
+        Run a check within the time budget of its stage.
+
+        :param stage: stage of the check, one of StageBudget.STAGES
+        :param check: check to run
+        :return: Result of the check or None if it ran out of time
+        """
+        try:
+            with self.budget.stage(stage):
+                return check(*args)
+        except StageTimeout as e:
+            self.__record_timeout(e)
+            return None
+
+    def __record_timeout(self, timeout: StageTimeout):
+        """
+        Store which stage ran out of time, the binary is retried later with a larger budget.
 
-    def __has_multi_cfi(self, binary_path: str) -> bool:
+        :param timeout: raised timeout of the stage
         """
-        Check in database if binary object is compiled using multi-module CFI.
+        logging.warning(f'Analysis of {self.binary} ran out of time: {timeout}')
+        self.binary_obj.error = self.binary_obj.error + f'TIMEOUT: {timeout.stage} took longer than {timeout.seconds}s'
+        if not self.binary_obj.timed_out_stage:
+            self.binary_obj.timed_out_stage = timeout.stage
 
-        :return: Whether binary was compiled using multi-module CFI
+    def __exists_in_database(self) -> bool:
         """
-        query = 'SELECT * FROM BinaryFile WHERE Subimage LIKE ? AND BinaryPath LIKE ? AND Multi_CFI = 1;'
-        global_variables.cursor.execute(query, (self.binary_obj.image, '%' + binary_path,))
-        rows = global_variables.cursor.fetchall()
+        Check if binary object already exists in database, in the known binaries if they were loaded.
+
+        :return: Whether binary exists in database
+        """
+        if global_variables.known_binaries is not None:
+            return global_variables.known_binaries.exists(self.binary_obj.id)
+        if global_variables.result_writer.is_pending(('BinaryFile', self.binary_obj.id)):
+            return True
+        with global_variables.database_lock:
+            query = 'SELECT Id FROM BinaryFile WHERE Id = ?;'
+            global_variables.cursor.execute(query, (self.binary_obj.id,))
+            rows = global_variables.cursor.fetchall()
         if len(rows) > 0:
             return True
+        else:
+            return False
 
-        return False
+    def __reuse_verdict(self) -> bool:
+        """
+        Copy the results of a binary with the same checksum, analyzed with the same analyzer version, from the
+        verdict cache, all sets of checks that serve the run are looked up with one query. Results of all checks
+        also serve a run only checking for multi-module CFI.
 
-    def __update_lib32(self):
+        :return: Whether cached results were found and copied
         """
-        Update database if Lib32 error.
+        checks = [self.checks]
+        if self.checks == BinaryChecker.MULTI_CFI_CHECK:
+            checks.extend(BinaryChecker.__all_checks(scs_engine, single_cfi_engine, analysis_profile)
+                          for scs_engine in BinaryChecker.SCS_ENGINES
+                          for single_cfi_engine in BinaryChecker.SINGLE_CFI_ENGINES
+                          for analysis_profile in AnalysisProfile.PROFILES)
+        params = (self.binary_obj.checksum, global_variables.checksum_algorithm, BinaryChecker.ANALYZER_VERSION)
+        query = global_variables.verdict_query.format(', '.join('?' for _ in checks))
+        with global_variables.database_lock:
+            global_variables.result_writer.flush_pending(*(('VerdictCache',) + params + (cached_checks,)
+                                                           for cached_checks in checks))
+            global_variables.cursor.execute(query, params + tuple(checks))
+            rows = global_variables.cursor.fetchall()
+        if len(rows) == 0:
+            return False
+        # The results of the requested checks are preferred, then in the order of checks
+        _, modified, multi_cfi, single_cfi, scs = min(rows, key=lambda row: checks.index(row[0]))
+        self.binary_obj.multi_cfi = bool(multi_cfi)
+        if self.checks != BinaryChecker.MULTI_CFI_CHECK:
+            self.binary_obj.modified = bool(modified)
+            self.binary_obj.single_cfi = bool(single_cfi)
+            self.binary_obj.scs = bool(scs)
+        self.logging.info(f'Reusing results of checksum {self.binary_obj.checksum} for {self.binary.name}')
+        return True
+
+    @staticmethod
+    def __all_checks(scs_engine: str, single_cfi_engine: str, analysis_profile: str) -> str:
         """
-        query = 'UPDATE BinaryFile SET Multi_CFI=1, Error=? WHERE Subimage LIKE ? AND Id LIKE ?;'
-        global_variables.cursor.execute(query, ('Lib32', self.binary_obj.image, self.binary_obj.id,))
-        logging.info(f'Updating {self.binary_obj} due to Lib32 error')
-        global_variables.connection.commit()
+        :return: Verdict cache key of all checks run with the given engines and profile, e.g. 'all+linear+trap'
+        """
+        checks = BinaryChecker.ALL_CHECKS
+        if scs_engine != BinaryChecker.CFG_SCS_ENGINE:
+            checks += f'+{scs_engine}'
+        if single_cfi_engine != BinaryChecker.CFG_SINGLE_CFI_ENGINE:
+            checks += f'+{single_cfi_engine}'
+        if analysis_profile != AnalysisProfile.DEFAULT:
+            checks += f'+{analysis_profile}'
+        return checks
 
-    def __prepare_path(self) -> tuple[str, str]:
+    def cache_verdict(self, binary_obj: BinaryObject):
         """
-        Generate the /lib and /lib64 path for a binary to check.
+        Store the results of an analyzed binary in the verdict cache, unless the analysis failed or ran out of time
+        or the results were copied from the cache.
 
-        :return: /lib and /lib64 path
+        :param binary_obj: analyzed BinaryObject
         """
-        original_path = self.binary_obj.path.as_posix()
-        splitted = original_path.split('/lib/')
-        if len(splitted) == 2:
-            prefix = splitted[0].split('/')
-            if len(prefix) > 1:
-                path_part = prefix[-1]
-                return os.path.join(path_part, 'lib', splitted[1]), os.path.join(path_part, 'lib64', splitted[1])
+        if self.reused or binary_obj.error or binary_obj.timed_out_stage:
+            return
+        params = (binary_obj.checksum, global_variables.checksum_algorithm, BinaryChecker.ANALYZER_VERSION,
+                  self.checks, binary_obj.modified, binary_obj.multi_cfi, binary_obj.single_cfi, binary_obj.scs)
+        global_variables.result_writer.add(global_variables.verdict_cache_query, params, ('VerdictCache',) + params[:4])
 
-    def fix_lib32(self):
+    def __has_single_cfi(self) -> bool:
         """
-        Check and if needed update 32-bit binary due to Lib32 error.
+        Check in database (or the known binaries) if binary object is compiled using single-module CFI.
+
+        :return: Whether binary was compiled using single-module CFI
         """
-        try:
-            path32, path64 = self.__prepare_path()
-            if not self.__has_multi_cfi(path32):
-                if self.__exists_in_database(binary_path=path64) and self.__has_multi_cfi(path64):
-                    self.__update_lib32()
-        except Exception as e:
-            logging.info(f'Could not check lib32 due to {e}.')
+        if global_variables.known_binaries is not None:
+            return global_variables.known_binaries.has_single_cfi(self.binary_obj.id)
+        query = 'SELECT Id FROM BinaryFile WHERE Id = ? and Single_CFI = 1;'
+        with global_variables.database_lock:
+            global_variables.result_writer.flush_pending(('BinaryFile', self.binary_obj.id))
+            global_variables.cursor.execute(query, (self.binary_obj.id,))
+            rows = global_variables.cursor.fetchall()
+        if len(rows) > 0:
+            return True
+        return False
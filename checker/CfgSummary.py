@@ -0,0 +1,65 @@
+from typing import Dict, List
+
+import checker.Helper as helper
+
+
+class CfgSummary:
+    """
+    Compact form of a CFG holding only the decoded blocks the CFG-based checks look at, so it can be cached on disk
+    and the checks rerun without generating the CFG again:
+    branchings whose successors contain a trap instruction and functions whose entry block uses x18.
+    """
+
+    # Increased whenever the checks need more of the CFG, older summaries are discarded
+    VERSION: int = 1
+
+    def __init__(self, branchings: List[List], functions: List[List]):
+        """
+        :param branchings: [branching block, first successor block, second successor block] of branching nodes
+        :param functions: [entry block, return blocks] of functions
+        """
+        self.branchings: List[List] = branchings
+        self.functions: List[List] = functions
+
+    @staticmethod
+    def from_cfg(cfg) -> 'CfgSummary':
+        """
+        Summarize a CFG, nodes are visited in the order the checks visit them.
+
+        :param cfg: generated CFG of the binary
+        :return: Summary of the CFG
+        """
+        branchings = []
+        branching_nodes = cfg.model.get_branching_nodes()
+        while len(branching_nodes):
+            b_node = branching_nodes.pop()
+            if len(b_node.successors) != 2:
+                continue
+            one, two = b_node.successors
+            if one is None or two is None or one.block is None or two.block is None:
+                continue
+            if helper.has_mnemonic(one.block, 'ud') or helper.has_mnemonic(two.block, 'ud'):
+                branchings.append([helper.parse_irsb_node(b_node), helper.parse_irsb_block(one.block),
+                                   helper.parse_irsb_block(two.block)])
+
+        functions = []
+        for addr, function in cfg.functions.items():
+            if function.has_return and not function.is_simprocedure:
+                entry_block = helper.parse_irsb_block(function.get_block(addr))
+                if any('x18' in instruction[1] for instruction in entry_block if len(instruction) == 2):
+                    functions.append([entry_block, helper.get_return_blocks(function)])
+        return CfgSummary(branchings, functions)
+
+    def to_data(self) -> Dict:
+        """
+        :return: JSON serializable form of the summary
+        """
+        return {'branchings': self.branchings, 'functions': self.functions}
+
+    @staticmethod
+    def from_data(data: Dict) -> 'CfgSummary':
+        """
+        :param data: result of to_data
+        :return: Summary
+        """
+        return CfgSummary(data['branchings'], data['functions'])
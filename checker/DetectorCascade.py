@@ -0,0 +1,56 @@
+from typing import Callable, Dict, List, NamedTuple, Union
+
+
+class Detector(NamedTuple):
+    """
+    A check answering one question about a binary from one kind of input.
+    The check returns True or False once the question is answered and None if a more expensive detector has to
+    decide, e.g. a pre-filter ruling out binaries without any trap instruction.
+    """
+    question: str
+    tier: str
+    check: Callable[..., Union[bool, None]]
+
+
+class DetectorCascade:
+    """
+    Runs detectors ordered by the cost of their input, so the angr project and CFG are only built once a question
+    is still open after all cheaper detectors ran.
+    """
+
+    # Inputs of the detectors, ordered by the cost of producing them
+    BYTES: str = 'bytes'
+    SECTIONS: str = 'sections'
+    SYMBOLS: str = 'symbols'
+    WINDOWS: str = 'windows'
+    CFG: str = 'cfg'
+    TIERS = (BYTES, SECTIONS, SYMBOLS, WINDOWS, CFG)
+    # Verdict copied from the verdict cache
+    CACHE: str = 'cache'
+
+    def __init__(self, detectors: List[Detector]):
+        """
+        :param detectors: detectors of all questions, detectors of the same tier keep their order
+        """
+        self.detectors: List[Detector] = sorted(detectors, key=lambda detector: DetectorCascade.TIERS.index(
+            detector.tier))
+
+    def run(self, is_pending: Callable[[str, Dict[str, bool]], bool],
+            run_detector: Callable[[Detector], Union[bool, None]]) -> Union[str, None]:
+        """
+        Run the detectors of all pending questions until each question is answered.
+
+        :param is_pending: tells if a question still has to be answered, given the answers so far
+        :param run_detector: runs a detector and returns its answer
+        :return: Most expensive tier that was run, None if no detector ran
+        """
+        answers: Dict[str, bool] = {}
+        tier = None
+        for detector in self.detectors:
+            if detector.question in answers or not is_pending(detector.question, answers):
+                continue
+            tier = detector.tier
+            answer = run_detector(detector)
+            if answer is not None:
+                answers[detector.question] = answer
+        return tier
@@ -0,0 +1,444 @@
+import mmap
+import re
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+
+class ElfSection(NamedTuple):
+    name: str
+    type: int
+    flags: int
+    address: int
+    offset: int
+    size: int
+    link: int
+    entry_size: int
+
+
+class ElfSectionReader:
+    """
+    Parse the ELF header and the section headers of a binary once, without starting readelf or grep.
+    Only the parsed headers and the .comment section are kept, so the reader can be passed to worker processes.
+    Section contents are read from the file when needed.
+    """
+
+    ELF_MAGIC: bytes = b'\x7fELF'
+    SHT_SYMTAB: int = 2
+    SHT_RELA: int = 4
+    SHT_NOBITS: int = 8
+    SHT_DYNSYM: int = 11
+    SHF_EXECINSTR: int = 0x4
+    SHN_UNDEF: int = 0
+    SHN_XINDEX: int = 0xffff
+    STT_FUNC: int = 2
+    EM_386: int = 3
+    EM_X86_64: int = 62
+    EM_AARCH64: int = 183
+    R_AARCH64_RELATIVE: int = 1027
+    DW_EH_PE_ABSPTR: int = 0x00
+    DW_EH_PE_PCREL: int = 0x10
+
+    COMPILER_PATTERN = re.compile(rb'gcc|clang', re.IGNORECASE)
+    BUILD_ID_SECTION: str = '.note.gnu.build-id'
+    GO_SECTIONS = ('.go.buildinfo', '.note.go.buildid', '.gopclntab')
+    RUST_COMMENT: bytes = b'rustc'
+    RUST_SYMBOLS = (b'rust_begin_unwind', b'rust_panic')
+
+    def __init__(self, path: Union[Path, str], data: Union[mmap.mmap, bytes, None] = None):
+        """
+        :param path: ELF file to parse
+        :param data: contents of the file if already mapped or read, the file is mapped otherwise
+        :raises ValueError: if the file is not a valid ELF file
+        """
+        self.path: str = str(path)
+        self.sections: Dict[str, ElfSection] = {}
+        # All section headers by index, including the null section and sections with duplicate names
+        self.section_headers: List[ElfSection] = []
+        if data is not None:
+            self.__read_headers(data)
+            return
+        with self.mapped() as data:
+            self.__read_headers(data)
+
+    def __read_headers(self, data: Union[mmap.mmap, bytes]):
+        """
+        Parse the headers and keep everything the checks on the language need, so the file is not read again.
+
+        :param data: contents of the file
+        """
+        if len(data) < 6:
+            raise ValueError(f'{self.path} is not an ELF file')
+        self.__parse(data)
+        self.comment: bytes = self.__read(data, '.comment')
+        self.rust_symbols: bool = any(
+            data.find(symbol, section.offset, section.offset + section.size) >= 0
+            for section in (self.sections.get('.dynstr'), self.sections.get('.strtab'))
+            if section is not None and section.type != ElfSectionReader.SHT_NOBITS
+            for symbol in ElfSectionReader.RUST_SYMBOLS)
+
+    def __parse(self, data: mmap.mmap):
+        """
+        Parse the ELF header and the section header table.
+
+        :param data: contents of the file
+        """
+        if data[:4] != ElfSectionReader.ELF_MAGIC or data[4] not in (1, 2) or data[5] not in (1, 2):
+            raise ValueError(f'{self.path} is not an ELF file')
+        self.is_64bit: bool = data[4] == 2
+        self.little_endian: bool = data[5] == 1
+        endian = '<' if self.little_endian else '>'
+        try:
+            if self.is_64bit:
+                self.type, self.machine, _, self.entry, _, section_offset, _, _, _, _, entry_size, count, \
+                    names_index = struct.unpack_from(endian + 'HHIQQQIHHHHHH', data, 16)
+                section_format = endian + 'IIQQQQIIQQ'
+            else:
+                self.type, self.machine, _, self.entry, _, section_offset, _, _, _, _, entry_size, count, \
+                    names_index = struct.unpack_from(endian + 'HHIIIIIHHHHHH', data, 16)
+                section_format = endian + 'IIIIIIIIII'
+            if section_offset == 0:
+                return
+            headers = [struct.unpack_from(section_format, data, section_offset)]
+            if count == 0:
+                # Extended numbering, the number of sections is stored in the first section header
+                count = headers[0][5]
+            if names_index == ElfSectionReader.SHN_XINDEX:
+                names_index = headers[0][6]
+            headers += [struct.unpack_from(section_format, data, section_offset + i * entry_size)
+                        for i in range(1, count)]
+        except struct.error as e:
+            raise ValueError(f'{self.path} has truncated ELF headers: {e}')
+        if names_index >= len(headers):
+            return
+        names_offset, names_size = headers[names_index][4], headers[names_index][5]
+        names = data[names_offset:names_offset + names_size]
+        for index, (name_offset, section_type, flags, address, offset, size, link, _, _, section_entry_size) \
+                in enumerate(headers):
+            end = names.find(b'\0', name_offset)
+            name = names[name_offset:end if end >= 0 else len(names)].decode('utf-8', 'replace')
+            section = ElfSection(name, section_type, flags, address, offset, size, link, section_entry_size)
+            self.section_headers.append(section)
+            if index > 0:
+                self.sections.setdefault(name, section)
+
+    def __read(self, data: mmap.mmap, name: str) -> bytes:
+        section = self.sections.get(name)
+        if section is None or section.type == ElfSectionReader.SHT_NOBITS:
+            return b''
+        return data[section.offset:section.offset + section.size]
+
+    @contextmanager
+    def mapped(self):
+        """
+        Map the file into memory to search several sections without reading them.
+
+        :return: Read-only memory map of the file
+        """
+        with open(self.path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def search(self, data: mmap.mmap, pattern: re.Pattern, section_names: Iterable[str]) -> bool:
+        """
+        Search a pattern in the contents of the given sections.
+
+        :param data: memory map of the file, see mapped()
+        :param pattern: compiled bytes pattern
+        :param section_names: sections to search, missing sections are skipped
+        :return: Whether the pattern occurs in any of the sections
+        """
+        for name in section_names:
+            section = self.sections.get(name)
+            if section is None or section.type == ElfSectionReader.SHT_NOBITS:
+                continue
+            if pattern.search(data, section.offset, section.offset + section.size) is not None:
+                return True
+        return False
+
+    def find_symbols(self, data: mmap.mmap, names: Iterable[str]) -> Dict[str, bool]:
+        """
+        Look up symbols in the dynamic and the static symbol table.
+
+        :param data: memory map of the file, see mapped()
+        :param names: names of the symbols to look up
+        :return: Name of each symbol found mapped to whether it is defined in the binary (False if only referenced)
+        """
+        found: Dict[str, bool] = {}
+        for table in self.section_headers:
+            if table.type not in (ElfSectionReader.SHT_DYNSYM, ElfSectionReader.SHT_SYMTAB) \
+                    or not 0 < table.link < len(self.section_headers):
+                continue
+            strings = self.section_headers[table.link]
+            strings_end = strings.offset + strings.size
+            # String tables may share suffixes, so every occurrence of a name is a possible name offset
+            offsets: Dict[int, str] = {}
+            for name in names:
+                needle = name.encode() + b'\0'
+                position = data.find(needle, strings.offset, strings_end)
+                while position >= 0:
+                    offsets[position - strings.offset] = name
+                    position = data.find(needle, position + 1, strings_end)
+            if not offsets:
+                continue
+            for name_offset, _, section_index, _, _ in self.__symbol_entries(data, table):
+                name = offsets.get(name_offset)
+                if name is not None:
+                    found[name] = found.get(name, False) or section_index != ElfSectionReader.SHN_UNDEF
+        return found
+
+    def __symbol_entries(self, data: mmap.mmap, table: ElfSection) -> Iterator[Tuple[int, int, int, int, int]]:
+        """
+        :return: Name offset, info, section index, value and size of each symbol in the table
+        """
+        endian = '<' if self.little_endian else '>'
+        entry_format = endian + ('IBBHQQ' if self.is_64bit else 'IIIBBH')
+        entry_size = struct.calcsize(entry_format)
+        size = table.size - table.size % entry_size
+        for entry in struct.iter_unpack(entry_format, data[table.offset:table.offset + size]):
+            if self.is_64bit:
+                name, info, _, section_index, value, symbol_size = entry
+            else:
+                name, value, symbol_size, info, _, section_index = entry
+            yield name, info, section_index, value, symbol_size
+
+    def function_starts(self, data: mmap.mmap) -> Dict[int, int]:
+        """
+        Collect the start addresses of functions from the symbol tables, the .eh_frame section and the
+        .init_array section, so also stripped binaries are covered.
+
+        :param data: memory map of the file, see mapped()
+        :return: Start address of each function mapped to its size, 0 if unknown
+        """
+        functions: Dict[int, int] = {}
+        for table in self.section_headers:
+            if table.type not in (ElfSectionReader.SHT_DYNSYM, ElfSectionReader.SHT_SYMTAB):
+                continue
+            for _, info, section_index, value, size in self.__symbol_entries(data, table):
+                if info & 0xf == ElfSectionReader.STT_FUNC and section_index != ElfSectionReader.SHN_UNDEF and value:
+                    functions[value] = max(size, functions.get(value, 0))
+        for address in self.__eh_frame_starts(data):
+            functions.setdefault(address, 0)
+        for address in self.__init_array_entries(data):
+            functions.setdefault(address, 0)
+        return {address: size for address, size in functions.items() if self.code_offset(address) is not None}
+
+    def executable_sections(self) -> List[ElfSection]:
+        """
+        :return: Sections containing instructions, in the order of the section headers
+        """
+        return [section for section in self.section_headers if section.flags & ElfSectionReader.SHF_EXECINSTR
+                and section.type != ElfSectionReader.SHT_NOBITS]
+
+    def code_offset(self, address: int) -> Union[int, None]:
+        """
+        :param address: virtual address
+        :return: File offset of the address if it lies in an executable section, None otherwise
+        """
+        for section in self.executable_sections():
+            if section.address <= address < section.address + section.size:
+                return section.offset + address - section.address
+        return None
+
+    def code_end(self, address: int) -> int:
+        """
+        :param address: virtual address in an executable section
+        :return: Virtual end address of the executable section containing the address
+        """
+        for section in self.section_headers:
+            if section.flags & ElfSectionReader.SHF_EXECINSTR and section.address <= address < section.address + \
+                    section.size:
+                return section.address + section.size
+        return address
+
+    def __eh_frame_starts(self, data: mmap.mmap) -> Iterator[int]:
+        """
+        :return: Initial location of each FDE in the .eh_frame section
+        """
+        section = self.sections.get('.eh_frame')
+        if section is None or section.type == ElfSectionReader.SHT_NOBITS:
+            return
+        endian = '<' if self.little_endian else '>'
+        frame = data[section.offset:section.offset + section.size]
+        encodings: Dict[int, int] = {}
+        position = 0
+        try:
+            while position + 4 <= len(frame):
+                length = struct.unpack_from(endian + 'I', frame, position)[0]
+                header = 4
+                if length == 0:
+                    break
+                if length == 0xffffffff:
+                    length = struct.unpack_from(endian + 'Q', frame, position + 4)[0]
+                    header = 12
+                start = position + header
+                end = start + length
+                cie_pointer = struct.unpack_from(endian + 'I', frame, start)[0]
+                if cie_pointer == 0:
+                    encodings[position] = self.__cie_pointer_encoding(frame, start + 4)
+                else:
+                    cie = start - cie_pointer
+                    encoding = encodings.get(cie, ElfSectionReader.DW_EH_PE_ABSPTR)
+                    address, _ = self.__read_encoded(frame, start + 4, encoding, section.address)
+                    if address:
+                        yield address
+                position = end
+        except (struct.error, IndexError, ValueError):
+            return
+
+    def __cie_pointer_encoding(self, frame: bytes, position: int) -> int:
+        """
+        :return: Encoding of the FDE addresses declared by the augmentation of a CIE
+        """
+        version = frame[position]
+        end = frame.index(b'\0', position + 1)
+        augmentation = frame[position + 1:end].decode('ascii', 'replace')
+        position = end + 1
+        if 'eh' in augmentation:
+            position += 8 if self.is_64bit else 4
+        _, position = ElfSectionReader.__uleb128(frame, position)
+        _, position = ElfSectionReader.__uleb128(frame, position)
+        if version == 1:
+            position += 1
+        else:
+            _, position = ElfSectionReader.__uleb128(frame, position)
+        if not augmentation.startswith('z'):
+            return ElfSectionReader.DW_EH_PE_ABSPTR
+        _, position = ElfSectionReader.__uleb128(frame, position)
+        for character in augmentation[1:]:
+            if character == 'R':
+                return frame[position]
+            if character == 'P':
+                _, position = self.__read_encoded(frame, position + 1, frame[position], 0)
+            elif character == 'L':
+                position += 1
+        return ElfSectionReader.DW_EH_PE_ABSPTR
+
+    def __read_encoded(self, frame: bytes, position: int, encoding: int, section_address: int) -> Tuple[int, int]:
+        """
+        Read a DWARF exception handling pointer.
+
+        :return: Value and position after the value
+        """
+        endian = '<' if self.little_endian else '>'
+        value_format = encoding & 0x0f
+        if value_format == 0x01:
+            value, end = ElfSectionReader.__uleb128(frame, position)
+        elif value_format == 0x09:
+            value, end = ElfSectionReader.__sleb128(frame, position)
+        else:
+            code = {0x00: 'Q' if self.is_64bit else 'I', 0x02: 'H', 0x03: 'I', 0x04: 'Q',
+                    0x0a: 'h', 0x0b: 'i', 0x0c: 'q'}.get(value_format)
+            if code is None:
+                raise ValueError(f'Unknown pointer encoding {encoding:#x}')
+            value = struct.unpack_from(endian + code, frame, position)[0]
+            end = position + struct.calcsize(code)
+        if encoding & 0x70 == ElfSectionReader.DW_EH_PE_PCREL:
+            value += section_address + position
+        return value & (0xffffffffffffffff if self.is_64bit else 0xffffffff), end
+
+    @staticmethod
+    def __uleb128(frame: bytes, position: int) -> Tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = frame[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, position
+
+    @staticmethod
+    def __sleb128(frame: bytes, position: int) -> Tuple[int, int]:
+        value = shift = 0
+        while True:
+            byte = frame[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                if byte & 0x40:
+                    value -= 1 << shift
+                return value, position
+
+    def __init_array_entries(self, data: mmap.mmap) -> Iterator[int]:
+        """
+        :return: Function pointers in the .init_array section, including those only set by relative relocations
+        """
+        section = self.sections.get('.init_array')
+        if section is None or section.type == ElfSectionReader.SHT_NOBITS:
+            return
+        endian = '<' if self.little_endian else '>'
+        pointer = 'Q' if self.is_64bit else 'I'
+        size = section.size - section.size % struct.calcsize(pointer)
+        yield from (address for address, in struct.iter_unpack(endian + pointer,
+                                                                 data[section.offset:section.offset + size]) if address)
+        if not self.is_64bit:
+            return
+        for relocations in self.section_headers:
+            if relocations.type != ElfSectionReader.SHT_RELA:
+                continue
+            size = relocations.size - relocations.size % 24
+            for offset, info, addend in struct.iter_unpack(endian + 'QQq',
+                                                           data[relocations.offset:relocations.offset + size]):
+                if info & 0xffffffff == ElfSectionReader.R_AARCH64_RELATIVE and \
+                        section.address <= offset < section.address + section.size:
+                    yield addend
+
+    def has_section(self, name: str) -> bool:
+        return name in self.sections
+
+    def section_data(self, name: str) -> bytes:
+        """
+        Read the contents of a section from the file.
+
+        :param name: name of the section
+        :return: Contents of the section, empty if the section does not exist or has no contents in the file
+        """
+        section = self.sections.get(name)
+        if section is None or section.type == ElfSectionReader.SHT_NOBITS or section.size == 0:
+            return b''
+        with open(self.path, 'rb') as file:
+            file.seek(section.offset)
+            return file.read(section.size)
+
+    def is_compiled_by_gcc_or_clang(self) -> bool:
+        """
+        :return: Whether the .comment section names gcc or clang
+        """
+        return ElfSectionReader.COMPILER_PATTERN.search(self.comment) is not None
+
+    def has_build_id(self) -> bool:
+        """
+        :return: Whether the binary has a GNU build id note, as added by the gcc and clang drivers
+        """
+        return self.has_section(ElfSectionReader.BUILD_ID_SECTION)
+
+    def is_go(self) -> bool:
+        """
+        :return: Whether the binary was built by the Go toolchain
+        """
+        return any(self.has_section(name) for name in ElfSectionReader.GO_SECTIONS)
+
+    def is_rust(self) -> bool:
+        """
+        A binary with a gcc or clang producer in the .comment section is not taken as Rust, e.g. C or C++ code
+        statically linking a Rust component is still memory-unsafe.
+
+        :return: Whether the binary was built by rustc, based on the .comment section or the Rust runtime symbols
+        """
+        if self.is_compiled_by_gcc_or_clang():
+            return False
+        return ElfSectionReader.RUST_COMMENT in self.comment or self.rust_symbols
+
+    def is_unsafe_language(self) -> bool:
+        """
+        Check if the binary was compiled from a memory-unsafe language, i.e. by gcc or clang and not by the Go or
+        Rust toolchain (which add a build id as well).
+
+        :return: Whether the binary was compiled from a memory-unsafe language
+        """
+        if not (self.is_compiled_by_gcc_or_clang() or self.has_build_id()):
+            return False
+        return not (self.is_go() or self.is_rust())
@@ -1,12 +1,79 @@
-import sys
-from io import StringIO
+import threading
 import logging
+from typing import List
 
 logging = logging.getLogger(__name__)
 
+# Instructions ending a block on AArch64, conditional branches (b.<cond>) are matched by their prefix
+AARCH64_BLOCK_END_MNEMONICS = frozenset(('b', 'bl', 'br', 'blr', 'ret', 'cbz', 'cbnz', 'tbz', 'tbnz', 'eret', 'svc',
+                                         'hvc', 'smc', 'brk', 'hlt', 'udf', 'braa', 'brab', 'braaz', 'brabz', 'blraa',
+                                         'blrab', 'blraaz', 'blrabz', 'retaa', 'retab', 'eretaa', 'eretab'))
+# Instructions ending a block on x86, jumps (j<cond>, jmp) are matched by their prefix
+X86_BLOCK_END_MNEMONICS = frozenset(('call', 'ret', 'retf', 'iret', 'iretd', 'iretq', 'ud0', 'ud1', 'ud2', 'hlt',
+                                     'int', 'int1', 'int3', 'into', 'syscall', 'sysenter', 'loop', 'loope', 'loopne'))
 
-def timeout_handler(signum, frame):
-    raise TimeoutError('Generation of CFG took too long!')
+# Decoded instructions per block of the binary analyzed by the current thread, see reset_instruction_cache
+_instruction_cache = threading.local()
+
+
+def reset_instruction_cache():
+    """
+    Forget the decoded instructions of the previous binary, called whenever a binary is loaded.
+    """
+    _instruction_cache.blocks = {}
+
+
+def decode_block(block) -> List[tuple]:
+    """
+    Decode the instructions of a block once per binary, based on the address and size of the block.
+
+    :param block: angr block
+    :return: (mnemonic, operands) of each instruction
+    """
+    blocks = getattr(_instruction_cache, 'blocks', None)
+    if blocks is None:
+        blocks = _instruction_cache.blocks = {}
+    key = (block.addr, block.size)
+    instructions = blocks.get(key)
+    if instructions is None:
+        instructions = [(insn.mnemonic, insn.op_str) for insn in block.capstone.insns]
+        blocks[key] = instructions
+    return instructions
+
+
+def has_mnemonic(block, part: str) -> bool:
+    """
+    Check if the mnemonic of any instruction of a block contains the given part, e.g. 'ud', 'call' or 'ret'.
+
+    :param block: angr block
+    :param part: part of the mnemonic to search
+    :return: Whether any instruction's mnemonic contains part
+    """
+    return any(part in mnemonic for mnemonic, _ in decode_block(block))
+
+
+def code_has_mnemonic(code, part: str) -> bool:
+    """
+    Check if the mnemonic of any instruction of decoded code contains the given part, see has_mnemonic.
+
+    :param code: assembly representation of a block
+    :param part: part of the mnemonic to search
+    :return: Whether any instruction's mnemonic contains part
+    """
+    return any(part in instruction[0] for instruction in code if instruction)
+
+
+def ends_block(mnemonic: str, aarch64: bool) -> bool:
+    """
+    Check if an instruction ends a block, the way angr splits blocks, for decoding without a CFG.
+
+    :param mnemonic: mnemonic of the instruction
+    :param aarch64: whether the instruction is an AArch64 instruction, otherwise x86
+    :return: Whether the instruction ends a block
+    """
+    if aarch64:
+        return mnemonic in AARCH64_BLOCK_END_MNEMONICS or mnemonic.startswith('b.')
+    return mnemonic in X86_BLOCK_END_MNEMONICS or mnemonic.startswith('j') or mnemonic.startswith('rep ret')
 
 
 def parse_irsb_node(node) -> []:
@@ -16,16 +83,10 @@ def parse_irsb_node(node) -> []:
     :param node: CFG angr node
     :return: assembly representation of node
     """
-    old_stdout = sys.stdout
-    sys.stdout = result = StringIO()
-    if node.block is not None:
-        node.block.disassembly.pp()
-    sys.stdout = old_stdout
-    result = result.getvalue().splitlines()
-    list_result = []
-    for l in result:
-        list_result.append(l.split('\t')[1:])
-    return list_result
+    block = node.block
+    if block is None:
+        return []
+    return parse_irsb_block(block)
 
 
 def parse_irsb_block(block):
@@ -33,17 +94,9 @@ def parse_irsb_block(block):
     Parse IRSB block to get assembly code.
 
     :param block: CFG angr block
-    :return: Assembly representation of block
+    :return: Assembly representation of block, a new [mnemonic, operands] list per instruction
     """
-    old_stdout = sys.stdout
-    sys.stdout = result = StringIO()
-    block.disassembly.pp()
-    sys.stdout = old_stdout
-    result = result.getvalue().splitlines()
-    list_result = []
-    for l in result:
-        list_result.append(l.split('\t')[1:])
-    return list_result
+    return [[mnemonic, operands] for mnemonic, operands in decode_block(block)]
 
 
 def transform_code(code) -> []:
@@ -69,9 +122,19 @@ def get_call_register(node) -> []:
     :param node: node to check for call instruction
     :return: List of registers used in call instruction
     """
-    str_call_inst = parse_irsb_node(node)
+    return get_code_call_register(parse_irsb_node(node))
+
+
+def get_code_call_register(str_call_inst, call_mnemonic='call') -> []:
+    """
+    Get list of registers used in call instructions of decoded code, see get_call_register.
+
+    :param str_call_inst: assembly representation of the block containing the call
+    :param call_mnemonic: mnemonic of indirect calls, e.g. 'blr' on AArch64
+    :return: List of registers used in call instruction
+    """
     for sub_list in str_call_inst:
-        if 'call' in sub_list:
+        if call_mnemonic in sub_list:
             if '+' in sub_list[-1]:
                 tmp_tmp = sub_list[-1].split(' +')
                 tmp = tmp_tmp[0].split(' ')[-1]
@@ -100,7 +163,7 @@ def get_return_blocks(function) -> []:
     """
     return_blocks = []
     for block in function.blocks:
-        if 'ret' in str(block.disassembly.insns):
+        if has_mnemonic(block, 'ret'):
             return_blocks.append(parse_irsb_block(block))
     return return_blocks
 
@@ -115,7 +178,7 @@ def get_return_blocks_and_print(function) -> []:
     return_blocks = {}
     print_blocks = {}
     for block in function.blocks:
-        if 'ret' in str(block.disassembly.insns):
+        if has_mnemonic(block, 'ret'):
             return_blocks[block] = parse_irsb_block(block)
             print_blocks[block] = block
     return return_blocks, print_blocks
@@ -157,13 +220,23 @@ def is_call_reg_modified(call_reg: str, node):
 
     :return: Whether call register has been modified
     """
-    print(call_reg)
-    str_call_inst = parse_irsb_node(node)
-    print(str_call_inst)
+    return is_code_call_reg_modified(call_reg, parse_irsb_node(node))
+
+
+def is_code_call_reg_modified(call_reg: str, str_call_inst) -> bool:
+    """
+    Check if the value of register, used for the indirect call, was modified before in decoded code, see
+    is_call_reg_modified.
+
+    :param call_reg: call register to check
+    :param str_call_inst: assembly representation of the block containing the call
+
+    :return: Whether call register has been modified
+    """
+    logging.debug(f'Call register {call_reg} in {str_call_inst}')
     relevant_instructions = str_call_inst[:-1]
     for inst in relevant_instructions:
         tmp = inst[-1].split(', ')
-        print(tmp)
         if call_reg in tmp[0]:
             return True
         else:
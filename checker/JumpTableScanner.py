@@ -0,0 +1,145 @@
+import logging
+from typing import List, Union
+
+from checker.ElfSectionReader import ElfSection, ElfSectionReader
+from results.BinaryObject import BinaryObject
+
+
+class JumpTableScanner:
+    """
+    Finds the jump tables Clang CFI emits for address-taken functions: runs of branch stubs at a fixed stride, each
+    branching to a function. The executable sections are scanned as NumPy views of the mapped file, one vectorized
+    pass per stride, without disassembling or a CFG. The number of stubs found is stored as evidence next to the
+    verdict of the single-module CFI check.
+    """
+
+    # Minimum number of consecutive stubs counted as a jump table
+    MIN_RUN: int = 4
+    # x86: jmp rel32 padded with int3 to 8 bytes
+    X86_STRIDE: int = 8
+    X86_JMP: int = 0xe9
+    # Last byte of rel32 masked out, followed by three int3
+    X86_PADDING_MASK: int = 0xffffff00
+    X86_PADDING: int = 0xcccccc00
+    # AArch64: b imm26, preceded by bti c if branch target identification is enabled
+    AARCH64_B_MASK: int = 0xfc000000
+    AARCH64_B: int = 0x14000000
+    AARCH64_BTI_C: int = 0xd503245f
+
+    @staticmethod
+    def run(binary_obj: BinaryObject) -> Union[int, None]:
+        """
+        Count the stubs of CFI jump tables in the executable sections.
+
+        :param binary_obj: corresponding binary object
+        :return: Number of stubs in jump tables, None if the binary could not be scanned
+        """
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return None
+        if elf.machine not in (ElfSectionReader.EM_386, ElfSectionReader.EM_X86_64, ElfSectionReader.EM_AARCH64):
+            binary_obj.jump_table_stubs = 0
+            return 0
+        try:
+            # Imported here, so the dependency is only needed when binaries are analyzed
+            import numpy
+        except ImportError:
+            logging.getLogger(__name__).warning('NumPy is not installed, CFI jump tables are not scanned')
+            return None
+        sections = elf.executable_sections()
+        with elf.mapped() as data:
+            stubs = sum(JumpTableScanner.__scan(numpy, elf, data, section, sections) for section in sections)
+        binary_obj.jump_table_stubs = stubs
+        return stubs
+
+    @staticmethod
+    def __scan(numpy, elf: ElfSectionReader, data, section: ElfSection, sections: List[ElfSection]) -> int:
+        """
+        The views of the mapping are released when returning, before the mapping is closed.
+
+        :param numpy: NumPy module
+        :param data: memory map of the file, see ElfSectionReader.mapped()
+        :param section: executable section to scan
+        :param sections: all executable sections, stubs have to branch into one of them
+        :return: Number of stubs in jump tables of the section
+        """
+        size = min(section.size, len(data) - section.offset)
+        if size <= 0:
+            return 0
+        code = numpy.frombuffer(data, dtype=numpy.uint8, count=size, offset=section.offset)
+        if elf.machine == ElfSectionReader.EM_AARCH64:
+            return JumpTableScanner.__scan_aarch64(numpy, elf, code, section.address, sections)
+        return JumpTableScanner.__scan_x86(numpy, code, section.address, sections)
+
+    @staticmethod
+    def __scan_x86(numpy, code, address: int, sections: List[ElfSection]) -> int:
+        """
+        :param code: bytes of the section
+        :param address: virtual address of the section
+        :return: Number of 8-byte aligned jmp rel32; int3; int3; int3 stubs in runs
+        """
+        stride = JumpTableScanner.X86_STRIDE
+        phase = -address % stride
+        count = (len(code) - phase) // stride
+        if count < JumpTableScanner.MIN_RUN:
+            return 0
+        entries = code[phase:phase + count * stride].reshape(count, stride)
+        # The padding is compared as part of the second 32-bit word of each entry
+        padding = entries.view('<u4')[:, 1] & JumpTableScanner.X86_PADDING_MASK
+        candidates = numpy.flatnonzero((entries[:, 0] == JumpTableScanner.X86_JMP) &
+                                       (padding == JumpTableScanner.X86_PADDING))
+        if len(candidates) < JumpTableScanner.MIN_RUN:
+            return 0
+        offsets = entries[candidates, 1:5].copy().view('<i4')[:, 0]
+        targets = address + phase + candidates * stride + 5 + offsets
+        return JumpTableScanner.__count_runs(numpy, candidates[JumpTableScanner.__in_code(numpy, targets, sections)])
+
+    @staticmethod
+    def __scan_aarch64(numpy, elf: ElfSectionReader, code, address: int, sections: List[ElfSection]) -> int:
+        """
+        :param code: bytes of the section
+        :param address: virtual address of the section
+        :return: Number of b stubs in runs, with or without a preceding bti c
+        """
+        phase = -address % 4
+        count = (len(code) - phase) // 4
+        if count < JumpTableScanner.MIN_RUN:
+            return 0
+        words = code[phase:phase + count * 4].view('<u4' if elf.little_endian else '>u4')
+        candidates = numpy.flatnonzero((words & JumpTableScanner.AARCH64_B_MASK) == JumpTableScanner.AARCH64_B)
+        if len(candidates) < JumpTableScanner.MIN_RUN:
+            return 0
+        # Sign-extended imm26 counts instructions
+        offsets = ((words[candidates] & 0x3ffffff).astype(numpy.int64) ^ 0x2000000) - 0x2000000
+        targets = address + phase + candidates * 4 + offsets * 4
+        candidates = candidates[JumpTableScanner.__in_code(numpy, targets, sections)]
+        stubs = JumpTableScanner.__count_runs(numpy, candidates)
+        # With BTI, each entry is bti c; b at an 8-byte aligned address
+        bti_phase = (-(address + phase) % 8) // 4
+        candidates = candidates[(candidates % 2 != bti_phase) & (candidates > 0)]
+        candidates = candidates[words[candidates - 1] == JumpTableScanner.AARCH64_BTI_C]
+        return stubs + JumpTableScanner.__count_runs(numpy, candidates // 2)
+
+    @staticmethod
+    def __in_code(numpy, targets, sections: List[ElfSection]):
+        """
+        :param targets: virtual addresses the stubs branch to
+        :return: Whether each target lies in an executable section
+        """
+        in_code = numpy.zeros(len(targets), dtype=bool)
+        for section in sections:
+            in_code |= (targets >= section.address) & (targets < section.address + section.size)
+        return in_code
+
+    @staticmethod
+    def __count_runs(numpy, entries) -> int:
+        """
+        :param entries: ascending indices of the entries that are stubs
+        :return: Number of entries in runs of at least MIN_RUN consecutive stubs
+        """
+        if len(entries) < JumpTableScanner.MIN_RUN:
+            return 0
+        # A run ends wherever the next stub is not the next entry
+        ends = numpy.flatnonzero(numpy.diff(entries) != 1)
+        lengths = numpy.diff(numpy.concatenate(([-1], ends, [len(entries) - 1])))
+        return int(lengths[lengths >= JumpTableScanner.MIN_RUN].sum())
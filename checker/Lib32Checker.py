@@ -0,0 +1,79 @@
+import bisect
+import logging
+import os
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import global_variables
+
+logging = logging.getLogger(__name__)
+
+
+class Lib32Checker:
+    """
+    Propagate multi-module CFI from 64-bit libraries to their 32-bit counterparts (Lib32 error): a binary in
+    <part>/lib/ without multi-module CFI is marked if the binary at the same path in <part>/lib64/ has it.
+    """
+
+    @staticmethod
+    def run(lib_binaries: List[Tuple[Path, str]], image_id: str):
+        """
+        Check all binaries of a subimage in /lib/ with one query and update the affected ones at once.
+
+        :param lib_binaries: pairs of path and database id of the binaries in /lib/
+        :param image_id: Id of the subimage
+        """
+        if not lib_binaries:
+            return
+        with global_variables.database_lock:
+            global_variables.cursor.execute('SELECT BinaryPath, Multi_CFI FROM BinaryFile WHERE Subimage = ?;',
+                                            (image_id,))
+            rows = global_variables.cursor.fetchall()
+        # Reversed paths, so finding a path ending with a given suffix is a prefix search in a sorted list
+        multi_cfi_paths = sorted(str(path)[::-1] for path, multi_cfi in rows if path and multi_cfi)
+
+        updates = []
+        for binary, binary_id in lib_binaries:
+            paths = Lib32Checker.__prepare_path(binary)
+            if paths is None:
+                logging.info(f'Could not check lib32 of {binary} due to its path.')
+                continue
+            path32, path64 = paths
+            if not Lib32Checker.__ends_with(multi_cfi_paths, path32) and \
+                    Lib32Checker.__ends_with(multi_cfi_paths, path64):
+                logging.info(f'Updating {binary} due to Lib32 error')
+                updates.append(('Lib32', image_id, binary_id))
+
+        if updates:
+            query = 'UPDATE BinaryFile SET Multi_CFI=1, Error=? WHERE Subimage = ? AND Id = ?;'
+            with global_variables.database_lock:
+                global_variables.cursor.executemany(query, updates)
+                global_variables.connection.commit()
+
+    @staticmethod
+    def __ends_with(reversed_paths: List[str], suffix: str) -> bool:
+        """
+        :param reversed_paths: sorted reversed paths
+        :param suffix: suffix to find
+        :return: Whether any of the paths ends with the suffix
+        """
+        reversed_suffix = suffix[::-1]
+        index = bisect.bisect_left(reversed_paths, reversed_suffix)
+        return index < len(reversed_paths) and reversed_paths[index].startswith(reversed_suffix)
+
+    @staticmethod
+    def __prepare_path(binary: Path) -> Union[Tuple[str, str], None]:
+        """
+        Generate the /lib and /lib64 path for a binary to check.
+
+        :param binary: path of the binary
+        :return: /lib and /lib64 path relative to the directory containing lib, None if not in a single /lib/
+        """
+        original_path = binary.as_posix()
+        splitted = original_path.split('/lib/')
+        if len(splitted) == 2:
+            prefix = splitted[0].split('/')
+            if len(prefix) > 1:
+                path_part = prefix[-1]
+                return os.path.join(path_part, 'lib', splitted[1]), os.path.join(path_part, 'lib64', splitted[1])
+        return None
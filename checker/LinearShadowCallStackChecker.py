@@ -0,0 +1,88 @@
+from typing import Iterator, List, Tuple, Union
+
+from checker.ElfSectionReader import ElfSectionReader
+from results.BinaryObject import BinaryObject
+import checker.Helper as helper
+
+
+class LinearShadowCallStackChecker:
+    """
+    ShadowCallStack check without a CFG: the function starts are taken from the symbol tables, .eh_frame and
+    .init_array, and each function is disassembled linearly. Blocks end at the same instructions as angr's blocks,
+    so the entry block and the return blocks match those of the CFG-based ShadowCallStackChecker.
+    """
+
+    @staticmethod
+    def run(binary_obj: BinaryObject) -> bool:
+        """
+        Verify if binary was compiled using ShadowCallStack (backward-edge).
+        Stops at the first function storing x18 in its entry block and loading it in one of its return blocks.
+
+        :param binary_obj: corresponding binary object
+        :return: Whether binary was compiled using ShadowCallStack
+        """
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return False
+        # ShadowCallStack keeps the return addresses in x18, which only exists on AArch64
+        if elf.machine != ElfSectionReader.EM_AARCH64:
+            return False
+        # Imported here, so the dependency is only needed when this engine is selected
+        import capstone
+        arch = getattr(capstone, 'CS_ARCH_ARM64', None)
+        if arch is None:
+            arch = capstone.CS_ARCH_AARCH64
+        mode = capstone.CS_MODE_ARM if elf.little_endian else capstone.CS_MODE_BIG_ENDIAN
+        disassembler = capstone.Cs(arch, mode)
+        with elf.mapped() as data:
+            functions = elf.function_starts(data)
+            starts = sorted(functions)
+            for index, start in enumerate(starts):
+                end = start + functions[start] if functions[start] else \
+                    starts[index + 1] if index + 1 < len(starts) else elf.code_end(start)
+                end = min(end, elf.code_end(start))
+                offset = elf.code_offset(start)
+                code = data[offset:offset + end - start]
+                blocks = LinearShadowCallStackChecker.__blocks(disassembler, code, start)
+                entry_block = next(blocks, [])
+                # Verify that the ShadowCallStack is setup in the function's prologue
+                if not any('str' in op and 'x18' in regs for op, regs in entry_block):
+                    continue
+                # Verify that ShadowCallStack is loaded in function's epilogue
+                for block in blocks:
+                    if 'ret' in block[-1][0] and any('ldr' in op and 'x18' in regs for op, regs in block):
+                        binary_obj.scs = True
+                        return True
+        return False
+
+    @staticmethod
+    def rule_out(binary_obj: BinaryObject) -> Union[bool, None]:
+        """
+        Pre-filter for the CFG-based check: only AArch64 binaries can use x18 for a ShadowCallStack.
+
+        :param binary_obj: corresponding binary object
+        :return: False if the binary has no ShadowCallStack, None if the CFG-based check has to decide
+        """
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return False
+        return None if elf.machine == ElfSectionReader.EM_AARCH64 else False
+
+    @staticmethod
+    def __blocks(disassembler, code: bytes, address: int) -> Iterator[List[Tuple[str, str]]]:
+        """
+        Disassemble linearly and split at the instructions ending a block, the entry block is the first one.
+
+        :param disassembler: capstone disassembler
+        :param code: bytes of the function
+        :param address: virtual address of the function
+        :return: (mnemonic, operands) of the instructions of each block
+        """
+        block = []
+        for _, _, mnemonic, operands in disassembler.disasm_lite(code, address):
+            block.append((mnemonic, operands))
+            if helper.ends_block(mnemonic, aarch64=True):
+                yield block
+                block = []
+        if block:
+            yield block
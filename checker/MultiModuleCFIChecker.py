@@ -1,48 +1,44 @@
-import angr
-import subprocess
-from results.BinaryObject import BinaryObject
-
+import re
 
-def grep_cfi(binary: str, pattern: str) -> bool:
-    """
-    Use /bin/grep to check if binary contains a given pattern.
-
-    :param binary: binary file to check/grep
-    :param pattern: pattern to search for in binary file
-    :return: Whether binary matches given pattern
-    """
-    output = subprocess.run([f'grep -i {pattern} {binary}'], shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if b'matches' in output.stdout or b'matches' in output.stderr:
-        return True
-    return False
+from checker.ElfSectionReader import ElfSectionReader
+from results.BinaryObject import BinaryObject
 
 
 class MultiModuleCFIChecker:
 
+    CFI_PATTERN = re.compile(rb'__cfi', re.IGNORECASE)
+    CHECK_FAIL_PATTERN = re.compile(rb'cfi-check-fail', re.IGNORECASE)
+    # Sections holding the symbol names and the strings of the runtime, the rest of the file is not searched
+    STRING_SECTIONS = ('.dynstr', '.strtab', '.rodata')
+
     @staticmethod
-    def run(proj: angr.Project, binary_obj: BinaryObject) -> bool:
+    def run(binary_obj: BinaryObject) -> bool:
         """
         Verify if binary was compiled using Cross-DSO (forward-edge).
         Check if the symbols __cfi_slowpath and __cfi_check are present in the binary.
+        The file is mapped once and only the symbol tables and string sections are searched, no angr project is
+        needed.
 
-        :param proj: loaded binary file to analyze
-        :param binary_obj: corresponding binary object
+        :param binary_obj: binary object of the binary file to analyze
         :return: Whether binary was compiled using Cross-DSO (multi-module CFI)
         """
-        filename = proj.filename
-        name: str = filename.split('/')[-1]
-        slowpath_check_sym: str = str(proj.loader.find_symbol('__cfi_slowpath'))
-        cfi_check_sym: str = str(proj.loader.find_symbol('__cfi_check'))
-        if cfi_check_sym == 'None':
-            cfi_check_sym = ''
-        if slowpath_check_sym == 'None':
-            slowpath_check_sym = ''
-        cfi_check: bool = name in cfi_check_sym
-
-        if ((grep_cfi(filename, '"__cfi"') and cfi_check)
-                or (grep_cfi(filename, '"__cfi"') and cfi_check_sym and slowpath_check_sym)
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return False
+        with elf.mapped() as data:
+            symbols = elf.find_symbols(data, ('__cfi_check', '__cfi_slowpath'))
+            has_cfi = elf.search(data, MultiModuleCFIChecker.CFI_PATTERN, MultiModuleCFIChecker.STRING_SECTIONS)
+            has_check_fail = elf.search(data, MultiModuleCFIChecker.CHECK_FAIL_PATTERN,
+                                        MultiModuleCFIChecker.STRING_SECTIONS)
+        cfi_check_sym: bool = '__cfi_check' in symbols
+        slowpath_check_sym: bool = '__cfi_slowpath' in symbols
+        # __cfi_check defined in the binary itself
+        cfi_check: bool = symbols.get('__cfi_check', False)
+
+        if ((has_cfi and cfi_check)
+                or (has_cfi and cfi_check_sym and slowpath_check_sym)
                 or (slowpath_check_sym and cfi_check)
-                or (grep_cfi(filename, '"cfi-check-fail"') and not cfi_check_sym and not slowpath_check_sym)):
+                or (has_check_fail and not cfi_check_sym and not slowpath_check_sym)):
             binary_obj.multi_cfi = True
             return True
         else:
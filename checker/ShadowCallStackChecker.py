@@ -1,5 +1,6 @@
 import sys
 
+from checker.CfgSummary import CfgSummary
 from results.BinaryObject import BinaryObject
 import checker.Helper as helper
 
@@ -37,8 +38,32 @@ class ShadowCallStackChecker:
                                 op, regs = instruction
                                 if 'ldr' in op and 'x18' in regs:
                                     binary_obj.scs = True
-                                    return
-        return
+                                    return True
+        return False
+
+    @staticmethod
+    def run_summary(summary: CfgSummary, binary_obj: BinaryObject):
+        """
+        Verify if binary was compiled using ShadowCallStack (backward-edge), on the summary of its CFG.
+
+        :param summary: summary of the generated CFG of binary to analyze
+        :param binary_obj: corresponding binary object
+        :return: Whether binary was compiled using ShadowCallStack
+        """
+        for entry_block, return_blocks in summary.functions:
+            # Verify that the ShadowCallStack is setup in the function's prologue
+            prologue = any(len(instruction) == 2 and 'str' in instruction[0] and 'x18' in instruction[1]
+                           for instruction in entry_block)
+            # Verify that ShadowCallStack is loaded in function's epilogue
+            if prologue:
+                for block in return_blocks:
+                    for instruction in block:
+                        if len(instruction) == 2:
+                            op, regs = instruction
+                            if 'ldr' in op and 'x18' in regs:
+                                binary_obj.scs = True
+                                return True
+        return False
 
     @staticmethod
     def run_all(cfg, binary_obj: BinaryObject, filename: str):
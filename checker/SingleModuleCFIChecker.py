@@ -1,5 +1,7 @@
+import copy
 import sys
 
+from checker.CfgSummary import CfgSummary
 from results.BinaryObject import BinaryObject
 import checker.Helper as helper
 
@@ -27,7 +29,7 @@ class SingleModuleCFIChecker:
 
         # If no relevant branchings were found, return
         if len(relevant_branchings) == 0:
-            return
+            return False
 
         # Search for the CFI pattern
         for b_node in relevant_branchings:
@@ -35,19 +37,48 @@ class SingleModuleCFIChecker:
             modified: bool = False
             res: bool = False
             one, two = b_node.successors
-            if one is None or one.block is None or two is None or two.block is None:
+            if one is None or two is None:
+                continue
+            one_block, two_block = one.block, two.block
+            if one_block is None or two_block is None:
                 continue
-            if 'ud' in str(one.block.disassembly.insns) and 'call' in str(two.block.disassembly.insns):
+            if helper.has_mnemonic(one_block, 'ud') and helper.has_mnemonic(two_block, 'call'):
                 res = check_compare_statement(b_node, two)
-            if 'ud' in str(two.block.disassembly.insns) and 'call' in str(one.block.disassembly.insns):
+            if helper.has_mnemonic(two_block, 'ud') and helper.has_mnemonic(one_block, 'call'):
                 res = check_compare_statement(b_node, one)
             if res:
                 result, modified = res
             if result:
                 binary_obj.single_cfi = True
                 binary_obj.modified = modified
-                return
-        return
+                return True
+        return False
+
+    @staticmethod
+    def run_summary(summary: CfgSummary, binary_obj: BinaryObject):
+        """
+        Verify if binary was compiled using basic CFI (forward-edge), on the summary of its CFG.
+
+        :param summary: summary of the generated CFG of binary to analyze
+        :param binary_obj: corresponding binary object
+        :return: Whether binary was compiled using basic CFI (single-module CFI)
+        """
+        for branching_code, one_code, two_code in summary.branchings:
+            result: bool = False
+            modified: bool = False
+            res: bool = False
+            # The checks modify the code they trace, the summary may be checked again
+            if helper.code_has_mnemonic(one_code, 'ud') and helper.code_has_mnemonic(two_code, 'call'):
+                res = check_compare_code(copy.deepcopy(branching_code), copy.deepcopy(two_code))
+            if helper.code_has_mnemonic(two_code, 'ud') and helper.code_has_mnemonic(one_code, 'call'):
+                res = check_compare_code(copy.deepcopy(branching_code), copy.deepcopy(one_code))
+            if res:
+                result, modified = res
+            if result:
+                binary_obj.single_cfi = True
+                binary_obj.modified = modified
+                return True
+        return False
 
     @staticmethod
     def run_all(cfg, binary_obj: BinaryObject, filename: str):
@@ -80,11 +111,14 @@ class SingleModuleCFIChecker:
                 modified: bool = False
                 res: bool = False
                 one, two = b_node.successors
-                if one is None or one.block is None or two is None or two.block is None:
+                if one is None or two is None:
+                    continue
+                one_block, two_block = one.block, two.block
+                if one_block is None or two_block is None:
                     continue
-                if 'ud' in str(one.block.disassembly.insns) and 'call' in str(two.block.disassembly.insns):
+                if helper.has_mnemonic(one_block, 'ud') and helper.has_mnemonic(two_block, 'call'):
                     res = check_compare_statement(b_node, two)
-                if 'ud' in str(two.block.disassembly.insns) and 'call' in str(one.block.disassembly.insns):
+                if helper.has_mnemonic(two_block, 'ud') and helper.has_mnemonic(one_block, 'call'):
                     res = check_compare_statement(b_node, one)
                 if res:
                     result, modified = res
@@ -109,8 +143,20 @@ def check_compare_statement(branching_node, call_node) -> [bool, bool]:
     :param call_node: node containing protected call
     :return: Whether branching is based on register used in protected call
     """
-    branching_code = helper.parse_irsb_node(branching_node)
-    call_register = helper.get_call_register(call_node)
+    return check_compare_code(helper.parse_irsb_node(branching_node), helper.parse_irsb_node(call_node))
+
+
+def check_compare_code(branching_code, call_code, call_mnemonic='call') -> [bool, bool]:
+    """
+    Check if the condition of the conditional jump (branching) is based on register used in protected call, on
+    decoded code instead of CFG nodes.
+
+    :param branching_code: assembly representation of the block containing conditional jump (branching)
+    :param call_code: assembly representation of the block containing protected call
+    :param call_mnemonic: mnemonic of indirect calls, e.g. 'blr' on AArch64
+    :return: Whether branching is based on register used in protected call
+    """
+    call_register = helper.get_code_call_register(call_code, call_mnemonic)
     # Iterate through instructions to check if branching based on call register
     for instructions in branching_code:
         if not call_register:
@@ -118,13 +164,13 @@ def check_compare_statement(branching_node, call_node) -> [bool, bool]:
         if 'cmp' in instructions:
             cmp_inst = instructions[1:][0]
             if call_register in cmp_inst:
-                return True, helper.is_call_reg_modified(call_register, call_node)
+                return True, helper.is_code_call_reg_modified(call_register, call_code)
             else:
                 # If protected call register not the same as in the cmp instruction
                 #   Then trace back its value to see if value based on register used in protected call
                 watch_list = helper.init_watch_list(call_register, cmp_inst)
                 if trace_back_register(branching_code, watch_list):
-                    return True, helper.is_call_reg_modified(call_register, call_node)
+                    return True, helper.is_code_call_reg_modified(call_register, call_code)
                 else:
                     return False, False
 
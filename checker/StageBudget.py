@@ -0,0 +1,143 @@
+import ctypes
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Union
+
+
+class _BudgetExpired(BaseException):
+    """
+    Raised asynchronously in the analyzing thread, derives from BaseException so that broad exception handlers
+    inside angr do not swallow it.
+    """
+
+
+class StageTimeout(TimeoutError):
+    """
+    A stage of the analysis of a binary ran out of time.
+    """
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f'{stage} took longer than {seconds}s')
+        self.stage: str = stage
+        self.seconds: float = seconds
+
+
+class StageBudget:
+    """
+    Time budgets (in seconds) for the stages of the analysis of a single binary.
+    Enforced by a timer raising in the analyzing thread, so it works in any thread and in worker processes
+    without the process-wide SIGALRM handler. The exception can be lost inside the stage, in that case StageTimeout
+    is only raised once the stage returns. Stages are therefore run in worker processes, which are killed when stuck
+    in a stage beyond its budget (see BinaryWorkerPool).
+    """
+
+    LOAD: str = 'load'
+    CFG: str = 'cfg'
+    MULTI_CFI: str = 'multi_cfi'
+    SINGLE_CFI: str = 'single_cfi'
+    SCS: str = 'scs'
+    STAGES = (LOAD, CFG, MULTI_CFI, SINGLE_CFI, SCS)
+
+    DEFAULT_BUDGETS: Dict[str, float] = {LOAD: 300, CFG: 900, MULTI_CFI: 300, SINGLE_CFI: 300, SCS: 300}
+
+    def __init__(self, budgets: Union[Dict[str, float], None] = None):
+        """
+        :param budgets: seconds per stage, missing stages use the default budget and 0 disables the budget
+        """
+        self.budgets: Dict[str, float] = dict(StageBudget.DEFAULT_BUDGETS)
+        if budgets:
+            for stage, seconds in budgets.items():
+                if stage not in StageBudget.STAGES:
+                    raise ValueError(f'Unknown analysis stage {stage}')
+                self.budgets[stage] = seconds
+        self.on_stage: Union[Callable[[str], None], None] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['on_stage'] = None
+        return state
+
+    @staticmethod
+    def parse(value: str) -> 'StageBudget':
+        """
+        Parse budgets given on the command line, e.g. 'load=300,cfg=900,scs=60'.
+
+        :param value: comma-separated stage=seconds pairs
+        :return: StageBudget with the given budgets
+        """
+        budgets = {}
+        for item in value.split(','):
+            if item.strip():
+                stage, seconds = item.split('=')
+                budgets[stage.strip()] = float(seconds)
+        return StageBudget(budgets)
+
+    def scaled(self, factor: float) -> 'StageBudget':
+        """
+        :param factor: factor to multiply all budgets with
+        :return: New StageBudget with larger (or smaller) budgets
+        """
+        return StageBudget({stage: seconds * factor for stage, seconds in self.budgets.items()})
+
+    def enabled(self) -> bool:
+        """
+        :return: Whether any stage has a budget
+        """
+        return any(self.budgets.values())
+
+    def total(self) -> float:
+        """
+        :return: Sum of all budgets, 0 if any stage is unlimited
+        """
+        if not all(self.budgets.values()):
+            return 0
+        return sum(self.budgets.values())
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Run the body of the with-statement within the budget of the given stage.
+
+        :param stage: one of StageBudget.STAGES
+        :raise StageTimeout: if the body took longer than the budget
+        """
+        if self.on_stage is not None:
+            self.on_stage(stage)
+        seconds = self.budgets[stage]
+        if not seconds:
+            yield
+            return
+
+        thread_id = threading.get_ident()
+        lock = threading.Lock()
+        state = {'done': False, 'fired': False}
+
+        def expire():
+            with lock:
+                if not state['done']:
+                    state['fired'] = True
+                    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id),
+                                                               ctypes.py_object(_BudgetExpired))
+
+        timer = threading.Timer(seconds, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            try:
+                yield
+            finally:
+                with lock:
+                    state['done'] = True
+                    timer.cancel()
+                    if state['fired']:
+                        # Clear the exception if it has not been delivered yet
+                        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), None)
+        except _BudgetExpired:
+            pass
+        except Exception:
+            if not state['fired']:
+                raise
+        # The exception may have been swallowed, e.g. when delivered in a __del__ method or weakref callback, or
+        # replaced by another one. The stage still ran out of time.
+        if state['fired']:
+            raise StageTimeout(stage, seconds)
@@ -0,0 +1,275 @@
+import re
+from typing import Iterator, List, Set, Tuple, Union
+
+from checker.ElfSectionReader import ElfSection, ElfSectionReader
+from checker.SingleModuleCFIChecker import check_compare_code
+from results.BinaryObject import BinaryObject
+import checker.Helper as helper
+
+
+class TrapSiteCFIChecker:
+    """
+    Single-module CFI check without a CFG: CFI traps (ud1/ud2 on x86, brk on AArch64) are found by a byte search in
+    the executable sections, and only the conditional branches to a trap and the blocks around them are decoded.
+    The branch and the protected call are checked like the branching nodes of the CFG-based SingleModuleCFIChecker.
+    """
+
+    # Bytes decoded before a conditional branch to find the compare it depends on
+    WINDOW: int = 64
+    # Bytes decoded at most for the block of a protected call
+    CALL_WINDOW: int = 256
+
+    X86_TRAP = re.compile(rb'\x0f[\x0b\xb9]')
+    # ud0, ud1 and ud2, all traps the CFG-based check accepts
+    X86_ANY_TRAP = re.compile(rb'\x0f[\x0b\xb9\xff]')
+    X86_JCC_REL32 = re.compile(rb'\x0f[\x80-\x8f]')
+    # Overlapping, as the displacement of a jump can look like another jump
+    X86_JCC_REL8 = re.compile(rb'(?=[\x70-\x7f][\x00-\xff])')
+    # brk #imm16, aligned words are filtered after the search
+    AARCH64_TRAP = re.compile(rb'(?=[\x00\x20\x40\x60\x80\xa0\xc0\xe0][\x00-\xff][\x20-\x3f]\xd4)')
+    # b.<cond>, cbz/cbnz and tbz/tbnz
+    AARCH64_BRANCH = re.compile(rb'(?=[\x00-\xff]{3}[\x34-\x37\x54\xb4-\xb7])')
+
+    @staticmethod
+    def run(binary_obj: BinaryObject) -> bool:
+        """
+        Verify if binary was compiled using basic CFI (forward-edge).
+        Binaries without any trap site are answered without disassembling anything.
+
+        :param binary_obj: corresponding binary object
+        :return: Whether binary was compiled using basic CFI (single-module CFI)
+        """
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return False
+        if elf.machine not in (ElfSectionReader.EM_386, ElfSectionReader.EM_X86_64, ElfSectionReader.EM_AARCH64):
+            return False
+        aarch64 = elf.machine == ElfSectionReader.EM_AARCH64
+        disassembler = None
+        with elf.mapped() as data:
+            for section in elf.executable_sections():
+                code = data[section.offset:section.offset + section.size]
+                if aarch64:
+                    sites = TrapSiteCFIChecker.__aarch64_sites(code, section, elf.little_endian)
+                else:
+                    sites = TrapSiteCFIChecker.__x86_sites(code, section)
+                for branch, trap, other in sites:
+                    if disassembler is None:
+                        disassembler = TrapSiteCFIChecker.__disassembler(elf)
+                    res = TrapSiteCFIChecker.__check_site(disassembler, code, section, branch, trap, other, aarch64)
+                    if res:
+                        result, modified = res
+                        if result:
+                            binary_obj.single_cfi = True
+                            binary_obj.modified = modified
+                            return True
+        return False
+
+    @staticmethod
+    def rule_out(binary_obj: BinaryObject) -> Union[bool, None]:
+        """
+        Pre-filter for the CFG-based check, which only accepts x86 traps guarding a call: binaries of other
+        architectures and x86 binaries without a trap instruction cannot have single-module CFI.
+
+        :param binary_obj: corresponding binary object
+        :return: False if the binary has no single-module CFI, None if the CFG-based check has to decide
+        """
+        elf = binary_obj.parsed_elf()
+        if elf is None:
+            return False
+        if elf.machine not in (ElfSectionReader.EM_386, ElfSectionReader.EM_X86_64):
+            return False
+        with elf.mapped() as data:
+            for section in elf.executable_sections():
+                if TrapSiteCFIChecker.X86_ANY_TRAP.search(data, section.offset, section.offset + section.size):
+                    return None
+        return False
+
+    @staticmethod
+    def __disassembler(elf: ElfSectionReader):
+        """
+        :return: capstone disassembler for the architecture of the binary
+        """
+        # Imported here, so binaries without trap sites never need capstone
+        import capstone
+        if elf.machine == ElfSectionReader.EM_AARCH64:
+            arch = getattr(capstone, 'CS_ARCH_ARM64', None)
+            if arch is None:
+                arch = capstone.CS_ARCH_AARCH64
+            mode = capstone.CS_MODE_ARM if elf.little_endian else capstone.CS_MODE_BIG_ENDIAN
+            return capstone.Cs(arch, mode)
+        return capstone.Cs(capstone.CS_ARCH_X86,
+                           capstone.CS_MODE_64 if elf.machine == ElfSectionReader.EM_X86_64 else capstone.CS_MODE_32)
+
+    @staticmethod
+    def __x86_sites(code: bytes, section: ElfSection) -> Iterator[Tuple[int, int, int]]:
+        """
+        Find the conditional jumps to a trap and the jumps right before a trap.
+
+        :param code: contents of the executable section
+        :param section: executable section
+        :return: Offsets of the jump, the trap and the other successor of the jump in the section
+        """
+        traps = [match.start() for match in TrapSiteCFIChecker.X86_TRAP.finditer(code)]
+        if not traps:
+            return
+        trap_set = set(traps)
+        for match in TrapSiteCFIChecker.X86_JCC_REL32.finditer(code):
+            branch = match.start()
+            if branch + 6 > len(code):
+                continue
+            target = branch + 6 + int.from_bytes(code[branch + 2:branch + 6], 'little', signed=True)
+            if target in trap_set:
+                yield branch, target, branch + 6
+            elif branch + 6 in trap_set:
+                yield branch, branch + 6, target
+        yield from TrapSiteCFIChecker.__x86_short_sites(code, trap_set)
+
+    @staticmethod
+    def __x86_short_sites(code: bytes, traps: Set[int]) -> List[Tuple[int, int, int]]:
+        """
+        Find the conditional jumps with an 8-bit displacement to a trap and right before a trap, in one pass over the
+        section (vectorized if NumPy is installed) instead of searching around every trap.
+
+        :param code: contents of the executable section
+        :param traps: offsets of the traps in the section
+        :return: Offsets of the jump, the trap and the other successor of the jump, ordered by trap and jump
+        """
+        try:
+            # Imported here, the search falls back to a regular expression without it
+            import numpy
+        except ImportError:
+            branches = [match.start() for match in TrapSiteCFIChecker.X86_JCC_REL8.finditer(code)]
+            targets = [branch + 2 + int.from_bytes(code[branch + 1:branch + 2], 'little', signed=True)
+                       for branch in branches]
+        else:
+            data = numpy.frombuffer(code, dtype=numpy.uint8)
+            branches = numpy.flatnonzero((data[:-1] & 0xf0) == 0x70)
+            targets = branches + 2 + data[branches + 1].view(numpy.int8)
+            # Indexed by offset + 128, as targets reach up to 126 bytes before the start of the section
+            is_trap = numpy.zeros(len(code) + 256, dtype=bool)
+            is_trap[numpy.fromiter(traps, dtype=numpy.int64, count=len(traps)) + 128] = True
+            near = is_trap[targets + 128] | is_trap[branches + 130]
+            branches = branches[near].tolist()
+            targets = targets[near].tolist()
+        sites = []
+        for branch, target in zip(branches, targets):
+            if target in traps:
+                sites.append((branch, target, branch + 2))
+            if branch + 2 in traps and branch + 2 != target:
+                sites.append((branch, branch + 2, target))
+        sites.sort(key=lambda site: (site[1], site[0]))
+        return sites
+
+    @staticmethod
+    def __aarch64_sites(code: bytes, section: ElfSection, little_endian: bool) -> Iterator[Tuple[int, int, int]]:
+        """
+        Find the conditional branches to a trap and the branches right before a trap.
+
+        :param code: contents of the executable section
+        :param section: executable section
+        :param little_endian: byte order of the instructions
+        :return: Offsets of the branch, the trap and the other successor of the branch in the section
+        """
+        byte_order = 'little' if little_endian else 'big'
+        if little_endian:
+            traps = {match.start() for match in TrapSiteCFIChecker.AARCH64_TRAP.finditer(code)
+                     if (section.address + match.start()) % 4 == 0}
+        else:
+            traps = {offset for offset in range(-section.address % 4, len(code) - 3, 4)
+                     if int.from_bytes(code[offset:offset + 4], 'big') & 0xffe0001f == 0xd4200000}
+        if not traps:
+            return
+        if little_endian:
+            branches = (match.start() for match in TrapSiteCFIChecker.AARCH64_BRANCH.finditer(code)
+                        if (section.address + match.start()) % 4 == 0)
+        else:
+            branches = range(-section.address % 4, len(code) - 3, 4)
+        for branch in branches:
+            target = TrapSiteCFIChecker.__aarch64_target(int.from_bytes(code[branch:branch + 4], byte_order), branch)
+            if target is None:
+                continue
+            if target in traps:
+                yield branch, target, branch + 4
+            elif branch + 4 in traps:
+                yield branch, branch + 4, target
+
+    @staticmethod
+    def __aarch64_target(word: int, offset: int) -> Union[int, None]:
+        """
+        :param word: instruction
+        :param offset: offset of the instruction
+        :return: Offset of the target if the instruction is a conditional branch, None otherwise
+        """
+        if word & 0xff000010 == 0x54000000 or word & 0x7e000000 == 0x34000000:
+            displacement = (word >> 5) & 0x7ffff
+            bits = 19
+        elif word & 0x7e000000 == 0x36000000:
+            displacement = (word >> 5) & 0x3fff
+            bits = 14
+        else:
+            return None
+        if displacement & (1 << (bits - 1)):
+            displacement -= 1 << bits
+        return offset + displacement * 4
+
+    @staticmethod
+    def __check_site(disassembler, code: bytes, section: ElfSection, branch: int, trap: int, other: int,
+                     aarch64: bool) -> Union[Tuple[bool, bool], None]:
+        """
+        Decode the block ending with the branch and the block of the other successor, and check the compare of the
+        branch against the register of the protected call.
+
+        :return: Result of check_compare_code or None if the site is not a CFI check
+        """
+        if not 0 <= other < len(code):
+            return None
+        trap_code = list(disassembler.disasm_lite(code[trap:trap + 4], section.address + trap, 1))
+        if not trap_code or not ('brk' in trap_code[0][2] if aarch64 else 'ud' in trap_code[0][2]):
+            return None
+        branching_code = TrapSiteCFIChecker.__block_before(disassembler, code, section, branch, aarch64)
+        if branching_code is None:
+            return None
+        call_code = []
+        call_mnemonic = 'blr' if aarch64 else 'call'
+        for _, _, mnemonic, operands in disassembler.disasm_lite(
+                code[other:other + TrapSiteCFIChecker.CALL_WINDOW], section.address + other):
+            call_code.append([mnemonic, operands])
+            if helper.ends_block(mnemonic, aarch64):
+                break
+        if not any(call_mnemonic in mnemonic for mnemonic, _ in call_code):
+            return None
+        return check_compare_code(branching_code, call_code, call_mnemonic)
+
+    @staticmethod
+    def __block_before(disassembler, code: bytes, section: ElfSection, branch: int, aarch64: bool) \
+            -> Union[List[List[str]], None]:
+        """
+        Decode the instructions before a branch, up to the previous instruction ending a block.
+        x86 instructions are decoded from the first start in the window that reaches the branch.
+
+        :return: Assembly representation of the block ending with the branch, None if the branch is not reached
+        """
+        starts = [max(0, branch - TrapSiteCFIChecker.WINDOW) // 4 * 4] if aarch64 else \
+            range(max(0, branch - TrapSiteCFIChecker.WINDOW), branch + 1)
+        for start in starts:
+            block: List[List[str]] = []
+            reached = False
+            for address, _, mnemonic, operands in disassembler.disasm_lite(
+                    code[start:branch + 16], section.address + start):
+                if address - section.address > branch:
+                    break
+                block.append([mnemonic, operands])
+                if address - section.address == branch:
+                    reached = True
+                    break
+                if helper.ends_block(mnemonic, aarch64):
+                    block = []
+            if not reached:
+                continue
+            mnemonic = block[-1][0]
+            if aarch64 and not helper.ends_block(mnemonic, aarch64) or \
+                    not aarch64 and (not mnemonic.startswith('j') or mnemonic == 'jmp'):
+                return None
+            return block
+        return None
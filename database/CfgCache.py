@@ -0,0 +1,127 @@
+import importlib.metadata
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Union
+
+from checker.CfgSummary import CfgSummary
+
+
+class CfgCache:
+    """
+    Local SQLite cache of CFG summaries, so reruns over already analyzed images (-i, -e, -m) do not generate the
+    CFG of a binary again. Summaries are identified by the checksum of the binary, the angr version and the analysis
+    profile. The total size of the stored summaries is capped, the least recently used are evicted.
+    Worker processes open their own connection on first use.
+    """
+
+    DEFAULT_MAX_BYTES: int = 1 << 30
+    # Increased whenever the layout of the table changes, older caches are discarded
+    VERSION: int = 1
+
+    __TABLE: str = 'CREATE TABLE IF NOT EXISTS CfgSummary (Checksum text, AngrVersion text, Profile text, ' \
+                   'SummaryVersion integer, Summary blob, Size integer, LastUsed real, ' \
+                   'PRIMARY KEY (Checksum, AngrVersion, Profile))'
+    __LAST_USED_INDEX: str = 'CREATE INDEX IF NOT EXISTS CfgSummaryLastUsed ON CfgSummary (LastUsed)'
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param path: path of the SQLite file, created if it does not exist
+        :param max_bytes: maximum total size of the cached summaries
+        """
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        self.logging = logging.getLogger(__name__)
+        try:
+            self.angr_version: str = importlib.metadata.version('angr')
+        except importlib.metadata.PackageNotFoundError:
+            self.angr_version = 'unknown'
+        self.__lock = threading.Lock()
+        self.__connection: Union[sqlite3.Connection, None] = None
+        self.__pid: int = 0
+        connection = self.__connect()
+        if connection.execute('PRAGMA user_version').fetchone()[0] != CfgCache.VERSION:
+            connection.execute('DROP TABLE IF EXISTS CfgSummary')
+            connection.execute(f'PRAGMA user_version = {CfgCache.VERSION}')
+        connection.execute(CfgCache.__TABLE)
+        connection.execute(CfgCache.__LAST_USED_INDEX)
+        connection.commit()
+
+    def get(self, checksum: str, profile: str) -> Union[CfgSummary, None]:
+        """
+        Look up the CFG summary of a binary.
+
+        :param checksum: checksum of the binary, prefixed with its algorithm
+        :param profile: name of the analysis profile the CFG was generated with
+        :return: Cached summary or None if not cached
+        """
+        with self.__lock:
+            connection = self.__connect()
+            row = connection.execute(
+                'SELECT Summary FROM CfgSummary WHERE Checksum = ? AND AngrVersion = ? AND Profile = ? AND '
+                'SummaryVersion = ?', (checksum, self.angr_version, profile, CfgSummary.VERSION)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE CfgSummary SET LastUsed = ? WHERE Checksum = ? AND AngrVersion = ? AND '
+                               'Profile = ?', (time.time(), checksum, self.angr_version, profile))
+            connection.commit()
+        return CfgSummary.from_data(json.loads(zlib.decompress(row[0])))
+
+    def put(self, checksum: str, profile: str, summary: CfgSummary):
+        """
+        Cache the CFG summary of a binary and evict the least recently used summaries beyond the size cap.
+
+        :param checksum: checksum of the binary, prefixed with its algorithm
+        :param profile: name of the analysis profile the CFG was generated with
+        :param summary: summary to cache
+        """
+        blob = zlib.compress(json.dumps(summary.to_data(), separators=(',', ':')).encode())
+        with self.__lock:
+            connection = self.__connect()
+            connection.execute('REPLACE INTO CfgSummary (Checksum, AngrVersion, Profile, SummaryVersion, Summary, '
+                               'Size, LastUsed) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (checksum, self.angr_version, profile, CfgSummary.VERSION, blob, len(blob),
+                                time.time()))
+            self.__evict(connection)
+            connection.commit()
+
+    def close(self):
+        """
+        Evict the least recently used summaries beyond the cap and close the connection of this process.
+        """
+        with self.__lock:
+            if self.__connection is not None and self.__pid == os.getpid():
+                self.__evict(self.__connection)
+                self.__connection.commit()
+                self.__connection.close()
+            self.__connection = None
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        :return: Connection of the current process, opened on first use
+        """
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__pid = os.getpid()
+        return self.__connection
+
+    def __evict(self, connection: sqlite3.Connection):
+        """
+        Delete the least recently used summaries until the total size is within max_bytes.
+        """
+        total = connection.execute('SELECT COALESCE(SUM(Size), 0) FROM CfgSummary').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for rowid, size in connection.execute('SELECT rowid, Size FROM CfgSummary ORDER BY LastUsed'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            total -= size
+        self.logging.info(f'Evicting {len(evicted)} summaries from CFG cache {self.path}')
+        connection.executemany('DELETE FROM CfgSummary WHERE rowid = ?', evicted)
@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Union
+
+
+class FingerprintCache:
+    """
+    Local SQLite cache of per-file results that only depend on the file contents: detected format, checksum and
+    unsafe-language verdict. Files are identified by (st_dev, st_ino, size, mtime_ns) and a hash of their first and
+    last bytes, an entry is replaced as soon as any of them changed. Loop devices are reused across images and builds
+    use fixed timestamps, so the sample (covering the ELF header and usually the build id) tells apart unrelated files
+    that got the same inode. The unsafe-language verdict is also found by checksum, so it survives a file getting a
+    new inode, e.g. when an image is mounted again.
+    The number of entries is capped, the least recently used entries are evicted.
+    """
+
+    DEFAULT_MAX_ENTRIES: int = 2000000
+    # Increased whenever the way a cached result is computed changes, older caches are discarded
+    VERSION: int = 4
+    # Number of writes between two commits (and evictions)
+    COMMIT_INTERVAL: int = 1000
+    # Bytes at the start and at the end of a file hashed into its sample
+    SAMPLE_SIZE: int = 4096
+
+    FIELDS = ('Format', 'Checksum', 'UnsafeLanguage')
+
+    __TABLE: str = 'CREATE TABLE IF NOT EXISTS Fingerprint (Device integer, Inode integer, Size integer, ' \
+                   'MtimeNs integer, Sample text, Format text, Checksum text, UnsafeLanguage integer, ' \
+                   'LastUsed real, PRIMARY KEY (Device, Inode))'
+    __CHECKSUM_INDEX: str = 'CREATE INDEX IF NOT EXISTS FingerprintChecksum ON Fingerprint (Checksum)'
+    __LAST_USED_INDEX: str = 'CREATE INDEX IF NOT EXISTS FingerprintLastUsed ON Fingerprint (LastUsed)'
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        :param path: path of the SQLite file, created if it does not exist
+        :param max_entries: maximum number of cached files
+        """
+        self.path: str = path
+        self.max_entries: int = max_entries
+        self.__lock = threading.Lock()
+        self.__writes: int = 0
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('PRAGMA synchronous=OFF')
+        if self.__connection.execute('PRAGMA user_version').fetchone()[0] != FingerprintCache.VERSION:
+            self.__connection.execute('DROP TABLE IF EXISTS Fingerprint')
+            self.__connection.execute(f'PRAGMA user_version = {FingerprintCache.VERSION}')
+        self.__connection.execute(FingerprintCache.__TABLE)
+        self.__connection.execute(FingerprintCache.__CHECKSUM_INDEX)
+        self.__connection.execute(FingerprintCache.__LAST_USED_INDEX)
+        self.__connection.commit()
+        self.logging = logging.getLogger(__name__)
+
+    @staticmethod
+    def sample(data) -> str:
+        """
+        :param data: contents of a file, e.g. a memory map
+        :return: Hash of the first and last SAMPLE_SIZE bytes
+        """
+        sample = hashlib.blake2b(digest_size=16)
+        sample.update(data[:FingerprintCache.SAMPLE_SIZE])
+        sample.update(data[max(0, len(data) - FingerprintCache.SAMPLE_SIZE):])
+        return sample.hexdigest()
+
+    @staticmethod
+    def read_sample(file_path: str, file_stat: os.stat_result) -> str:
+        """
+        :param file_path: path of a regular file
+        :param file_stat: stat result of the file
+        :return: Hash of the first and last SAMPLE_SIZE bytes, see sample()
+        """
+        with open(file_path, 'rb') as file:
+            head = file.read(FingerprintCache.SAMPLE_SIZE)
+            tail = b''
+            if file_stat.st_size > FingerprintCache.SAMPLE_SIZE:
+                file.seek(max(FingerprintCache.SAMPLE_SIZE, file_stat.st_size - FingerprintCache.SAMPLE_SIZE))
+                tail = file.read(FingerprintCache.SAMPLE_SIZE)
+        return FingerprintCache.sample(head + tail)
+
+    def get(self, file_stat: os.stat_result, sample: str, field: str):
+        """
+        Look up a cached result of a file.
+
+        :param file_stat: stat result of the file
+        :param sample: hash of the first and last bytes of the file, see sample()
+        :param field: one of FIELDS
+        :return: Cached value or None if not cached or the file changed
+        """
+        FingerprintCache.__check_field(field)
+        with self.__lock:
+            row = self.__connection.execute(
+                f'SELECT {field} FROM Fingerprint WHERE Device = ? AND Inode = ? AND Size = ? AND MtimeNs = ? AND '
+                f'Sample = ?', FingerprintCache.__key(file_stat, sample)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            self.__connection.execute('UPDATE Fingerprint SET LastUsed = ? WHERE Device = ? AND Inode = ?',
+                                      (time.time(), file_stat.st_dev, file_stat.st_ino))
+            self.__written()
+        return row[0]
+
+    def get_unsafe_language(self, checksum: str) -> Union[bool, None]:
+        """
+        Look up the unsafe-language verdict of any file with the given checksum.
+
+        :param checksum: checksum of the file
+        :return: Cached verdict or None if not cached
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT UnsafeLanguage FROM Fingerprint WHERE Checksum = ? AND UnsafeLanguage IS NOT NULL LIMIT 1',
+                (checksum,)).fetchone()
+        return None if row is None else bool(row[0])
+
+    def put(self, file_stat: os.stat_result, sample: str, field: str, value):
+        """
+        Cache a result of a file, all cached results of an older version of the file (or of another file with the
+        same inode) are dropped.
+
+        :param file_stat: stat result of the file
+        :param sample: hash of the first and last bytes of the file, see sample()
+        :param field: one of FIELDS
+        :param value: result to cache
+        """
+        FingerprintCache.__check_field(field)
+        key = FingerprintCache.__key(file_stat, sample)
+        with self.__lock:
+            self.__connection.execute(
+                'DELETE FROM Fingerprint WHERE Device = ? AND Inode = ? AND (Size != ? OR MtimeNs != ? OR '
+                'Sample != ?)', key)
+            self.__connection.execute('INSERT OR IGNORE INTO Fingerprint (Device, Inode, Size, MtimeNs, Sample) '
+                                      'VALUES (?, ?, ?, ?, ?)', key)
+            self.__connection.execute(
+                f'UPDATE Fingerprint SET {field} = ?, LastUsed = ? WHERE Device = ? AND Inode = ?',
+                (value, time.time(), file_stat.st_dev, file_stat.st_ino))
+            self.__written()
+
+    def close(self):
+        """
+        Evict the least recently used entries beyond the cap and write everything to disk.
+        """
+        with self.__lock:
+            self.__evict()
+            self.__connection.commit()
+            self.__connection.close()
+
+    def __written(self):
+        """
+        Commit and evict every COMMIT_INTERVAL writes, must be called with the lock held.
+        """
+        self.__writes += 1
+        if self.__writes % FingerprintCache.COMMIT_INTERVAL == 0:
+            self.__evict()
+            self.__connection.commit()
+
+    def __evict(self):
+        """
+        Delete the least recently used entries beyond max_entries, must be called with the lock held.
+        """
+        count = self.__connection.execute('SELECT COUNT(*) FROM Fingerprint').fetchone()[0]
+        if count > self.max_entries:
+            self.logging.info(f'Evicting {count - self.max_entries} entries from fingerprint cache {self.path}')
+            self.__connection.execute(
+                'DELETE FROM Fingerprint WHERE rowid IN (SELECT rowid FROM Fingerprint ORDER BY LastUsed LIMIT ?)',
+                (count - self.max_entries,))
+
+    @staticmethod
+    def __key(file_stat: os.stat_result, sample: str) -> tuple:
+        return file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns, sample
+
+    @staticmethod
+    def __check_field(field: str):
+        if field not in FingerprintCache.FIELDS:
+            raise ValueError(f'Unknown fingerprint cache field {field}')
@@ -0,0 +1,66 @@
+import logging
+import threading
+from typing import Dict
+
+
+class KnownBinaries:
+    """
+    Ids of the binaries of one operating system version that are already in the database, with their single-module
+    CFI flag. Loaded with one query when the analysis starts and updated as results are written, so the checkers look
+    up whether a binary exists without a query per binary.
+    """
+
+    # Rows fetched at once while loading
+    FETCH_SIZE: int = 10000
+
+    def __init__(self, version: str):
+        """
+        :param version: version of the operating system
+        """
+        self.version: str = version
+        self.logging = logging.getLogger(__name__)
+        self.__lock = threading.Lock()
+        self.__single_cfi: Dict[str, bool] = {}
+
+    def load(self, cursor):
+        """
+        Load the Ids and single-module CFI flags of all binaries of the version.
+
+        :param cursor: cursor of the result database
+        """
+        cursor.execute('SELECT Id, Single_CFI FROM BinaryFile WHERE OsVersion = ?', (self.version,))
+        single_cfi = {}
+        rows = cursor.fetchmany(KnownBinaries.FETCH_SIZE)
+        while rows:
+            for binary_id, flag in rows:
+                single_cfi[binary_id] = bool(flag)
+            rows = cursor.fetchmany(KnownBinaries.FETCH_SIZE)
+        with self.__lock:
+            self.__single_cfi = single_cfi
+        self.logging.info(f'Loaded {len(single_cfi)} known binaries of {self.version}')
+
+    def add(self, binary_id: str, single_cfi: bool):
+        """
+        Record a binary written to the database.
+
+        :param binary_id: Id of the binary
+        :param single_cfi: whether the binary was compiled using single-module CFI
+        """
+        with self.__lock:
+            self.__single_cfi[binary_id] = bool(single_cfi)
+
+    def exists(self, binary_id: str) -> bool:
+        """
+        :param binary_id: Id of the binary
+        :return: Whether the binary exists in the database
+        """
+        with self.__lock:
+            return binary_id in self.__single_cfi
+
+    def has_single_cfi(self, binary_id: str) -> bool:
+        """
+        :param binary_id: Id of the binary
+        :return: Whether the binary exists in the database compiled using single-module CFI
+        """
+        with self.__lock:
+            return self.__single_cfi.get(binary_id, False)
@@ -0,0 +1,67 @@
+import logging
+import sqlite3
+from typing import Dict, Set, Tuple
+
+import global_variables
+from database.Storage import Storage
+
+
+class ResultMerger:
+    """
+    Bulk-imports SQLite result files, e.g. of several worker machines, into the result database set up in
+    global_variables. Tables are copied in the order of their foreign keys; binaries and cached verdicts of a later
+    file replace those with the same key, the other rows are only added if they do not exist yet.
+    """
+
+    # Rows copied with one executemany and commit
+    CHUNK_SIZE: int = 5000
+    TABLES: Tuple[Tuple[str, str], ...] = (('OperatingSystem', 'INSERT IGNORE'), ('Image', 'INSERT IGNORE'),
+                                           ('SpecialFile', 'INSERT IGNORE'), ('BinaryFile', 'REPLACE'),
+                                           ('VerdictCache', 'REPLACE'))
+
+    def __init__(self):
+        self.logging = logging.getLogger(__name__)
+        # Name and version of the operating systems found in the merged files
+        self.versions: Set[Tuple[str, str]] = set()
+
+    def merge(self, path: str) -> Dict[str, int]:
+        """
+        Copy all results of a SQLite result file.
+
+        :param path: path of the SQLite result file, opened read-only
+        :return: Number of copied rows per table
+        """
+        counts = {}
+        source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, verb in ResultMerger.TABLES:
+                if table in tables:
+                    counts[table] = self.__copy(source, table, verb)
+            if 'OperatingSystem' in tables:
+                self.versions.update(source.execute('SELECT OS_Name, Version FROM OperatingSystem').fetchall())
+        finally:
+            source.close()
+        self.logging.info(f'Merged {path}: {counts}')
+        return counts
+
+    def __copy(self, source: sqlite3.Connection, table: str, verb: str) -> int:
+        """
+        :param source: connection to the SQLite result file
+        :param table: table to copy, the columns are taken from the source
+        :param verb: INSERT IGNORE or REPLACE
+        :return: Number of copied rows
+        """
+        rows = source.execute(f'SELECT * FROM {table}')
+        columns = [description[0] for description in rows.description]
+        query = Storage.dialect_query(f'{verb} INTO {table} ({", ".join(columns)}) VALUES '
+                                      f'({", ".join("?" for _ in columns)})', global_variables.backend)
+        copied = 0
+        chunk = rows.fetchmany(ResultMerger.CHUNK_SIZE)
+        while chunk:
+            with global_variables.database_lock:
+                global_variables.cursor.executemany(query, chunk)
+                global_variables.connection.commit()
+            copied += len(chunk)
+            chunk = rows.fetchmany(ResultMerger.CHUNK_SIZE)
+        return copied
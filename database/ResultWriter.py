@@ -0,0 +1,98 @@
+import itertools
+import logging
+import threading
+from typing import Hashable, List, Set, Tuple
+
+
+class ResultWriter:
+    """
+    Buffers the rows written to the result database and writes them with executemany and one commit per batch,
+    instead of one commit per row. Consecutive rows of the same statement form one executemany call, so the rows are
+    written in the order they were added. A batch is flushed once it holds batch_size rows, after each subimage or
+    package and on shutdown.
+    Rows that are read back before they are flushed, e.g. a binary found twice, are tracked by a key, see
+    is_pending and flush_pending.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 500
+
+    def __init__(self, connection, cursor, lock: threading.RLock, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        :param connection: connection to the result database
+        :param cursor: cursor of the connection
+        :param lock: lock serializing the use of the cursor
+        :param batch_size: number of rows written with one commit, 1 commits every row
+        """
+        self.connection = connection
+        self.cursor = cursor
+        self.lock: threading.RLock = lock
+        self.batch_size: int = max(batch_size, 1)
+        self.logging = logging.getLogger(__name__)
+        self.__rows: List[Tuple[str, tuple]] = []
+        self.__pending: Set[Hashable] = set()
+
+    def add(self, query: str, params: tuple, key: Hashable = None):
+        """
+        Buffer a row, the batch is flushed once it is full.
+
+        :param query: statement writing the row
+        :param params: parameters of the statement
+        :param key: identifies the row for is_pending, e.g. ('BinaryFile', id)
+        """
+        with self.lock:
+            self.__rows.append((query, params))
+            if key is not None:
+                self.__pending.add(key)
+            if len(self.__rows) >= self.batch_size:
+                self.flush()
+
+    def is_pending(self, key: Hashable) -> bool:
+        """
+        :param key: key the row was added with
+        :return: Whether a row with the key is buffered and not yet written
+        """
+        with self.lock:
+            return key in self.__pending
+
+    def flush_pending(self, *keys: Hashable):
+        """
+        Flush the batch if it holds a row with any of the keys, before the rows are read from the database.
+
+        :param keys: keys the rows were added with
+        """
+        with self.lock:
+            if any(key in self.__pending for key in keys):
+                self.flush()
+
+    def flush(self):
+        """
+        Write and commit all buffered rows. If the batch fails, the rows are written one by one, so a single
+        invalid row does not lose the others.
+        """
+        with self.lock:
+            rows, self.__rows = self.__rows, []
+            self.__pending.clear()
+            if not rows:
+                return
+            try:
+                for query, group in itertools.groupby(rows, key=lambda row: row[0]):
+                    self.cursor.executemany(query, [params for _, params in group])
+                self.connection.commit()
+            except Exception as e:
+                self.logging.error(f'Could not write batch of {len(rows)} rows, writing them one by one: {e}')
+                self.connection.rollback()
+                self.__write_each(rows)
+
+    def __write_each(self, rows: List[Tuple[str, tuple]]):
+        """
+        Write and commit each row on its own, rows that fail are logged and skipped.
+
+        :param rows: statements and parameters of the rows
+        """
+        for query, params in rows:
+            try:
+                self.cursor.execute(query, params)
+                self.connection.commit()
+            except Exception as e:
+                self.logging.error(f'Could not write row {params}: {e}')
+                self.connection.rollback()
@@ -0,0 +1,51 @@
+import sqlite3
+from typing import Tuple
+
+
+class Storage:
+    """
+    Backends of the result database: a MariaDB server configured in database/config.ini or a local SQLite file.
+    Both are used through the same queries with ? placeholders, statements only MariaDB understands are translated
+    for SQLite by dialect_query.
+    """
+
+    MARIADB: str = 'mariadb'
+    SQLITE: str = 'sqlite'
+    BACKENDS = (MARIADB, SQLITE)
+
+    @staticmethod
+    def connect_mariadb() -> Tuple[object, object]:
+        """
+        :return: Connection to the MariaDB server and a prepared cursor
+        """
+        # Imported here, so runs on SQLite do not need the MySQL connector
+        from mysql.connector import MySQLConnection
+        from database.DatabaseConfig import DatabaseConfig
+
+        db_config: {} = DatabaseConfig.read_db_config()
+        connection = MySQLConnection(**db_config)
+        return connection, connection.cursor(prepared=True)
+
+    @staticmethod
+    def connect_sqlite(path: str) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
+        """
+        Open a SQLite result file in WAL mode, so the results can be read while the single writer commits batches.
+
+        :param path: path of the SQLite file, created if it does not exist
+        :return: Connection to the file and a cursor
+        """
+        connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection, connection.cursor()
+
+    @staticmethod
+    def dialect_query(query: str, backend: str) -> str:
+        """
+        :param query: query written for MariaDB
+        :param backend: one of BACKENDS
+        :return: Query understood by the backend
+        """
+        if backend == Storage.SQLITE:
+            return query.replace('INSERT IGNORE', 'INSERT OR IGNORE')
+        return query
@@ -19,7 +19,6 @@ class JavaArchiveExtractor:
         :return: Path to destination
         """
         with ZipFile(apex_path, 'r') as zip_file:
-            print(zip_file)
             for file_name in zip_file.namelist():
                 if file_name == JavaArchiveExtractor.__CAPEX_APEX_FILENAME:
                     zip_file.extract(file_name, dest_path)
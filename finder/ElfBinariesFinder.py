@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
+from typing import Union
 
 from finder.FileFinder import FileFinder
+from finder.FileIndex import FileIndex
 from finder.MagicValuesExtensions import MagicValues, FileExtensions
 
 
@@ -10,11 +12,12 @@ class ElfBinariesFinder:
     Find all ELF executables.
     """
     @staticmethod
-    def find_all(top_dir_path: Path):
+    def find_all(top_dir_path: Path, index: Union[FileIndex, None] = None):
         """
         Find all binary files.
 
         :param top_dir_path: top directory given as user input
+        :param index: index of the directory, walk the directory if not set
         :return: List of paths of all binaries
         """
         all_elf_binaries = FileFinder(
@@ -24,6 +27,7 @@ class ElfBinariesFinder:
                 magic_values_blacklist=[
                     FileExtensions.OAT_FILE_EXTENSION,
                     FileExtensions.ODEX_FILE_EXTENSION
-                ]
+                ],
+                index=index
             ).find_all()
         return all_elf_binaries
@@ -1,5 +1,6 @@
 from pathlib import Path
-from typing import List
+from typing import List, Union
+from finder.FileIndex import FileIndex
 from finder.Fingerprinter import Fingerprinter
 from finder.MagicValuesExtensions import MagicValues, FileExtensions
 
@@ -13,7 +14,8 @@ class FileFinder:
     def __init__(self, dir_path: Path,
                  magic_value_prefix: MagicValues,
                  file_extension: FileExtensions,
-                 magic_values_blacklist=None):
+                 magic_values_blacklist=None,
+                 index: Union[FileIndex, None] = None):
         """
         Find all files of a given type and format.
 
@@ -21,6 +23,7 @@ class FileFinder:
         :param magic_value_prefix: Magic value of the file format to find
         :param file_extension: Extension of the file format to find
         :param magic_values_blacklist: Blacklist of magic values to exclude
+        :param index: Index of the directory, walk the directory if not set
         """
         if magic_values_blacklist is None:
             magic_values_blacklist = []
@@ -28,6 +31,7 @@ class FileFinder:
         self.__magic_value_prefix = magic_value_prefix
         self.__file_extension = file_extension
         self.__magic_values_blacklist = magic_values_blacklist
+        self.__index = index
 
     def find_all(self) -> List[Path]:
         """
@@ -36,7 +40,11 @@ class FileFinder:
         :return: List of all files of a given type or format
         """
         matched_files = []
-        for fingerprint in Fingerprinter.directory(self.__dir_path):
+        if self.__index is not None:
+            fingerprints = self.__index.fingerprints(self.__dir_path)
+        else:
+            fingerprints = Fingerprinter.directory(self.__dir_path)
+        for fingerprint in fingerprints:
             magic_value = fingerprint.magic_value
             binary_name = fingerprint.binary_name
             if magic_value.startswith(str(self.__magic_value_prefix)) and \
@@ -0,0 +1,47 @@
+from pathlib import Path
+from typing import Dict, Iterator
+
+from finder.Fingerprinter import Fingerprinter, FileFingerprint
+
+
+class FileIndex:
+    """
+    In-memory index of the fingerprints (path -> format, size, inode) of all files below a mount or extracted
+    directory. Built with a single walk, all finders of the directory query the index instead of walking again.
+    """
+
+    def __init__(self, dir_path: Path):
+        """
+        :param dir_path: mount point or extracted directory to index
+        """
+        self.dir_path: Path = Path(dir_path)
+        self.__fingerprints: Dict[Path, FileFingerprint] = {
+            fingerprint.file_path: fingerprint for fingerprint in Fingerprinter.directory(self.dir_path)}
+
+    def __len__(self) -> int:
+        return len(self.__fingerprints)
+
+    def __contains__(self, file_path: Path) -> bool:
+        return Path(file_path) in self.__fingerprints
+
+    def get(self, file_path: Path) -> FileFingerprint:
+        """
+        :param file_path: path of an indexed file
+        :return: Fingerprint of the file
+        """
+        return self.__fingerprints[Path(file_path)]
+
+    def fingerprints(self, dir_path=None) -> Iterator[FileFingerprint]:
+        """
+        Fingerprints of all indexed files, optionally only those below a subdirectory.
+
+        :param dir_path: subdirectory of the indexed directory
+        :return: Fingerprints of the files
+        """
+        if dir_path is None or Path(dir_path) == self.dir_path:
+            yield from self.__fingerprints.values()
+            return
+        dir_path = Path(dir_path)
+        for file_path, fingerprint in self.__fingerprints.items():
+            if dir_path in file_path.parents:
+                yield fingerprint
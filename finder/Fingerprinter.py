@@ -1,17 +1,21 @@
 import os
-import magic
 import logging
-from dataclasses import dataclass
+import stat
 from pathlib import Path
-from typing import List
+from typing import Iterator, NamedTuple
+
+import global_variables
+from finder.FormatSniffer import FormatSniffer
 
 logging = logging.getLogger(__name__)
 
-@dataclass
-class FileFingerprint:
+
+class FileFingerprint(NamedTuple):
     file_path: Path
     magic_value: str
     binary_name: str
+    size: int = 0
+    inode: int = 0
 
 
 class Fingerprinter:
@@ -19,43 +23,84 @@ class Fingerprinter:
     Generate a fingerprint (=signature) for each file.
     """
 
+    # Number of fingerprinted files between two progress messages
+    PROGRESS_INTERVAL: int = 10000
+
     @staticmethod
-    def directory(dir_path: Path) -> List[FileFingerprint]:
+    def directory(dir_path: Path) -> Iterator[FileFingerprint]:
         """
-        Iterate through all files and return their fingerprints
+        Iterate through all files and yield their fingerprints one at a time, the directory is never listed as a
+        whole.
 
         :param dir_path: top directory given as user input
-        :return: List of fingerprints (file's path, file's magic value, file's name)
+        :return: Fingerprints (file's path, file's magic value, file's name, file's size and inode)
         """
-        all_files = Fingerprinter.__get_all_files(dir_path)
-        logging.info(f'All files in directory {all_files}')
-        file_fingerprints = []
-        for file in all_files:
+        count = 0
+        for entry in Fingerprinter.__scan(str(dir_path)):
             try:
-                if Path(file).is_file() or Path(file).is_dir():
-                    fingerprint = FileFingerprint(
-                        file_path=Path(file),
-                        magic_value=magic.from_file(file), binary_name=Path(file).name
-                    )
-                    print(file)
-                    file_fingerprints.append(fingerprint)
+                file_stat = entry.stat(follow_symlinks=False)
+                fingerprint = FileFingerprint(
+                    file_path=Path(entry.path),
+                    magic_value=Fingerprinter.__describe(entry.path, file_stat), binary_name=entry.name,
+                    size=file_stat.st_size, inode=entry.inode()
+                )
             except FileNotFoundError as e:
-                # Occurs because of broken symbolic link
-                logging.error(f'Could not find file {file}: {e}')
+                # Occurs because of files removed while walking
+                logging.error(f'Could not find file {entry.path}: {e}')
+                continue
             except PermissionError as e:
                 logging.error(f'No permission to open file {e}')
+                continue
+            count += 1
+            if count % Fingerprinter.PROGRESS_INTERVAL == 0:
+                logging.info(f'Fingerprinted {count} files in {dir_path}, last {entry.path}')
+            yield fingerprint
+        logging.info(f'Fingerprinted {count} files in {dir_path}')
+
+    @staticmethod
+    def __describe(file_path: str, file_stat: os.stat_result) -> str:
+        """
+        Describe the format of a file, looked up in the fingerprint cache first.
 
-        return file_fingerprints
+        :param file_path: file to describe
+        :param file_stat: result of lstat of the file
+        :return: Description of the format
+        """
+        cache = global_variables.fingerprint_cache
+        if cache is None or not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size == 0:
+            # Other files are described without reading them, nothing to save
+            return FormatSniffer.sniff(file_path, file_stat)
+        try:
+            sample = cache.read_sample(file_path, file_stat)
+        except OSError:
+            return FormatSniffer.sniff(file_path, file_stat)
+        description = cache.get(file_stat, sample, 'Format')
+        if description is None:
+            description = FormatSniffer.sniff(file_path, file_stat)
+            cache.put(file_stat, sample, 'Format', description)
+        return description
 
     @staticmethod
-    def __get_all_files(top_dir_path: Path) -> []:
+    def __scan(top_dir_path: str) -> Iterator[os.DirEntry]:
         """
-        Extract all files contained in given image (user input)
+        Walk the directory tree depth first with scandir, which provides the file type without an extra stat.
+        Symbolic links to directories are not followed and, like broken symbolic links or device files, not yielded.
 
         :param top_dir_path: top directory given as user input
-        :return: List of all files
+        :return: Entries of all files
         """
-        all_files = [os.path.join(dirpath, f)
-                     for (dirpath, dirnames, filenames) in os.walk(top_dir_path)
-                     for f in filenames]
-        return all_files
+        stack = [top_dir_path]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                yield entry
+                        except OSError as e:
+                            logging.error(f'Could not inspect {entry.path}: {e}')
+            except OSError as e:
+                logging.error(f'Could not list directory {dir_path}: {e}')
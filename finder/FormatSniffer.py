@@ -0,0 +1,154 @@
+import os
+import stat
+import struct
+from pathlib import Path
+from typing import Union
+
+
+class FormatSniffer:
+    """
+    Recognize the file formats in MagicValues from the magic numbers in the first bytes of a file.
+    Returns descriptions starting like the ones of libmagic and only falls back to libmagic if the result
+    is ambiguous, as libmagic is by far the slowest part of fingerprinting.
+    """
+
+    HEADER_SIZE: int = 4096
+
+    ELF_MAGIC: bytes = b'\x7fELF'
+    AR_MAGIC: bytes = b'!<arch>\n'
+    DEB_MEMBER: bytes = b'debian-binary'
+    SQUASHFS_MAGIC_LE: bytes = b'hsqs'
+    SQUASHFS_MAGIC_BE: bytes = b'sqsh'
+    SPARSE_MAGIC: int = 0xED26FF3A
+    EXT_MAGIC: int = 0xEF53
+    EXT_SUPERBLOCK_OFFSET: int = 1024
+    ISO_MAGIC: bytes = b'CD001'
+    ISO_OFFSETS = ((32769, 'ISO 9660 CD-ROM filesystem data'),
+                   (37633, 'ISO 9660 CD-ROM filesystem data (raw 2352 byte sectors)'))
+    ZIP_MAGIC: bytes = b'PK\x03\x04'
+    JAR_EXTRA_FIELD: int = 0xCAFE
+
+    __ELF_TYPES = {1: 'relocatable', 2: 'executable', 3: 'shared object', 4: 'core file'}
+
+    @staticmethod
+    def sniff(file_path: Union[Path, str], file_stat: Union[os.stat_result, None] = None) -> str:
+        """
+        Describe the format of a file.
+
+        :param file_path: file to describe
+        :param file_stat: result of lstat of the file if already known
+        :return: Description starting like the one of libmagic for the formats in MagicValues
+        """
+        file_path = str(file_path)
+        try:
+            if file_stat is None:
+                file_stat = os.lstat(file_path)
+            if stat.S_ISLNK(file_stat.st_mode):
+                # libmagic does not follow symbolic links
+                return f'symbolic link to {os.readlink(file_path)}'
+            if not stat.S_ISREG(file_stat.st_mode):
+                return FormatSniffer.__libmagic(file_path)
+            if file_stat.st_size == 0:
+                return 'empty'
+            with open(file_path, 'rb') as file:
+                header = file.read(FormatSniffer.HEADER_SIZE)
+                description = FormatSniffer.__describe(header)
+                if description == 'data' and file_stat.st_size > FormatSniffer.ISO_OFFSETS[0][0]:
+                    description = FormatSniffer.__describe_iso(file, header)
+        except OSError:
+            return FormatSniffer.__libmagic(file_path)
+        if description is None:
+            return FormatSniffer.__libmagic(file_path)
+        return description
+
+    @staticmethod
+    def __describe(header: bytes) -> Union[str, None]:
+        """
+        Describe the format based on the header.
+
+        :param header: first bytes of the file
+        :return: Description, 'data' if no known format matches or None if ambiguous
+        """
+        if header.startswith(FormatSniffer.ELF_MAGIC):
+            return FormatSniffer.__describe_elf(header)
+        if header.startswith(FormatSniffer.AR_MAGIC):
+            member = header[len(FormatSniffer.AR_MAGIC):]
+            if member.startswith(FormatSniffer.DEB_MEMBER):
+                return 'Debian binary package'
+            if member.startswith(b'debian'):
+                return None
+            return 'current ar archive'
+        if header.startswith(FormatSniffer.SQUASHFS_MAGIC_LE):
+            return 'Squashfs filesystem, little endian'
+        if header.startswith(FormatSniffer.SQUASHFS_MAGIC_BE):
+            return 'Squashfs filesystem, big endian'
+        if len(header) >= 4 and struct.unpack_from('<I', header)[0] == FormatSniffer.SPARSE_MAGIC:
+            major, minor = struct.unpack_from('<HH', header, 4)
+            return f'Android sparse image, version: {major}.{minor}'
+        if header.startswith(FormatSniffer.ZIP_MAGIC):
+            return FormatSniffer.__describe_zip(header)
+        if len(header) >= 0x468 and struct.unpack_from('<H', header, 0x438)[0] == FormatSniffer.EXT_MAGIC:
+            return FormatSniffer.__describe_ext(header)
+        return 'data'
+
+    @staticmethod
+    def __describe_elf(header: bytes) -> str:
+        elf_class = {1: '32-bit', 2: '64-bit'}.get(header[4] if len(header) > 4 else 0, 'invalid class')
+        encoding = {1: 'LSB', 2: 'MSB'}.get(header[5] if len(header) > 5 else 0, 'invalid byte order')
+        description = f'ELF {elf_class} {encoding}'
+        if len(header) >= 18 and header[5] in (1, 2):
+            elf_type = struct.unpack_from('<H' if header[5] == 1 else '>H', header, 16)[0]
+            description += ' ' + FormatSniffer.__ELF_TYPES.get(elf_type, 'unknown type')
+        return description
+
+    @staticmethod
+    def __describe_zip(header: bytes) -> Union[str, None]:
+        """
+        Java archives carry the 0xCAFE extra field in their first entry, everything else is left to libmagic.
+        """
+        if len(header) < 30:
+            return None
+        name_length = struct.unpack_from('<H', header, 26)[0]
+        offset = 30 + name_length
+        if len(header) >= offset + 2 and struct.unpack_from('<H', header, offset)[0] == FormatSniffer.JAR_EXTRA_FIELD:
+            return 'Java archive data (JAR)'
+        return None
+
+    @staticmethod
+    def __describe_ext(header: bytes) -> Union[str, None]:
+        """
+        Distinguish ext2, ext3 and ext4 by the superblock feature flags the same way libmagic does.
+        """
+        if any(header[:FormatSniffer.EXT_SUPERBLOCK_OFFSET]):
+            # Something in the boot area, libmagic could describe that first
+            return None
+        revision = struct.unpack_from('<I', header, 0x44c)[0]
+        minor_revision = struct.unpack_from('<H', header, 0x43e)[0]
+        compat, incompat, ro_compat = struct.unpack_from('<III', header, 0x45c)
+        if not compat & 0x4:
+            version = 'ext2'
+        elif incompat < 0x40 and ro_compat < 0x8:
+            version = 'ext3'
+        else:
+            version = 'ext4'
+        return f'Linux rev {revision}.{minor_revision} {version} filesystem data'
+
+    @staticmethod
+    def __describe_iso(file, header: bytes) -> Union[str, None]:
+        """
+        Check for the ISO 9660 volume descriptor, images with a boot sector (hybrid ISO) are left to libmagic.
+
+        :return: Description, 'data' if no volume descriptor was found or None if ambiguous
+        """
+        for offset, description in FormatSniffer.ISO_OFFSETS:
+            file.seek(offset)
+            if file.read(len(FormatSniffer.ISO_MAGIC)) == FormatSniffer.ISO_MAGIC:
+                if header[510:512] == b'\x55\xaa':
+                    return None
+                return description
+        return 'data'
+
+    @staticmethod
+    def __libmagic(file_path: str) -> str:
+        import magic
+        return magic.from_file(file_path)
@@ -1,7 +1,8 @@
 from pathlib import Path
-from typing import List
+from typing import List, Union
 
 from finder.FileFinder import FileFinder
+from finder.FileIndex import FileIndex
 from finder.MagicValuesExtensions import MagicValues, FileExtensions
 
 
@@ -11,17 +12,20 @@ class FormatsFinder:
     """
 
     @staticmethod
-    def find_images(image_path: Path, magic_value: MagicValues, file_extension: FileExtensions) -> List[Path]:
+    def find_images(image_path: Path, magic_value: MagicValues, file_extension: FileExtensions,
+                    index: Union[FileIndex, None] = None) -> List[Path]:
         """
         Find all images in the given path and subdirectories based on their magic value and extension.
 
         :param file_extension: file extension of a file indicating its file type
         :param magic_value: magic value of a file indicating its file type
         :param image_path: top directory given as user input
+        :param index: index of the directory, walk the directory if not set
         :return:  List of paths to all images of given type
         """
         image_file_finder = FileFinder(
             dir_path=image_path,
             magic_value_prefix=magic_value,
-            file_extension=file_extension)
+            file_extension=file_extension,
+            index=index)
         return image_file_finder.find_all()
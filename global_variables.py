@@ -1,37 +1,130 @@
-from mysql.connector import MySQLConnection
-from database.DatabaseConfig import DatabaseConfig
+import threading
+
+from database.CfgCache import CfgCache
+from database.FingerprintCache import FingerprintCache
+from database.KnownBinaries import KnownBinaries
+from database.ResultWriter import ResultWriter
+from database.Storage import Storage
 
 global connection
 global cursor
 
+# Backend of the result database, one of Storage.BACKENDS
+backend = Storage.MARIADB
+
+# Serializes the use of the shared cursor when stages of the analysis pipeline run in threads
+database_lock = threading.RLock()
+
+# Algorithm of the binary checksums, one of BinaryObject.CHECKSUM_ALGORITHMS
+checksum_algorithm = 'md5'
+
+# Cache of formats, checksums and unsafe-language verdicts of files, None if disabled
+fingerprint_cache = None
+
+# Cache of CFG summaries of binaries, None if disabled
+cfg_cache = None
+
+# Batches the writes of the results, created with the connection
+result_writer = None
+
+# Ids of the binaries of the analyzed version in the database, None if not loaded
+known_binaries = None
+
 os_obj_query = 'INSERT IGNORE INTO OperatingSystem (OS_Name, Version) VALUES (?, ?)'
 
 os_update_query = 'UPDATE OperatingSystem SET Binaries_total = ?, Binaries_unsafe = ?, Single_CFI = ?, Multi_CFI = ?, ' \
                        'ShadowCallStack = ? WHERE Version = ?'
 
+os_count_query = 'SELECT COUNT(*), SUM(Unsafe_language = 1), SUM(Unsafe_language = 1 AND Single_CFI = 1), ' \
+                 'SUM(Unsafe_language = 1 AND Multi_CFI = 1), SUM(Unsafe_language = 1 AND ShadowCallStack = 1) ' \
+                 'FROM BinaryFile WHERE OsVersion = ?'
+
 image_obj_query = 'INSERT IGNORE INTO Image (Version, ImageName, ImageType, Id) VALUES (?, ?, ?, ?)'
 
 specialfile_obj_query = 'INSERT IGNORE INTO SpecialFile (Subimage, SpecialFileName, SpecialFileType, SpecialFilePath, ' \
                         'Id) VALUES (?, ?, ?, ?, ?) '
 
 binary_obj_query = 'INSERT INTO BinaryFile (BinaryName, Subimage, SpecialFileTag, BinaryPath, FileTimestamp, Checksum, ' \
-                   'Unsafe_language, Modified, Error, Multi_CFI, Single_CFI, ShadowCallStack, Id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?) '
+                   'Unsafe_language, Modified, Error, Multi_CFI, Single_CFI, ShadowCallStack, AnalysisProfile, ' \
+                   'VerdictTier, JumpTableStubs, OsVersion, Id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) '
 
-binary_update_query = 'UPDATE BinaryFile SET Modified = ?, Error = ?, Multi_CFI = ?, Single_CFI = ?, ShadowCallStack = ? WHERE Id = ?'
+binary_update_query = 'UPDATE BinaryFile SET Modified = ?, Error = ?, Multi_CFI = ?, Single_CFI = ?, ShadowCallStack = ?, ' \
+                      'AnalysisProfile = ?, VerdictTier = ?, JumpTableStubs = ? WHERE Id = ?'
 
+# Formatted with one placeholder per set of checks looked up
+verdict_query = 'SELECT Checks, Modified, Multi_CFI, Single_CFI, ShadowCallStack FROM VerdictCache WHERE Checksum = ? ' \
+                'AND ChecksumAlgorithm = ? AND AnalyzerVersion = ? AND Checks IN ({})'
 
-def setup_global_variables():
+verdict_cache_query = 'REPLACE INTO VerdictCache (Checksum, ChecksumAlgorithm, AnalyzerVersion, Checks, Modified, ' \
+                      'Multi_CFI, Single_CFI, ShadowCallStack) VALUES (?,?,?,?,?,?,?,?)'
+
+
+def setup_global_variables(write_batch_size: int = ResultWriter.DEFAULT_BATCH_SIZE, sqlite_path: str = ''):
     global connection
     global cursor
+    global result_writer
+    global backend
+
+    if sqlite_path:
+        backend = Storage.SQLITE
+        connection, cursor = Storage.connect_sqlite(sqlite_path)
+        use_dialect_queries()
+    else:
+        backend = Storage.MARIADB
+        connection, cursor = Storage.connect_mariadb()
+    result_writer = ResultWriter(connection, cursor, database_lock, write_batch_size)
+
+
+def use_dialect_queries():
+    global os_obj_query
+    global image_obj_query
+    global specialfile_obj_query
+
+    os_obj_query = Storage.dialect_query(os_obj_query, backend)
+    image_obj_query = Storage.dialect_query(image_obj_query, backend)
+    specialfile_obj_query = Storage.dialect_query(specialfile_obj_query, backend)
+
+
+def setup_fingerprint_cache(path: str, max_entries: int):
+    global fingerprint_cache
+
+    if path:
+        fingerprint_cache = FingerprintCache(path, max_entries)
+
+
+def setup_known_binaries(version: str):
+    global known_binaries
+
+    known = KnownBinaries(version)
+    with database_lock:
+        known.load(cursor)
+    known_binaries = known
+
+
+def setup_cfg_cache(path: str, max_bytes: int):
+    global cfg_cache
 
-    db_config: {} = DatabaseConfig.read_db_config()
-    connection = MySQLConnection(**db_config)
-    cursor = connection.cursor(prepared=True)
+    if path:
+        cfg_cache = CfgCache(path, max_bytes)
 
 
 def cleanup_global_variables():
     global connection
     global cursor
+    global fingerprint_cache
+    global cfg_cache
+    global result_writer
+    global known_binaries
 
+    known_binaries = None
+    if result_writer is not None:
+        result_writer.flush()
+        result_writer = None
+    if fingerprint_cache is not None:
+        fingerprint_cache.close()
+        fingerprint_cache = None
+    if cfg_cache is not None:
+        cfg_cache.close()
+        cfg_cache = None
     cursor.close()
     connection.close()
@@ -1,4 +1,10 @@
+import logging
+import re
+import time
+from typing import List, NamedTuple, Tuple
+
 import global_variables
+from database.Storage import Storage
 
 OPERATING_SYSTEM_TABLE: str = 'CREATE TABLE IF NOT EXISTS OperatingSystem (OS_Name varchar(255), Version varchar(' \
                               '255), Binaries_total int, Binaries_unsafe int, Single_CFI int, Multi_CFI int, ' \
@@ -12,21 +18,104 @@ SPECIAL_FILE_TABLE: str = 'CREATE TABLE IF NOT EXISTS SpecialFile (Subimage varc
 BINARY_FILE_TABLE: str = 'CREATE TABLE IF NOT EXISTS BinaryFile (BinaryName varchar(255), Subimage varchar(255), ' \
                          'SpecialFileTag varchar(255), BinaryPath varchar(255), FileTimestamp varchar(255), ' \
                          'Checksum varchar(255), Error text, Unsafe_language bool, Modified bool, Single_CFI bool, Multi_CFI bool, ' \
-                         'ShadowCallStack bool, Id varchar(255), PRIMARY KEY (Id), UNIQUE (Id), FOREIGN KEY (' \
-                         'Subimage) REFERENCES Image(Id));'
+                         'ShadowCallStack bool, AnalysisProfile varchar(255), VerdictTier varchar(255), ' \
+                         'JumpTableStubs int, OsVersion varchar(255), Id varchar(255), PRIMARY KEY (Id), UNIQUE (Id), ' \
+                         'FOREIGN KEY (Subimage) REFERENCES Image(Id));'
+
+VERDICT_CACHE_TABLE: str = 'CREATE TABLE IF NOT EXISTS VerdictCache (Checksum varchar(255), ChecksumAlgorithm ' \
+                           'varchar(255), AnalyzerVersion varchar(255), Checks varchar(255), Modified bool, ' \
+                           'Multi_CFI bool, Single_CFI bool, ShadowCallStack bool, PRIMARY KEY (Checksum, ' \
+                           'ChecksumAlgorithm, AnalyzerVersion, Checks));'
+
+SCHEMA_VERSION_TABLE: str = 'CREATE TABLE IF NOT EXISTS SchemaVersion (Version int, Description varchar(255), ' \
+                            'AppliedAt varchar(255), PRIMARY KEY (Version));'
+SCHEMA_VERSION_INSERT: str = 'INSERT INTO SchemaVersion (Version, Description, AppliedAt) VALUES (?, ?, ?);'
+ADD_COLUMN_PATTERN = re.compile(r'ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+) ')
+
+
+class Migration(NamedTuple):
+    """
+    Step of the schema, the statements are idempotent so databases created before the schema was versioned are
+    upgraded by running all steps.
+    """
+    version: int
+    description: str
+    statements: Tuple[str, ...]
+
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, 'Create the tables', (OPERATING_SYSTEM_TABLE, IMAGE_TABLE, SPECIAL_FILE_TABLE, BINARY_FILE_TABLE,
+                                       VERDICT_CACHE_TABLE)),
+    Migration(2, 'Add analysis profile, verdict tier and CFI jump table stubs of binaries', (
+        'ALTER TABLE BinaryFile ADD COLUMN IF NOT EXISTS AnalysisProfile varchar(255);',
+        'ALTER TABLE BinaryFile ADD COLUMN IF NOT EXISTS VerdictTier varchar(255);',
+        'ALTER TABLE BinaryFile ADD COLUMN IF NOT EXISTS JumpTableStubs int;')),
+    Migration(3, 'Add operating system version of binaries and indexes for lookups and aggregates', (
+        'ALTER TABLE BinaryFile ADD COLUMN IF NOT EXISTS OsVersion varchar(255);',
+        'UPDATE BinaryFile SET OsVersion = (SELECT Version FROM Image WHERE Image.Id = BinaryFile.Subimage) '
+        'WHERE OsVersion IS NULL;',
+        'CREATE INDEX IF NOT EXISTS BinaryFileChecksum ON BinaryFile (Checksum);',
+        'CREATE INDEX IF NOT EXISTS BinaryFileFlags ON BinaryFile (OsVersion, Unsafe_language, Single_CFI, '
+        'Multi_CFI, ShadowCallStack);')),
+)
+
 
+def schema_version() -> int:
+    """
+    :return: Version of the schema of the database, 0 if it was never migrated
+    """
+    global_variables.connection.cursor().execute(SCHEMA_VERSION_TABLE)
+    global_variables.cursor.execute('SELECT MAX(Version) FROM SchemaVersion;')
+    version = global_variables.cursor.fetchone()[0]
+    return version or 0
 
-def creating_tables():
+
+def pending_migrations() -> List[Migration]:
+    """
+    :return: Migrations not applied to the database yet, in order
+    """
+    version = schema_version()
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def migrate() -> List[Migration]:
+    """
+    Upgrade the schema of the database in place, each migration is recorded once it was applied.
+
+    :return: Applied migrations
+    """
+    applied = []
     cursor = global_variables.connection.cursor()
-    cursor.execute(OPERATING_SYSTEM_TABLE)
-    cursor.execute(IMAGE_TABLE)
-    cursor.execute(SPECIAL_FILE_TABLE)
-    cursor.execute(BINARY_FILE_TABLE)
-    global_variables.connection.commit()
+    for migration in pending_migrations():
+        logging.info(f'Migrating database to version {migration.version}: {migration.description}')
+        for statement in migration.statements:
+            execute_statement(cursor, statement)
+        global_variables.cursor.execute(SCHEMA_VERSION_INSERT, (migration.version, migration.description,
+                                                                time.strftime('%Y-%m-%d %H:%M:%S')))
+        global_variables.connection.commit()
+        applied.append(migration)
+    return applied
+
+
+def execute_statement(cursor, statement: str):
+    """
+    Execute a statement of a migration, SQLite has no ADD COLUMN IF NOT EXISTS so existing columns are skipped.
+
+    :param cursor: cursor executing the statement
+    :param statement: statement written for MariaDB
+    """
+    match = ADD_COLUMN_PATTERN.match(statement)
+    if match is not None and global_variables.backend == Storage.SQLITE:
+        table, column = match.groups()
+        cursor.execute(f'PRAGMA table_info({table});')
+        if any(row[1] == column for row in cursor.fetchall()):
+            return
+        statement = statement.replace(' IF NOT EXISTS', '', 1)
+    cursor.execute(statement)
 
 
 def initialize_database():
     try:
-        creating_tables()
+        migrate()
     except Exception as err:
         print(f'DATABASE ERROR: Could not initialize database (tables) because of {err}')
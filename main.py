@@ -6,12 +6,21 @@
 
 import logging
 import argparse
+import signal
+import sys
 import global_variables
 from pathlib import Path
 
 from analysis.AndroidImageAnalysis import AndroidImageAnalysis
 from analysis.LinuxDistributionAnalysis import LinuxDistributionAnalysis
+from checker.AnalysisProfile import AnalysisProfile
+from checker.BinaryChecker import BinaryChecker
+from checker.StageBudget import StageBudget
+from database.CfgCache import CfgCache
+from database.FingerprintCache import FingerprintCache
+from database.ResultWriter import ResultWriter
 from initialize_database import initialize_database
+from results.BinaryObject import BinaryObject
 
 
 def setup_logging(image_path: str):
@@ -23,6 +32,14 @@ def setup_logging(image_path: str):
     root_logger.addHandler(file_handler)
 
 
+def exit_on_signal(signum, frame):
+    """
+    Leave through the finally block of main on SIGTERM and SIGHUP as on Ctrl+C, so buffered results are written.
+    """
+    logging.error(f'Analysis stopped by signal {signum}')
+    sys.exit(128 + signum)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='')
     parser.add_argument('image_path', help='Path to the image file to analyze')
@@ -39,20 +56,75 @@ if __name__ == "__main__":
                                                                                'static_exit error')
     parser.add_argument('-m', '--only-multi-module', action='store_true', help='Only run the multi-module CFI check')
     parser.add_argument('-s', '--skip-database-check', action='store_true', help='Always run analysis regardless of existence in database')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='Number of worker processes analyzing binaries in '
+                                                                     'parallel (0 analyzes in one worker process, or in '
+                                                                     'the main process if all budgets are disabled)')
+    parser.add_argument('-b', '--budgets', type=StageBudget.parse, default=StageBudget(),
+                        help='Time budgets in seconds per analysis stage, e.g. "load=300,cfg=900,multi_cfi=300,'
+                             'single_cfi=300,scs=300" (0 disables a budget)')
+    parser.add_argument('--retry-factor', type=float, default=4.0, help='Factor the budgets are multiplied with when '
+                                                                        'retrying binaries that ran out of time')
+    parser.add_argument('-p', '--pipeline', action='store_true', help='Stream binaries from discovery through triage '
+                                                                      'and analysis to the database')
+    parser.add_argument('--triage-threads', type=int, default=4, help='Number of threads triaging binaries in the '
+                                                                      'pipeline')
+    parser.add_argument('-f', '--force-recompute', action='store_true', help='Analyze binaries even if a binary with '
+                                                                             'the same checksum was analyzed before')
+    parser.add_argument('--fingerprint-cache', default='fingerprint_cache.sqlite',
+                        help='SQLite file caching formats, checksums and unsafe-language verdicts of files between '
+                             'runs (empty to disable)')
+    parser.add_argument('--fingerprint-cache-size', type=int, default=FingerprintCache.DEFAULT_MAX_ENTRIES,
+                        help='Maximum number of files in the fingerprint cache, least recently used are evicted')
+    parser.add_argument('--cfg-cache', default='',
+                        help='SQLite file caching summaries of the CFGs of analyzed binaries, so reruns do not generate '
+                             'them again (empty to disable)')
+    parser.add_argument('--cfg-cache-size', type=int, default=CfgCache.DEFAULT_MAX_BYTES >> 20,
+                        help='Maximum size of the CFG cache in MiB, least recently used summaries are evicted')
+    parser.add_argument('--sqlite', default='',
+                        help='Store the results in this SQLite file instead of the MariaDB server configured in '
+                             'database/config.ini, see merge_results.py')
+    parser.add_argument('--write-batch-size', type=int, default=ResultWriter.DEFAULT_BATCH_SIZE,
+                        help='Number of results written to the database with one commit (1 commits every result)')
+    parser.add_argument('--hash', default='md5', choices=BinaryObject.CHECKSUM_ALGORITHMS,
+                        help='Algorithm of the binary checksums, part of the binary ids in the database (default md5 '
+                             'to match existing databases)')
+    parser.add_argument('--scs-engine', default=BinaryChecker.CFG_SCS_ENGINE, choices=BinaryChecker.SCS_ENGINES,
+                        help='Engine of the ShadowCallStack check: on the CFG or by a linear sweep of the function '
+                             'starts, which skips CFG generation when multi-module CFI is found')
+    parser.add_argument('--single-cfi-engine', default=BinaryChecker.CFG_SINGLE_CFI_ENGINE,
+                        choices=BinaryChecker.SINGLE_CFI_ENGINES,
+                        help='Engine of the single-module CFI check: on the CFG or from the CFI trap sites found by a '
+                             'byte search')
+    parser.add_argument('--profile', default=AnalysisProfile.DEFAULT, choices=AnalysisProfile.PROFILES,
+                        help='Loader and CFGFast settings: minimal skips shared libraries, data references and code '
+                             'outside the main object, thorough resolves as much as possible (default keeps the '
+                             'settings of earlier results)')
     args: argparse.Namespace = parser.parse_args()
 
+    options = {'workers': args.workers, 'budget': args.budgets, 'retry_factor': args.retry_factor,
+               'pipeline': args.pipeline, 'triage_threads': args.triage_threads,
+               'force_recompute': args.force_recompute, 'scs_engine': args.scs_engine,
+               'single_cfi_engine': args.single_cfi_engine, 'analysis_profile': args.profile}
+
     try:
-        global_variables.setup_global_variables()
+        signal.signal(signal.SIGTERM, exit_on_signal)
+        signal.signal(signal.SIGHUP, exit_on_signal)
+        global_variables.setup_global_variables(args.write_batch_size, args.sqlite)
         setup_logging(args.image_path)
+        global_variables.checksum_algorithm = args.hash
+        global_variables.setup_fingerprint_cache(args.fingerprint_cache, args.fingerprint_cache_size)
+        global_variables.setup_cfg_cache(args.cfg_cache, args.cfg_cache_size << 20)
         initialize_database()
         analysis = None
 
         if args.android:
             analysis = AndroidImageAnalysis(args.distribution, Path(args.image_path),
-                                            args.ignore_unsafe, args.error_static_exit, args.only_multi_module, args.skip_database_check)
+                                            args.ignore_unsafe, args.error_static_exit, args.only_multi_module, args.skip_database_check,
+                                            **options)
         if args.linux:
             analysis = LinuxDistributionAnalysis(args.distribution, Path(args.image_path),
-                                                 args.ignore_unsafe, args.error_static_exit, args.only_multi_module, args.skip_database_check)
+                                                 args.ignore_unsafe, args.error_static_exit, args.only_multi_module, args.skip_database_check,
+                                                 **options)
         analysis.run()
     except OSError as e:
         logging.error(f'Analysis stop because of {e}')
@@ -0,0 +1,34 @@
+#!/usr/bin/python3
+"""
+Merge SQLite result files, e.g. of analyses run on several machines with --sqlite, into the MariaDB result database
+configured in database/config.ini (or into another SQLite file with --sqlite).
+The totals of the merged operating systems are recounted afterwards.
+"""
+
+import argparse
+import logging
+
+import global_variables
+from database.ResultMerger import ResultMerger
+from initialize_database import initialize_database
+from results.OperatingSystemObject import OperatingSystemObject
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Merge SQLite result files into the result database')
+    parser.add_argument('files', nargs='+', help='SQLite result files to merge')
+    parser.add_argument('--sqlite', default='', help='Merge into this SQLite file instead of the MariaDB server')
+    args: argparse.Namespace = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    global_variables.setup_global_variables(sqlite_path=args.sqlite)
+    try:
+        initialize_database()
+        merger = ResultMerger()
+        for file in args.files:
+            counts = merger.merge(file)
+            print(f'{file}: ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+        for name, version in sorted(merger.versions):
+            OperatingSystemObject(name, version).update_values()
+    finally:
+        global_variables.cleanup_global_variables()
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+"""
+Upgrade the schema of an existing result database in place, or show which migrations are pending.
+The analysis applies pending migrations on start as well, this command allows running the slow ones (e.g. indexes
+on large tables) ahead of an analysis.
+"""
+
+import argparse
+import logging
+
+import global_variables
+from initialize_database import migrate, pending_migrations, schema_version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Upgrade the schema of the result database')
+    parser.add_argument('--sqlite', default='', help='Migrate this SQLite result file instead of the MariaDB server')
+    parser.add_argument('--status', action='store_true', help='Only show the schema version and pending migrations')
+    args: argparse.Namespace = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    global_variables.setup_global_variables(sqlite_path=args.sqlite)
+    try:
+        print(f'Schema version: {schema_version()}')
+        if args.status:
+            for migration in pending_migrations():
+                print(f'Pending migration {migration.version}: {migration.description}')
+        else:
+            applied = migrate()
+            print(f'Applied {len(applied)} migrations, schema version: {schema_version()}')
+    finally:
+        global_variables.cleanup_global_variables()
@@ -1,35 +1,102 @@
 import hashlib
-import subprocess
+import mmap
 import os
 import time
 from pathlib import Path
+from typing import Union
 import global_variables
 import logging
 
+from checker.AnalysisProfile import AnalysisProfile
+from checker.ElfSectionReader import ElfSectionReader
+from database.FingerprintCache import FingerprintCache
+
 
 class BinaryObject:
 
+    # Algorithms for the checksum, md5 is the default to stay comparable with existing databases
+    CHECKSUM_ALGORITHMS = ('md5', 'blake2b', 'xxh3')
+    # Bytes hashed at once, so large libraries are never copied into memory as a whole
+    CHECKSUM_CHUNK_SIZE: int = 1 << 20
+    ELF_ERROR: str = 'ERROR: Could not parse ELF headers'
+
     def __init__(self, path: Path, image: str, specialfile: str):
         self.name: str = path.name
         self.image: str = image
+        # The subimage Id starts with the version of the operating system
+        self.os_version: str = image.split('/', 1)[0]
         self.specialfile: str = specialfile
         self.path: Path = path
-        self.timestamp: str = self.__get_timestamp()
-        self.checksum: str = self.__calculate_checksum()
-        self.unsafe_language: bool = self.__check_compiler()
+        file_stat = os.stat(path)
+        self.timestamp: str = self.__get_timestamp(file_stat)
+        # The headers are parsed and the checksum is calculated from the same mapping of the file
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if file_stat.st_size > 0 else b''
+            try:
+                self.elf: Union[ElfSectionReader, None] = self.__read_elf(data)
+                sample = FingerprintCache.sample(data) if global_variables.fingerprint_cache is not None else ''
+                self.checksum: str = self.__cached_checksum(file_stat, sample, data)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+        self.unsafe_language: bool = self.__cached_compiler_check(file_stat, sample)
         self.modified: bool = False
         self.error: str = ''
         self.multi_cfi: bool = False
         self.single_cfi: bool = False
         self.scs: bool = False
+        self.timed_out_stage: str = ''
+        # Profile of the loader and CFGFast settings the results were produced with
+        self.analysis_profile: str = AnalysisProfile.DEFAULT
+        # Most expensive input of the detectors the results were produced with, see DetectorCascade.TIERS
+        self.verdict_tier: Union[str, None] = None
+        # Number of stubs of CFI jump tables found by the JumpTableScanner, None if not scanned
+        self.jump_table_stubs: Union[int, None] = None
         self.id: str = self.image + '/' + self.specialfile + '/' + self.checksum + '/' + self.name
         if len(self.id) > 255:
             self.id = self.id[-255:]
         self.logging = logging.getLogger(__name__)
 
+    def __read_elf(self, data: Union[mmap.mmap, bytes]) -> Union[ElfSectionReader, None]:
+        """
+        Parse the section headers once, they are used by the compiler check and the later analysis stages.
+
+        :param data: contents of the binary
+        :return: Parsed ELF file or None if the file could not be parsed
+        """
+        try:
+            return ElfSectionReader(self.path, data)
+        except (ValueError, OSError) as e:
+            logging.getLogger(__name__).warning(f'Could not parse ELF headers of {self.path}: {e}')
+            return None
+
+    def parsed_elf(self) -> Union[ElfSectionReader, None]:
+        """
+        ELF headers for the checks reading the file directly. If they could not be parsed, an error is recorded
+        (once) and the checks leave the results unchanged.
+
+        :return: Parsed ELF file or None if the file could not be parsed
+        """
+        if self.elf is None and BinaryObject.ELF_ERROR not in self.error:
+            self.error = self.error + BinaryObject.ELF_ERROR
+        return self.elf
+
+    def reset_results(self):
+        """
+        Reset the analysis results, e.g. before a binary that ran out of time is analyzed again.
+        """
+        self.modified = False
+        self.error = ''
+        self.multi_cfi = False
+        self.single_cfi = False
+        self.scs = False
+        self.timed_out_stage = ''
+        self.verdict_tier = None
+        self.jump_table_stubs = None
+
     def add_to_database(self):
         """
-        Add the binary object to the database if not already exists.
+        Add the binary object to the database if not already exists, with the next batch of the result writer.
         """
         self.logging.info(f'Add {self.name} with checksum {self.checksum} and subimage {self.image} to database.')
         if type(self.error) is tuple:
@@ -37,10 +104,11 @@ class BinaryObject:
         else:
             error_str = self.error
         params = self.name, self.image, self.specialfile, str(self.path), self.timestamp, self.checksum, \
-                 self.unsafe_language, self.modified, error_str, self.multi_cfi, self.single_cfi, self.scs, self.id
+                 self.unsafe_language, self.modified, error_str, self.multi_cfi, self.single_cfi, self.scs, \
+                 self.analysis_profile, self.verdict_tier, self.jump_table_stubs, self.os_version, self.id
 
-        global_variables.cursor.execute(global_variables.binary_obj_query, params)
-        global_variables.connection.commit()
+        global_variables.result_writer.add(global_variables.binary_obj_query, params, ('BinaryFile', self.id))
+        self.__add_to_known_binaries()
 
     def update_database(self, ignore_unsafe=False, error_static_exit=False):
         """
@@ -52,47 +120,113 @@ class BinaryObject:
             error_str = str(self.error)
         else:
             error_str = self.error
-        params = self.modified, error_str, self.multi_cfi, self.single_cfi, self.scs, self.id
+        params = self.modified, error_str, self.multi_cfi, self.single_cfi, self.scs, self.analysis_profile, \
+            self.verdict_tier, self.jump_table_stubs, self.id
         if ignore_unsafe:
             self.logging.info(f'Update results of {self.name} as check_unsafe option used.')
-            global_variables.cursor.execute(global_variables.binary_update_query, params)
-            global_variables.connection.commit()
+            global_variables.result_writer.add(global_variables.binary_update_query, params, ('BinaryFile', self.id))
+            self.__add_to_known_binaries()
         elif error_static_exit:
             self.logging.info(f'Update results of {self.name} as error_static_exit option used.')
-            global_variables.cursor.execute(global_variables.binary_update_query, params)
-            global_variables.connection.commit()
+            global_variables.result_writer.add(global_variables.binary_update_query, params, ('BinaryFile', self.id))
+            self.__add_to_known_binaries()
 
-    def __calculate_checksum(self) -> str:
+    def __add_to_known_binaries(self):
+        """
+        Keep the known binaries in line with the database, so later lookups of this binary need no query.
         """
+        if global_variables.known_binaries is not None:
+            global_variables.known_binaries.add(self.id, self.single_cfi)
 
+    def __cached_checksum(self, file_stat: os.stat_result, sample: str, data: Union[mmap.mmap, bytes]) -> str:
+        """
+        Look up the checksum in the fingerprint cache before hashing the file.
+        Checksums are cached together with their algorithm, so changing it does not reuse checksums of another one.
+
+        :param file_stat: stat result of the binary
+        :param sample: hash of the first and last bytes of the binary, see FingerprintCache.sample()
+        :param data: contents of the binary
+        :return: String representation of binary's checksum
+        """
+        cache = global_variables.fingerprint_cache
+        if cache is None:
+            return self.__calculate_checksum(data)
+        algorithm = global_variables.checksum_algorithm
+        cached = cache.get(file_stat, sample, 'Checksum')
+        if cached is not None and cached.startswith(algorithm + ':'):
+            return cached[len(algorithm) + 1:]
+        checksum = self.__calculate_checksum(data)
+        cache.put(file_stat, sample, 'Checksum', f'{algorithm}:{checksum}')
+        return checksum
+
+    def __cached_compiler_check(self, file_stat: os.stat_result, sample: str) -> bool:
+        """
+        Look up the unsafe-language verdict in the fingerprint cache, by file and by checksum, before running
+        readelf and grep.
+
+        :param file_stat: stat result of the binary
+        :param sample: hash of the first and last bytes of the binary, see FingerprintCache.sample()
+        :return: Whether the binary was compiled from a memory-unsafe language
+        """
+        cache = global_variables.fingerprint_cache
+        if cache is None:
+            return self.__check_compiler()
+        unsafe_language = cache.get(file_stat, sample, 'UnsafeLanguage')
+        if unsafe_language is None:
+            unsafe_language = cache.get_unsafe_language(f'{global_variables.checksum_algorithm}:{self.checksum}')
+            if unsafe_language is None:
+                unsafe_language = self.__check_compiler()
+            cache.put(file_stat, sample, 'UnsafeLanguage', unsafe_language)
+        return bool(unsafe_language)
+
+    def __calculate_checksum(self, data: Union[mmap.mmap, bytes]) -> str:
+        """
+
+        :param data: contents of the binary
         :return: String representation of binary's checksum
         """
-        with open(self.path, 'rb') as file_to_check:
-            data = file_to_check.read()
-            return hashlib.md5(data).hexdigest()
+        checksum = BinaryObject.__new_hash(global_variables.checksum_algorithm)
+        view = memoryview(data)
+        try:
+            for start in range(0, len(view), BinaryObject.CHECKSUM_CHUNK_SIZE):
+                checksum.update(view[start:start + BinaryObject.CHECKSUM_CHUNK_SIZE])
+        finally:
+            view.release()
+        return checksum.hexdigest()
+
+    @staticmethod
+    def __new_hash(algorithm: str):
+        """
+        :param algorithm: one of CHECKSUM_ALGORITHMS
+        :return: Hash object of the algorithm, all producing 128-bit digests like md5
+        """
+        if algorithm == 'md5':
+            return hashlib.md5()
+        if algorithm == 'blake2b':
+            return hashlib.blake2b(digest_size=16)
+        if algorithm == 'xxh3':
+            import xxhash
+            return xxhash.xxh3_128()
+        raise ValueError(f'Unknown checksum algorithm {algorithm}')
 
     def __check_compiler(self) -> bool:
         """
         Check if the memory was compiled with gcc or clang -> memory-unsafe language.
+        Binaries built by the Go or Rust toolchain are not counted, although they are linked by gcc or clang.
 
         :return: Whether the binary was compiled from a memory-unsafe language
         """
-        file_path = str(self.path).replace(' ', '\\ ')
-        result_comment = subprocess.run(
-            args=[f"readelf -p .comment {file_path} | grep -E -i 'gcc|clang' | wc -l"],
-            shell=True,
-            check=True, stdout=subprocess.PIPE)
-        result_gcc = subprocess.run(
-            args=[f"grep -a -o '.note.gnu.build-id' {file_path} | wc -l"],
-            shell=True, stdout=subprocess.PIPE)
-        return (int(result_comment.stdout) > 0) or (int(result_gcc.stdout) > 0)
+        if self.elf is None:
+            return False
+        return self.elf.is_unsafe_language()
 
-    def __get_timestamp(self) -> str:
+    def __get_timestamp(self, file_stat: os.stat_result) -> str:
         """
 
+        :param file_stat: stat result of the binary
         :return: String representation of binary's timestamp in format: YYYY-MM-DD hh:mm:ss
         """
-        timestamp = time.ctime(os.path.getmtime(self.path))
+        timestamp = time.ctime(file_stat.st_mtime)
         return time.strftime("%Y-%m-%d %H:%M:%S", time.strptime(timestamp))
 
     def to_string(self):
@@ -105,4 +239,7 @@ class BinaryObject:
                f'Checksum: {self.checksum}\n ' \
                f'Multi_CFI: {self.multi_cfi}\n ' \
                f'Single_CFI: {self.single_cfi}\n ' \
-               f'ShadowCallStack: {self.scs} '
+               f'ShadowCallStack: {self.scs}\n ' \
+               f'Analysis profile: {self.analysis_profile}\n ' \
+               f'Verdict tier: {self.verdict_tier}\n ' \
+               f'CFI jump table stubs: {self.jump_table_stubs} '
@@ -10,8 +10,7 @@ class ImageObject:
 
     def add_to_database(self):
         """
-        Add ImageObject to database if it does not exist yet.
+        Add ImageObject to database if it does not exist yet, with the next batch of the result writer.
         """
         params = self.version, self.name, self.type, self.id
-        global_variables.cursor.execute(global_variables.image_obj_query, params)
-        global_variables.connection.commit()
+        global_variables.result_writer.add(global_variables.image_obj_query, params)
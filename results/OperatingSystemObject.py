@@ -1,3 +1,5 @@
+from typing import Tuple
+
 import global_variables
 
 
@@ -23,15 +25,11 @@ class OperatingSystemObject:
 
     def update_values(self):
         """
-        Update the results after running analysis on all binaries.
+        Update the results after running analysis on all binaries, counted by one aggregate query.
 
         :param connection: Connection to the database containing results
         """
-        self.binaries_total = self.__count_files(0)
-        self.binaries_unsafe = self.__count_files(1)
-        self.single_cfi = self.__count_files(2)
-        self.multi_cfi = self.__count_files(3)
-        self.scs = self.__count_files(4)
+        self.binaries_total, self.binaries_unsafe, self.single_cfi, self.multi_cfi, self.scs = self.__count_files()
         self.__update_database()
 
     def __update_database(self):
@@ -44,25 +42,15 @@ class OperatingSystemObject:
         global_variables.cursor.execute(global_variables.os_update_query, params)
         global_variables.connection.commit()
 
-    def __count_files(self, option: int) -> int:
+    def __count_files(self) -> Tuple[int, int, int, int, int]:
         """
         Count how may files were analyzed, how many are relevant, have CFI or SCS.
 
-        :param option: Option of what should be counted
+        :return: Number of binaries, memory-unsafe binaries and memory-unsafe binaries with single-module CFI,
+                 multi-module CFI and ShadowCallStack
         """
-        params = self.version + '%',
-        if option == 0:
-            count_query = 'SELECT * FROM BinaryFile WHERE Subimage LIKE ?'
-        elif option == 1:
-            count_query = 'SELECT * FROM BinaryFile WHERE Unsafe_language = 1 AND Subimage LIKE ?'
-        elif option == 2:
-            count_query = 'SELECT * FROM BinaryFile WHERE Unsafe_language = 1 AND  Single_CFI = 1 AND Subimage LIKE ?'
-        elif option == 3:
-            count_query = 'SELECT * FROM BinaryFile WHERE Unsafe_language = 1 AND  Multi_CFI = 1 AND Subimage LIKE ?'
-        elif option == 4:
-            count_query = 'SELECT * FROM BinaryFile WHERE Unsafe_language = 1 AND  ShadowCallStack = 1 AND Subimage ' \
-                          'LIKE ? '
-        else:
-            return 0
-        global_variables.cursor.execute(count_query, params)
-        return len(global_variables.cursor.fetchall())
+        params = self.version,
+        with global_variables.database_lock:
+            global_variables.cursor.execute(global_variables.os_count_query, params)
+            row = global_variables.cursor.fetchone()
+        return tuple(int(count or 0) for count in row)
@@ -13,12 +13,11 @@ class SpecialFileObject:
 
     def add_to_database(self):
         """
-        Add the binary object to the database if not already exists.
+        Add the special file object to the database if not already exists, with the next batch of the result writer.
 
         :param connection: connection to database containing results
         :return:
         """
         params = self.image, self.name, self.type, str(self.path), self.id
-        global_variables.cursor.execute(global_variables.specialfile_obj_query, params)
-        global_variables.connection.commit()
+        global_variables.result_writer.add(global_variables.specialfile_obj_query, params)
 
@@ -0,0 +1,214 @@
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+
+from analysis.AnalysisPipeline import AnalysisPipeline
+from checker.StageBudget import StageBudget
+
+
+class _Result:
+    """
+    Stands in for the BinaryObject of a binary.
+    """
+
+    def __init__(self, binary: Path, checksum: str):
+        self.id: str = binary.name
+        self.checksum: str = checksum
+        self.error: str = ''
+        self.timed_out_stage: str = ''
+
+
+class _Checker:
+    """
+    Stands in for a BinaryChecker, the analysis takes a while so the triage runs ahead of it.
+    """
+
+    def __init__(self, analysis, binary: Path, checksum: str):
+        self.analysis = analysis
+        self.binary: Path = binary
+        self.binary_obj: _Result = _Result(binary, checksum)
+        self.analyze: bool = self.binary_obj.id not in analysis.stored
+        self.reused: bool = self.analyze and checksum in analysis.verdicts
+        self.retried: bool = False
+
+    def load(self):
+        pass
+
+    def run_all_checks(self) -> _Result:
+        self.analysis.events.append(('analyze', self.binary.name))
+        time.sleep(0.02)
+        if self.binary.name in self.analysis.slow and not self.retried:
+            self.binary_obj.timed_out_stage = StageBudget.CFG
+        return self.binary_obj
+
+    def prepare_retry(self, budget: StageBudget):
+        self.retried = True
+        self.binary_obj.timed_out_stage = ''
+
+
+class _Analysis:
+    """
+    Stands in for an ImageAnalysis and records what the pipeline asks it to do.
+    """
+
+    def __init__(self, checksums: dict = None, slow: Tuple[str, ...] = ()):
+        self.workers: int = 0
+        self.budget: StageBudget = StageBudget()
+        self.retry_factor: float = 2
+        self.checksums: dict = checksums or {}
+        self.slow: Tuple[str, ...] = slow
+        self.events: List[tuple] = []
+        self.stored: set = set()
+        self.verdicts: set = set()
+
+    def create_checker(self, binary: Path, image_id: str, special_file: str) -> _Checker:
+        return _Checker(self, binary, self.checksums.get(binary.name, binary.name))
+
+    def check_options(self, checker: _Checker) -> dict:
+        return {}
+
+    def store_results(self, checker: _Checker, binary_obj: _Result):
+        if binary_obj.id in self.stored:
+            raise ValueError(f'Duplicate entry {binary_obj.id}')
+        self.stored.add(binary_obj.id)
+        self.verdicts.add(binary_obj.checksum)
+        self.events.append(('reuse' if checker.reused else 'store', checker.binary.name))
+
+    def store_retry_results(self, checker: _Checker, binary_obj: _Result):
+        self.events.append(('retry', checker.binary.name))
+
+    def fix_lib32(self, lib_binaries: List[Tuple[Path, str]], image_id: str):
+        self.events.append(('lib32', image_id, sorted(binary_id for _, binary_id in lib_binaries)))
+
+
+class _Mount:
+    """
+    Stands in for a mounter or extractor.
+    """
+
+    def __init__(self, name: str, events: List[tuple]):
+        self.name: str = name
+        self.events: List[tuple] = events
+
+    def __enter__(self) -> Path:
+        return Path(self.name)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.events.append(('release', self.name))
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+
+    def run_pipeline(self, analysis: _Analysis, discover):
+        """
+        Run the pipeline in a thread, so a hanging pipeline fails the test instead of blocking it.
+
+        :param discover: called with the pipeline like ImageAnalysis.discover
+        :return: Exception raised by the pipeline, if any
+        """
+        raised = []
+
+        def run():
+            try:
+                with AnalysisPipeline(analysis, triage_threads=3, queue_size=4) as pipeline:
+                    discover(pipeline)
+            except Exception as e:
+                raised.append(e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=30)
+        self.assertFalse(thread.is_alive(), 'The pipeline did not finish')
+        return raised[0] if raised else None
+
+    def assertBefore(self, events: List[tuple], first: tuple, second: tuple):
+        self.assertLess(events.index(first), events.index(second), events)
+
+    def test_releases_scope_after_its_binaries_and_inner_scopes(self):
+        analysis = _Analysis()
+
+        def discover(pipeline):
+            pipeline.open_scope(_Mount('image', analysis.events))
+            pipeline.submit([Path('image/a'), Path('image/b')], 'image', ' ')
+            pipeline.open_scope(_Mount('package', analysis.events))
+            pipeline.submit([Path('package/c')], 'image', 'package')
+            pipeline.close_scope()
+            pipeline.close_scope()
+
+        self.assertIsNone(self.run_pipeline(analysis, discover))
+        events = analysis.events
+        self.assertEqual(analysis.stored, {'a', 'b', 'c'})
+        self.assertBefore(events, ('store', 'c'), ('release', 'package'))
+        self.assertBefore(events, ('release', 'package'), ('release', 'image'))
+        for binary in ('a', 'b'):
+            self.assertBefore(events, ('store', binary), ('release', 'image'))
+        self.assertEqual(events.count(('release', 'image')), 1)
+        self.assertEqual(events.count(('release', 'package')), 1)
+
+    def test_retries_timed_out_binaries_after_batch(self):
+        analysis = _Analysis(slow=('slow',))
+
+        def discover(pipeline):
+            pipeline.submit([Path('slow'), Path('a'), Path('b'), Path('c')], 'image', ' ')
+
+        self.assertIsNone(self.run_pipeline(analysis, discover))
+        events = analysis.events
+        self.assertEqual(events.count(('analyze', 'slow')), 2)
+        for binary in ('a', 'b', 'c'):
+            self.assertBefore(events, ('store', binary), ('retry', 'slow'))
+        self.assertEqual(events[-1], ('lib32', 'image', []))
+
+    def test_fixes_lib32_after_batch(self):
+        analysis = _Analysis()
+
+        def discover(pipeline):
+            pipeline.submit([Path('/root/usr/lib/liba.so'), Path('/root/usr/lib64/libd.so'),
+                             Path('/root/usr/lib/libb.so')], 'first', ' ')
+            pipeline.submit([Path('/root/usr/lib/libc.so')], 'second', ' ')
+
+        self.assertIsNone(self.run_pipeline(analysis, discover))
+        events = analysis.events
+        lib32 = [event for event in events if event[0] == 'lib32']
+        self.assertCountEqual(lib32, [('lib32', 'first', ['liba.so', 'libb.so']), ('lib32', 'second', ['libc.so'])])
+        for binary in ('liba.so', 'libb.so'):
+            self.assertBefore(events, ('store', binary), ('lib32', 'first', ['liba.so', 'libb.so']))
+
+    def test_holds_back_binaries_with_checksum_in_pipeline(self):
+        # The same file twice in a subimage (same Id) and a copy under another name
+        analysis = _Analysis(checksums={'ls': 'abc', 'dir': 'abc'})
+
+        def discover(pipeline):
+            pipeline.submit([Path('bin/ls'), Path('usr/bin/ls'), Path('bin/dir'), Path('bin/cat')], 'image', ' ')
+
+        self.assertIsNone(self.run_pipeline(analysis, discover))
+        events = analysis.events
+        self.assertEqual(events.count(('analyze', 'ls')), 1)
+        self.assertNotIn(('analyze', 'dir'), events)
+        self.assertIn(('reuse', 'dir'), events)
+        self.assertEqual(analysis.stored, {'ls', 'dir', 'cat'})
+
+    def test_exception_during_submit(self):
+        analysis = _Analysis()
+
+        def binaries():
+            yield Path('image/a')
+            raise OSError('Could not read directory')
+
+        def discover(pipeline):
+            pipeline.open_scope(_Mount('image', analysis.events))
+            try:
+                pipeline.submit(binaries(), 'image', ' ')
+            finally:
+                pipeline.close_scope()
+
+        raised = self.run_pipeline(analysis, discover)
+        self.assertIsInstance(raised, OSError)
+        # The batch is finalized and the scope released, although the binary may have been skipped
+        self.assertIn(('lib32', 'image', []), analysis.events)
+        self.assertIn(('release', 'image'), analysis.events)
+
+
+if __name__ == '__main__':
+    unittest.main()
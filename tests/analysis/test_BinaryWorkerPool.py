@@ -0,0 +1,71 @@
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from analysis.BinaryWorkerPool import BinaryWorkerPool
+from analysis.ImageAnalysis import ImageAnalysis
+from checker.StageBudget import StageBudget
+
+
+class _Result:
+    def __init__(self):
+        self.error: str = ''
+        self.timed_out_stage: str = ''
+
+
+class _StuckChecker:
+    """
+    Stands in for a BinaryChecker whose CFG stage catches every exception, including the one of its budget.
+    """
+
+    def __init__(self, seconds: float):
+        self.binary: Path = Path('stuck')
+        self.binary_obj: _Result = _Result()
+        self.budget: StageBudget = StageBudget({StageBudget.CFG: seconds})
+
+    def load(self):
+        pass
+
+    def run_all_checks(self) -> _Result:
+        with self.budget.stage(StageBudget.CFG):
+            while True:
+                try:
+                    time.sleep(0.01)
+                except BaseException:
+                    pass
+
+
+class _QuickChecker(_StuckChecker):
+
+    def run_all_checks(self) -> _Result:
+        with self.budget.stage(StageBudget.CFG):
+            return self.binary_obj
+
+
+class TestBinaryWorkerPool(unittest.TestCase):
+
+    @mock.patch.object(BinaryWorkerPool, 'GRACE_PERIOD', 0.2)
+    def test_kills_worker_stuck_in_stage(self):
+        stuck = _StuckChecker(0.2)
+        quick = _QuickChecker(5)
+        start = time.monotonic()
+        with BinaryWorkerPool(1) as pool:
+            results = {type(checker): binary_obj
+                       for checker, binary_obj in pool.map([(stuck, {}), (quick, {})])}
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(results[_StuckChecker].timed_out_stage, StageBudget.CFG)
+        self.assertIn('TIMEOUT', results[_StuckChecker].error)
+        # The replaced worker analyzes the next binary
+        self.assertEqual(results[_QuickChecker].error, '')
+
+    def test_budgets_run_in_worker_process(self):
+        analysis = ImageAnalysis('Test', Path('version'), False, False, False, False)
+        self.assertEqual(analysis.workers, 1)
+        unlimited = StageBudget({stage: 0 for stage in StageBudget.STAGES})
+        analysis = ImageAnalysis('Test', Path('version'), False, False, False, False, budget=unlimited)
+        self.assertEqual(analysis.workers, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import re
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+
+from checker.ElfSectionReader import ElfSectionReader
+
+TEXT_ADDRESS = 0x1000
+TEXT_SIZE = 0x40
+INIT_ARRAY_ADDRESS = 0x3000
+
+
+def string_table(names: List[str]) -> Tuple[bytes, List[int]]:
+    table = b'\0'
+    offsets = []
+    for name in names:
+        offsets.append(len(table))
+        table += name.encode() + b'\0'
+    return table, offsets
+
+
+def symbol_table(strings: List[int], symbols: List[Tuple[int, int, int, int]]) -> bytes:
+    """
+    :param strings: name offsets of the symbols
+    :param symbols: info, section index, value and size of each symbol
+    """
+    table = bytes(24)
+    for name, (info, section_index, value, size) in zip(strings, symbols):
+        table += struct.pack('<IBBHQQ', name, info, 0, section_index, value, size)
+    return table
+
+
+def build_elf(comment: bytes = b'GCC: (Debian 12.2.0-14) 12.2.0\0', build_id: bool = False,
+              strings: Tuple[str, ...] = ()) -> bytes:
+    """
+    Build a little-endian x86-64 ELF file with code, symbol tables, a .comment and an .init_array section.
+
+    :param build_id: add a GNU build id note
+    :param strings: names added to the dynamic string table
+    """
+    text_index = 1
+    dynstr, dynstr_offsets = string_table(['memcpy', 'exported', *strings])
+    dynsym = symbol_table(dynstr_offsets, [(0x12, 0, 0, 0), (0x12, text_index, TEXT_ADDRESS + 0x10, 0x10)])
+    strtab, strtab_offsets = string_table(['local_function', 'data_object'])
+    symtab = symbol_table(strtab_offsets, [(0x02, text_index, TEXT_ADDRESS, 0x10), (0x01, 5, 0x2000, 8)])
+    init_array = struct.pack('<Q', TEXT_ADDRESS + 0x20)
+    # Name, type, flags, address, link, contents
+    sections = [('.text', 1, 0x6, TEXT_ADDRESS, 0, b'\x90' * TEXT_SIZE),
+                ('.comment', 1, 0x30, 0, 0, comment),
+                ('.dynstr', 3, 0x2, 0, 0, dynstr),
+                ('.dynsym', ElfSectionReader.SHT_DYNSYM, 0x2, 0, 3, dynsym),
+                ('.data', 1, 0x3, 0x2000, 0, bytes(8)),
+                ('.strtab', 3, 0, 0, 0, strtab),
+                ('.symtab', ElfSectionReader.SHT_SYMTAB, 0, 0, 6, symtab),
+                ('.init_array', 14, 0x3, INIT_ARRAY_ADDRESS, 0, init_array)]
+    if build_id:
+        sections.append((ElfSectionReader.BUILD_ID_SECTION, 7, 0x2, 0, 0, struct.pack('<III', 4, 20, 3) + b'GNU\0' +
+                         bytes(20)))
+    shstrtab, name_offsets = string_table([name for name, *_ in sections] + ['.shstrtab'])
+    sections.append(('.shstrtab', 3, 0, 0, 0, shstrtab))
+
+    contents = b''
+    headers = bytes(64)
+    offset = 64
+    for (name, section_type, flags, address, link, data), name_offset in zip(sections, name_offsets):
+        entry_size = 24 if section_type in (ElfSectionReader.SHT_DYNSYM, ElfSectionReader.SHT_SYMTAB) else 0
+        headers += struct.pack('<IIQQQQIIQQ', name_offset, section_type, flags, address, offset + len(contents),
+                               len(data), link, 0, 8, entry_size)
+        contents += data
+    section_offset = offset + len(contents)
+    elf_header = ElfSectionReader.ELF_MAGIC + bytes([2, 1, 1]) + bytes(9) + \
+        struct.pack('<HHIQQQIHHHHHH', 3, ElfSectionReader.EM_X86_64, 1, TEXT_ADDRESS, 0, section_offset, 0, 64, 0,
+                    0, 64, len(sections) + 1, len(sections))
+    return elf_header + contents + headers
+
+
+class TestElfSectionReader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / 'binary'
+        self.path.write_bytes(build_elf())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_headers(self):
+        reader = ElfSectionReader(self.path)
+        self.assertTrue(reader.is_64bit)
+        self.assertTrue(reader.little_endian)
+        self.assertEqual(reader.machine, ElfSectionReader.EM_X86_64)
+        self.assertTrue(reader.has_section('.dynsym'))
+        self.assertFalse(reader.has_section('.plt'))
+        self.assertEqual([section.name for section in reader.executable_sections()], ['.text'])
+        self.assertEqual(reader.section_data('.text'), b'\x90' * TEXT_SIZE)
+        self.assertEqual(reader.section_data('.plt'), b'')
+
+    def test_same_result_for_mapped_data(self):
+        data = self.path.read_bytes()
+        reader = ElfSectionReader(self.path, data)
+        self.assertEqual(reader.sections, ElfSectionReader(self.path).sections)
+        self.assertEqual(reader.find_symbols(data, ['exported']), {'exported': True})
+
+    def test_find_symbols(self):
+        reader = ElfSectionReader(self.path)
+        with reader.mapped() as data:
+            found = reader.find_symbols(data, ['memcpy', 'exported', 'local_function', 'missing', 'copy'])
+        # Only referenced symbols are not defined, suffixes of other names are not symbols
+        self.assertEqual(found, {'memcpy': False, 'exported': True, 'local_function': True})
+
+    def test_function_starts(self):
+        reader = ElfSectionReader(self.path)
+        with reader.mapped() as data:
+            functions = reader.function_starts(data)
+        # Symbols of functions and .init_array entries in code, but not data objects or undefined functions
+        self.assertEqual(functions, {TEXT_ADDRESS: 0x10, TEXT_ADDRESS + 0x10: 0x10, TEXT_ADDRESS + 0x20: 0})
+        self.assertEqual(reader.code_offset(TEXT_ADDRESS + 0x10), reader.sections['.text'].offset + 0x10)
+        self.assertIsNone(reader.code_offset(0x2000))
+        self.assertEqual(reader.code_end(TEXT_ADDRESS + 4), TEXT_ADDRESS + TEXT_SIZE)
+
+    def test_search(self):
+        reader = ElfSectionReader(self.path)
+        with reader.mapped() as data:
+            self.assertTrue(reader.search(data, re.compile(rb'\x90{4}'), ['.plt', '.text']))
+            self.assertFalse(reader.search(data, re.compile(rb'GCC'), ['.text']))
+
+    def test_comment(self):
+        reader = ElfSectionReader(self.path)
+        self.assertTrue(reader.is_compiled_by_gcc_or_clang())
+        self.assertFalse(reader.has_build_id())
+        self.assertTrue(reader.is_unsafe_language())
+
+    def test_rust_comment(self):
+        self.path.write_bytes(build_elf(b'rustc version 1.70.0\0', build_id=True))
+        reader = ElfSectionReader(self.path)
+        self.assertFalse(reader.is_compiled_by_gcc_or_clang())
+        self.assertTrue(reader.has_build_id())
+        self.assertTrue(reader.is_rust())
+        self.assertFalse(reader.is_unsafe_language())
+
+    def test_rust_symbols(self):
+        self.path.write_bytes(build_elf(b'Linker: LLD 16.0.6\0', build_id=True, strings=('rust_begin_unwind',)))
+        reader = ElfSectionReader(self.path)
+        self.assertTrue(reader.is_rust())
+        self.assertFalse(reader.is_unsafe_language())
+
+    def test_c_linking_rust(self):
+        # C or C++ code statically linking a Rust component is memory-unsafe
+        self.path.write_bytes(build_elf(b'rustc version 1.70.0\0GCC: (GNU) 12.2.0\0', build_id=True,
+                                        strings=('rust_begin_unwind', 'rust_panic')))
+        reader = ElfSectionReader(self.path)
+        self.assertTrue(reader.is_compiled_by_gcc_or_clang())
+        self.assertFalse(reader.is_rust())
+        self.assertTrue(reader.is_unsafe_language())
+
+    def test_no_compiler(self):
+        self.path.write_bytes(build_elf(b'Linker: LLD 16.0.6\0'))
+        reader = ElfSectionReader(self.path)
+        self.assertFalse(reader.is_compiled_by_gcc_or_clang())
+        self.assertFalse(reader.is_unsafe_language())
+
+    def test_invalid_files(self):
+        self.path.write_bytes(b'#!/bin/sh\n')
+        with self.assertRaises(ValueError):
+            ElfSectionReader(self.path)
+        self.path.write_bytes(build_elf()[:200])
+        with self.assertRaises(ValueError):
+            ElfSectionReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import global_variables
+from checker.Lib32Checker import Lib32Checker
+from initialize_database import initialize_database
+
+IMAGE_ID = 'image'
+
+
+class TestLib32Checker(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        global_variables.setup_global_variables(sqlite_path=str(Path(self.directory.name) / 'results.sqlite'))
+        initialize_database()
+
+    def tearDown(self):
+        global_variables.cleanup_global_variables()
+        self.directory.cleanup()
+
+    def add_binary(self, binary_id: str, path: str, multi_cfi: bool, image_id: str = IMAGE_ID):
+        global_variables.cursor.execute('INSERT INTO BinaryFile (BinaryPath, Subimage, Multi_CFI, Id) VALUES '
+                                        '(?, ?, ?, ?);', (path, image_id, multi_cfi, binary_id))
+
+    def results(self):
+        global_variables.cursor.execute('SELECT Id, Multi_CFI, Error FROM BinaryFile WHERE Subimage = ? ORDER BY Id;',
+                                        (IMAGE_ID,))
+        return {binary_id: (multi_cfi, error) for binary_id, multi_cfi, error in global_variables.cursor.fetchall()}
+
+    def test_propagates_multi_cfi_of_lib64(self):
+        self.add_binary('foo32', '/extracted/usr/lib/libfoo.so', False)
+        self.add_binary('foo64', '/extracted/usr/lib64/libfoo.so', True)
+        self.add_binary('bar32', '/extracted/usr/lib/libbar.so', False)
+        self.add_binary('bar64', '/extracted/usr/lib64/libbar.so', False)
+        self.add_binary('baz32', '/extracted/usr/lib/libbaz.so', True)
+        self.add_binary('baz64', '/extracted/usr/lib64/libbaz.so', True)
+        # Only the end of the path has to match, but not just the end of the name
+        self.add_binary('qux32', '/extracted/usr/lib/libqux.so', False)
+        self.add_binary('qux64', '/extracted/usr/lib64/xlibqux.so', True)
+        # Binaries of other subimages are not considered
+        self.add_binary('other32', '/extracted/usr/lib/libother.so', False)
+        self.add_binary('other64', '/extracted/usr/lib64/libother.so', True, 'other image')
+        global_variables.connection.commit()
+
+        Lib32Checker.run([(Path('/extracted/usr/lib/libfoo.so'), 'foo32'),
+                          (Path('/extracted/usr/lib/libbar.so'), 'bar32'),
+                          (Path('/extracted/usr/lib/libbaz.so'), 'baz32'),
+                          (Path('/extracted/usr/lib/libqux.so'), 'qux32'),
+                          (Path('/extracted/usr/lib/libother.so'), 'other32')], IMAGE_ID)
+
+        results = self.results()
+        self.assertEqual(results['foo32'], (1, 'Lib32'))
+        self.assertEqual(results['bar32'], (0, None))
+        self.assertEqual(results['baz32'], (1, None))
+        self.assertEqual(results['qux32'], (0, None))
+        self.assertEqual(results['other32'], (0, None))
+
+    def test_skips_paths_without_single_lib(self):
+        self.add_binary('nested32', '/extracted/lib/usr/lib/libfoo.so', False)
+        self.add_binary('nested64', '/extracted/lib/usr/lib64/libfoo.so', True)
+        self.add_binary('root32', 'lib/libfoo.so', False)
+        global_variables.connection.commit()
+
+        Lib32Checker.run([(Path('/extracted/lib/usr/lib/libfoo.so'), 'nested32'),
+                          (Path('lib/libfoo.so'), 'root32')], IMAGE_ID)
+
+        results = self.results()
+        self.assertEqual(results['nested32'], (0, None))
+        self.assertEqual(results['root32'], (0, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import sys
+import time
+import unittest
+
+from checker.StageBudget import StageBudget, StageTimeout
+
+
+def busy(seconds: float):
+    """
+    Run Python code for the given time, so an asynchronous exception can be delivered.
+    """
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class _SlowFinalizer:
+    """
+    Spends most of the time of a stage in __del__, where Python ignores exceptions.
+    """
+
+    def __del__(self):
+        busy(0.01)
+
+
+class TestStageBudget(unittest.TestCase):
+
+    def test_stage_within_budget(self):
+        budget = StageBudget({StageBudget.CFG: 1})
+        with budget.stage(StageBudget.CFG):
+            busy(0.01)
+
+    def test_stage_expires(self):
+        budget = StageBudget({StageBudget.CFG: 0.1})
+        start = time.monotonic()
+        with self.assertRaises(StageTimeout) as raised:
+            with budget.stage(StageBudget.CFG):
+                busy(5)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(raised.exception.stage, StageBudget.CFG)
+        self.assertEqual(raised.exception.seconds, 0.1)
+
+    def test_swallowed_expiry_raises_after_stage(self):
+        budget = StageBudget({StageBudget.CFG: 0.1})
+        # The exception ignored in __del__ is reported to the hook
+        hook = sys.unraisablehook
+        sys.unraisablehook = lambda unraisable: None
+        try:
+            for _ in range(3):
+                with self.assertRaises(StageTimeout):
+                    with budget.stage(StageBudget.CFG):
+                        end = time.monotonic() + 0.5
+                        while time.monotonic() < end:
+                            _SlowFinalizer()
+        finally:
+            sys.unraisablehook = hook
+
+    def test_other_exception_within_budget(self):
+        budget = StageBudget({StageBudget.CFG: 1})
+        with self.assertRaises(ValueError):
+            with budget.stage(StageBudget.CFG):
+                raise ValueError('invalid binary')
+
+    def test_expiry_does_not_leak_into_later_code(self):
+        budget = StageBudget({StageBudget.CFG: 0.05})
+        with self.assertRaises(StageTimeout):
+            with budget.stage(StageBudget.CFG):
+                busy(1)
+        # A pending exception would be raised here
+        busy(0.2)
+
+    def test_disabled_budget(self):
+        budget = StageBudget({StageBudget.CFG: 0})
+        self.assertTrue(budget.enabled())
+        with budget.stage(StageBudget.CFG):
+            busy(0.05)
+        self.assertFalse(StageBudget({stage: 0 for stage in StageBudget.STAGES}).enabled())
+
+    def test_parse_and_scale(self):
+        budget = StageBudget.parse('load=10, cfg=20')
+        self.assertEqual(budget.budgets[StageBudget.LOAD], 10)
+        self.assertEqual(budget.budgets[StageBudget.CFG], 20)
+        self.assertEqual(budget.budgets[StageBudget.SCS], StageBudget.DEFAULT_BUDGETS[StageBudget.SCS])
+        self.assertEqual(budget.scaled(2).budgets[StageBudget.CFG], 40)
+        with self.assertRaises(ValueError):
+            StageBudget.parse('angr=10')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from database.FingerprintCache import FingerprintCache
+
+
+class TestFingerprintCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.cache = FingerprintCache(str(self.directory / 'cache.sqlite'))
+        self.file = self.directory / 'binary'
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, contents: bytes, mtime_ns: int = None):
+        self.file.write_bytes(contents)
+        if mtime_ns is not None:
+            os.utime(self.file, ns=(mtime_ns, mtime_ns))
+        file_stat = os.stat(self.file)
+        return file_stat, FingerprintCache.read_sample(str(self.file), file_stat)
+
+    def test_hit(self):
+        file_stat, sample = self.write(b'\x7fELF' + bytes(10000))
+        self.assertIsNone(self.cache.get(file_stat, sample, 'Checksum'))
+        self.cache.put(file_stat, sample, 'Checksum', 'md5:1234')
+        self.cache.put(file_stat, sample, 'Format', 'ELF 64-bit LSB shared object')
+        self.assertEqual(self.cache.get(file_stat, sample, 'Checksum'), 'md5:1234')
+        self.assertEqual(self.cache.get(file_stat, sample, 'Format'), 'ELF 64-bit LSB shared object')
+
+    def test_invalidated_by_size_and_mtime(self):
+        file_stat, sample = self.write(b'a' * 100, mtime_ns=10 ** 18)
+        self.cache.put(file_stat, sample, 'Checksum', 'md5:old')
+        file_stat, sample = self.write(b'a' * 101, mtime_ns=10 ** 18)
+        self.assertIsNone(self.cache.get(file_stat, sample, 'Checksum'))
+        file_stat, sample = self.write(b'a' * 100, mtime_ns=2 * 10 ** 18)
+        self.assertIsNone(self.cache.get(file_stat, sample, 'Checksum'))
+
+    def test_invalidated_by_contents_with_same_inode_size_and_mtime(self):
+        # Like a reused loop device mounting another build with fixed timestamps
+        old_stat, old_sample = self.write(b'\x7fELF' + b'a' * 10000 + b'end', mtime_ns=10 ** 18)
+        self.cache.put(old_stat, old_sample, 'Checksum', 'md5:old')
+        self.cache.put(old_stat, old_sample, 'UnsafeLanguage', True)
+        new_stat, new_sample = self.write(b'\x7fELF' + b'b' * 10000 + b'end', mtime_ns=10 ** 18)
+        self.assertEqual((old_stat.st_ino, old_stat.st_size, old_stat.st_mtime_ns),
+                         (new_stat.st_ino, new_stat.st_size, new_stat.st_mtime_ns))
+        self.assertNotEqual(old_sample, new_sample)
+        self.assertIsNone(self.cache.get(new_stat, new_sample, 'Checksum'))
+        self.cache.put(new_stat, new_sample, 'Checksum', 'md5:new')
+        # The entry of the other file is replaced, not merged
+        self.assertIsNone(self.cache.get(new_stat, new_sample, 'UnsafeLanguage'))
+        self.assertEqual(self.cache.get(new_stat, new_sample, 'Checksum'), 'md5:new')
+
+    def test_sample_covers_start_and_end(self):
+        size = 3 * FingerprintCache.SAMPLE_SIZE
+        contents = bytearray(size)
+        sample = FingerprintCache.sample(bytes(contents))
+        contents[-1] = 1
+        self.assertNotEqual(FingerprintCache.sample(bytes(contents)), sample)
+        file_stat, read_sample = self.write(bytes(contents))
+        self.assertEqual(read_sample, FingerprintCache.sample(bytes(contents)))
+
+    def test_unsafe_language_by_checksum(self):
+        file_stat, sample = self.write(b'contents')
+        self.cache.put(file_stat, sample, 'Checksum', 'md5:1234')
+        self.cache.put(file_stat, sample, 'UnsafeLanguage', False)
+        self.assertFalse(self.cache.get_unsafe_language('md5:1234'))
+        self.assertIsNone(self.cache.get_unsafe_language('md5:5678'))
+
+    def test_eviction(self):
+        self.cache.max_entries = 2
+        files = []
+        for index in range(4):
+            self.file = self.directory / f'binary{index}'
+            files.append(self.write(bytes([index]) * 10))
+            self.cache.put(*files[-1], 'Format', 'data')
+        self.cache.close()
+        self.cache = FingerprintCache(str(self.directory / 'cache.sqlite'))
+        hits = [self.cache.get(file_stat, sample, 'Format') for file_stat, sample in files]
+        self.assertEqual(hits, [None, None, 'data', 'data'])
+
+    def test_unknown_field(self):
+        file_stat, sample = self.write(b'contents')
+        with self.assertRaises(ValueError):
+            self.cache.get(file_stat, sample, 'Id')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import global_variables
+from database.ResultMerger import ResultMerger
+from initialize_database import initialize_database
+
+
+class TestResultMerger(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_results(self, name: str, version: str, binaries):
+        """
+        Write a SQLite result file as a worker machine would.
+
+        :param binaries: id and Multi_CFI flag of each binary, the flag of the first one is cached as verdict
+        """
+        path = str(Path(self.directory.name) / name)
+        global_variables.setup_global_variables(sqlite_path=path)
+        initialize_database()
+        cursor = global_variables.cursor
+        cursor.execute(global_variables.os_obj_query, ('Debian', version))
+        cursor.execute(global_variables.image_obj_query, (version, 'debian.iso', 'iso', f'image {version}'))
+        for binary_id, multi_cfi in binaries:
+            cursor.execute('INSERT INTO BinaryFile (BinaryName, Subimage, Multi_CFI, OsVersion, Id) VALUES '
+                           '(?, ?, ?, ?, ?);', (binary_id, f'image {version}', multi_cfi, version, binary_id))
+        cursor.execute(global_variables.verdict_cache_query, ('abc', 'md5', '1', 'all', 0, binaries[0][1], 0, 0))
+        global_variables.connection.commit()
+        global_variables.cleanup_global_variables()
+        return path
+
+    def test_merges_sqlite_files(self):
+        first = self.create_results('first.sqlite', '12', [('ls', 0), ('cat', 0)])
+        second = self.create_results('second.sqlite', '13', [('ls', 1), ('cp', 1)])
+
+        global_variables.setup_global_variables(sqlite_path=str(Path(self.directory.name) / 'merged.sqlite'))
+        try:
+            initialize_database()
+            merger = ResultMerger()
+            with mock.patch.object(ResultMerger, 'CHUNK_SIZE', 1):
+                self.assertEqual(merger.merge(first), {'OperatingSystem': 1, 'Image': 1, 'SpecialFile': 0,
+                                                       'BinaryFile': 2, 'VerdictCache': 1})
+                merger.merge(second)
+            self.assertEqual(merger.versions, {('Debian', '12'), ('Debian', '13')})
+
+            cursor = global_variables.cursor
+            cursor.execute('SELECT Id, Multi_CFI, OsVersion FROM BinaryFile ORDER BY Id;')
+            # Binaries of the later file replace those with the same id
+            self.assertEqual(cursor.fetchall(), [('cat', 0, '12'), ('cp', 1, '13'), ('ls', 1, '13')])
+            cursor.execute('SELECT Version FROM Image ORDER BY Version;')
+            self.assertEqual(cursor.fetchall(), [('12',), ('13',)])
+            cursor.execute('SELECT Multi_CFI FROM VerdictCache;')
+            self.assertEqual(cursor.fetchall(), [(1,)])
+
+            # Merging a file again does not add rows
+            merger.merge(first)
+            cursor.execute('SELECT COUNT(*) FROM Image;')
+            self.assertEqual(cursor.fetchone(), (2,))
+        finally:
+            global_variables.cleanup_global_variables()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+import unittest
+
+from database.ResultWriter import ResultWriter
+
+INSERT = 'INSERT INTO Result (Id, Value) VALUES (?, ?)'
+UPDATE = 'UPDATE Result SET Value = ? WHERE Id = ?'
+
+
+class TestResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute('CREATE TABLE Result (Id varchar(255), Value int, PRIMARY KEY (Id))')
+        self.writer = ResultWriter(self.connection, self.connection.cursor(), threading.RLock(), batch_size=4)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def rows(self):
+        return self.connection.execute('SELECT Id, Value FROM Result ORDER BY Id').fetchall()
+
+    def test_flushes_full_batch(self):
+        for index in range(3):
+            self.writer.add(INSERT, (str(index), index))
+        self.assertEqual(self.rows(), [])
+        self.writer.add(INSERT, ('3', 3))
+        self.assertEqual(len(self.rows()), 4)
+
+    def test_keeps_order_of_statements(self):
+        self.writer.add(INSERT, ('a', 1))
+        self.writer.add(UPDATE, (2, 'a'))
+        self.writer.add(INSERT, ('b', 1))
+        self.writer.flush()
+        self.assertEqual(self.rows(), [('a', 2), ('b', 1)])
+
+    def test_pending_keys(self):
+        self.writer.add(INSERT, ('a', 1), key=('Result', 'a'))
+        self.assertTrue(self.writer.is_pending(('Result', 'a')))
+        self.writer.flush_pending(('Result', 'b'))
+        self.assertEqual(self.rows(), [])
+        self.writer.flush_pending(('Result', 'b'), ('Result', 'a'))
+        self.assertEqual(self.rows(), [('a', 1)])
+        self.assertFalse(self.writer.is_pending(('Result', 'a')))
+
+    def test_failed_batch_is_written_row_by_row(self):
+        self.writer.add(INSERT, ('a', 1))
+        self.writer.add(INSERT, ('b', 2))
+        self.writer.add(INSERT, ('a', 3))
+        with self.assertLogs('database.ResultWriter', 'ERROR') as logs:
+            self.writer.flush()
+        # Only the duplicate row is lost
+        self.assertEqual(self.rows(), [('a', 1), ('b', 2)])
+        self.assertEqual(len(logs.records), 2)
+
+    def test_batch_size_one_commits_every_row(self):
+        writer = ResultWriter(self.connection, self.connection.cursor(), threading.RLock(), batch_size=0)
+        self.assertEqual(writer.batch_size, 1)
+        writer.add(INSERT, ('a', 1))
+        self.assertEqual(self.rows(), [('a', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from finder.FormatSniffer import FormatSniffer
+from finder.MagicValuesExtensions import MagicValues
+
+
+class TestFormatSniffer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sniff(self, contents: bytes, name='file') -> str:
+        path = self.directory / name
+        path.write_bytes(contents)
+        return FormatSniffer.sniff(path)
+
+    def test_elf(self):
+        header = b'\x7fELF\x02\x01\x01' + bytes(9) + struct.pack('<H', 3) + bytes(46)
+        self.assertEqual(self.sniff(header), 'ELF 64-bit LSB shared object')
+        header = b'\x7fELF\x01\x02\x01' + bytes(9) + struct.pack('>H', 2) + bytes(34)
+        self.assertEqual(self.sniff(header), 'ELF 32-bit MSB executable')
+        self.assertTrue(self.sniff(header).startswith(MagicValues.ELF_MAGIC_VALUE))
+
+    def test_archives(self):
+        self.assertEqual(self.sniff(b'!<arch>\ndebian-binary   1342943816  0     0     100644  4         `\n2.0\n'),
+                         'Debian binary package')
+        self.assertEqual(self.sniff(b'!<arch>\nfoo.o/          0           0     0     644     0         `\n'),
+                         'current ar archive')
+        jar = b'PK\x03\x04' + bytes(22) + struct.pack('<HH', 9, 4) + b'META-INF/' + struct.pack('<HH', 0xcafe, 0)
+        self.assertEqual(self.sniff(jar), 'Java archive data (JAR)')
+
+    def test_images(self):
+        self.assertTrue(self.sniff(b'hsqs' + bytes(92)).startswith(MagicValues.SQUASHSF_MAGIC_VALUE))
+        sparse = struct.pack('<IHH', FormatSniffer.SPARSE_MAGIC, 1, 0) + bytes(20)
+        self.assertEqual(self.sniff(sparse), 'Android sparse image, version: 1.0')
+        self.assertTrue(self.sniff(sparse).startswith(MagicValues.ANDROID_SPARSE_IMG_MAGIC_VALUE))
+
+        superblock = bytearray(2048)
+        struct.pack_into('<H', superblock, 0x438, FormatSniffer.EXT_MAGIC)
+        struct.pack_into('<I', superblock, 0x44c, 1)
+        self.assertEqual(self.sniff(bytes(superblock)), 'Linux rev 1.0 ext2 filesystem data')
+        self.assertTrue(self.sniff(bytes(superblock)).startswith(MagicValues.EXT_IMG_MAGIC_VALUE))
+        struct.pack_into('<III', superblock, 0x45c, 0x4, 0x2c0, 0x8)
+        self.assertEqual(self.sniff(bytes(superblock)), 'Linux rev 1.0 ext4 filesystem data')
+
+        iso = bytearray(40000)
+        iso[32769:32774] = b'CD001'
+        self.assertEqual(self.sniff(bytes(iso)), 'ISO 9660 CD-ROM filesystem data')
+
+    def test_other_files(self):
+        self.assertEqual(self.sniff(b''), 'empty')
+        self.assertEqual(self.sniff(bytes(range(256)) * 200), 'data')
+        os.symlink('target', self.directory / 'link')
+        self.assertEqual(FormatSniffer.sniff(self.directory / 'link'), 'symbolic link to target')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import global_variables
+from initialize_database import IMAGE_TABLE, MIGRATIONS, OPERATING_SYSTEM_TABLE, SPECIAL_FILE_TABLE, migrate, \
+    pending_migrations, schema_version
+
+# Table of the binaries before the schema was versioned
+UNVERSIONED_BINARY_FILE_TABLE: str = 'CREATE TABLE BinaryFile (BinaryName varchar(255), Subimage varchar(255), ' \
+                                     'SpecialFileTag varchar(255), BinaryPath varchar(255), FileTimestamp ' \
+                                     'varchar(255), Checksum varchar(255), Error text, Unsafe_language bool, ' \
+                                     'Modified bool, Single_CFI bool, Multi_CFI bool, ShadowCallStack bool, Id ' \
+                                     'varchar(255), PRIMARY KEY (Id), UNIQUE (Id), FOREIGN KEY (Subimage) ' \
+                                     'REFERENCES Image(Id));'
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.directory.name) / 'results.sqlite')
+
+    def tearDown(self):
+        global_variables.cleanup_global_variables()
+        self.directory.cleanup()
+
+    def create_unversioned_database(self):
+        connection = sqlite3.connect(self.path)
+        for statement in (OPERATING_SYSTEM_TABLE, IMAGE_TABLE, SPECIAL_FILE_TABLE, UNVERSIONED_BINARY_FILE_TABLE):
+            connection.execute(statement)
+        connection.execute("INSERT INTO OperatingSystem (OS_Name, Version) VALUES ('Debian', '12')")
+        connection.execute("INSERT INTO Image (Version, ImageName, Id) VALUES ('12', 'debian.iso', 'image')")
+        connection.execute("INSERT INTO BinaryFile (BinaryName, Subimage, Checksum, Id) VALUES "
+                           "('ls', 'image', 'abc', 'binary')")
+        connection.commit()
+        connection.close()
+
+    def columns(self, table: str):
+        global_variables.cursor.execute(f'PRAGMA table_info({table});')
+        return [row[1] for row in global_variables.cursor.fetchall()]
+
+    def tables(self):
+        global_variables.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table';")
+        return {row[0] for row in global_variables.cursor.fetchall()}
+
+    def indexes(self):
+        global_variables.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = "
+                                        "'BinaryFile' AND sql IS NOT NULL;")
+        return {row[0] for row in global_variables.cursor.fetchall()}
+
+    def test_migrates_unversioned_database(self):
+        self.create_unversioned_database()
+        global_variables.setup_global_variables(sqlite_path=self.path)
+        self.assertEqual(schema_version(), 0)
+        self.assertEqual(pending_migrations(), list(MIGRATIONS))
+
+        self.assertEqual([migration.version for migration in migrate()], [1, 2, 3])
+
+        self.assertEqual(schema_version(), 3)
+        self.assertEqual(pending_migrations(), [])
+        columns = self.columns('BinaryFile')
+        for column in ('AnalysisProfile', 'VerdictTier', 'JumpTableStubs', 'OsVersion'):
+            self.assertIn(column, columns)
+        self.assertIn('VerdictCache', self.tables())
+        self.assertEqual(self.indexes(), {'BinaryFileChecksum', 'BinaryFileFlags'})
+        # Existing binaries get the version of their image
+        global_variables.cursor.execute('SELECT BinaryName, OsVersion FROM BinaryFile;')
+        self.assertEqual(global_variables.cursor.fetchall(), [('ls', '12')])
+        # Nothing is applied twice
+        self.assertEqual(migrate(), [])
+
+    def test_migrates_from_recorded_version(self):
+        global_variables.setup_global_variables(sqlite_path=self.path)
+        self.assertEqual([migration.version for migration in migrate()], [1, 2, 3])
+        global_variables.cursor.execute('DELETE FROM SchemaVersion WHERE Version > 1;')
+        global_variables.connection.commit()
+
+        self.assertEqual([migration.version for migration in pending_migrations()], [2, 3])
+        # The columns added by the migrations exist already
+        self.assertEqual([migration.version for migration in migrate()], [2, 3])
+        self.assertEqual(schema_version(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()